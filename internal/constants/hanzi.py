@@ -0,0 +1,60 @@
+# -*- coding: utf-8 -*-
+
+# NOTE: Common traditional characters and their simplified forms, one pair per word. Only characters which
+# map unambiguously are listed (e.g. 乾, 著 and 瞭 are left alone), there is no phrase-level conversion.
+TRADITIONAL_TO_SIMPLIFIED_PAIRS = '''
+個个 們们 這这 來来 時时 為为 說说 國国 會会 對对 過过 現现 還还 沒没 麼么 後后
+見见 開开 關关 問问 題题 點点 頭头 兒儿 長长 東东 車车 門门 馬马 鳥鸟 魚鱼 話话
+語语 讓让 記记 讀读 書书 寫写 聽听 買买 賣卖 錢钱 銀银 鐵铁 電电 腦脑 機机 場场
+學学 習习 愛爱 親亲 氣气 飛飞 發发 髮发 變变 經经 歷历 曆历 驗验 體体 覺觉 邊边
+遠远 進进 運运 動动 認认 識识 請请 謝谢 誰谁 樣样 種种 總总 從从 與与 無无 實实
+際际 應应 該该 當当 嗎吗 聲声 傷伤 殺杀 屍尸 醫医 藥药 療疗 懷怀 媽妈 爺爷 孫孙
+婦妇 綁绑 鄰邻 歲岁 離离 難难 雖虽 雙双 雞鸡 號号 衛卫 張张 陽阳 陰阴 隊队 階阶
+飯饭 餓饿 館馆 頓顿 領领 顏颜 願愿 風风 颱台 臺台 灣湾 處处 術术 夢梦 將将 專专
+導导 屬属 廣广 廳厅 廠厂 彈弹 彎弯 強强 徑径 態态 憶忆 懼惧 戰战 戲戏 戶户 掃扫
+掛挂 換换 損损 搖摇 擊击 擔担 據据 擁拥 攝摄 數数 敵敌 斷断 晝昼 條条 楊杨 業业
+極极 樂乐 標标 樓楼 樹树 橋桥 檢检 權权 歡欢 殘残 殼壳 決决 況况 淚泪 淺浅 減减
+測测 湯汤 溫温 滅灭 滿满 漢汉 潛潜 澤泽 濕湿 災灾 烏乌 煙烟 熱热 燈灯 燒烧 爭争
+爾尔 牆墙 狀状 獨独 獄狱 獵猎 獸兽 環环 產产 畫画 異异 盡尽 監监 盤盘 眾众 睏困
+確确 礎础 禮礼 禍祸 穩稳 窮穷 競竞 筆笔 節节 範范 簡简 籠笼 糧粮 紀纪 約约 紅红
+紙纸 級级 細细 終终 組组 結结 絕绝 給给 統统 絲丝 綠绿 網网 線线 練练 縣县 繩绳
+繼继 續续 罰罚 義义 聖圣 聞闻 聯联 聰聪 職职 肅肃 脫脱 腳脚 臉脸 興兴 舊旧 艦舰
+藝艺 蘋苹 蘭兰 蟲虫 衝冲 補补 裝装 製制 複复 規规 視视 觀观 計计 訂订 討讨 訓训
+設设 許许 訴诉 診诊 証证 評评 試试 詩诗 詳详 誤误 課课 調调 談谈 論论 諾诺 證证
+議议 護护 豬猪 貓猫 負负 財财 責责 貨货 質质 費费 資资 賊贼 賽赛 贏赢 趕赶 軍军
+輕轻 輛辆 輸输 辦办 農农 迴回 連连 週周 遊游 達达 違违 遺遗 選选 郵邮 鄉乡 釋释
+針针 鈴铃 鉛铅 銷销 鋼钢 錄录 錯错 鍋锅 鎖锁 鏡镜 鐘钟 閉闭 間间 閱阅 闆板 陣阵
+陸陆 險险 隨随 隱隐 雜杂 雲云 靈灵 靜静 響响 頁页 項项 順顺 須须 預预 類类 顯显
+飄飘 飲饮 養养 驚惊 髒脏 鬥斗 魯鲁 鮮鲜 鹽盐 麗丽 麥麦 黃黄 黨党 齊齐 齒齿 龍龙
+龜龟 劍剑 劃划 劇剧 勁劲 勞劳 勢势 勝胜 區区 協协 卻却 參参 叢丛 吳吴 員员 啞哑
+單单 嚴严 噸吨 團团 圖图 圓圆 報报 塊块 壓压 壞坏 壯壮 夠够 奪夺 奮奋 娛娱 婁娄
+寧宁 審审 寶宝 尋寻 屆届 島岛 嶺岭 幣币 幫帮 幹干 幾几 庫库 廢废 彙汇 徵征 恆恒
+悅悦 惡恶 惱恼 慣惯 慶庆 憂忧 懶懒 戀恋 掙挣 揚扬 擇择 擬拟 擴扩 擺摆 敗败 斃毙
+暫暂 曉晓 棄弃 槍枪 歸归 毀毁 汙污 沖冲 洶汹 淨净 淪沦 渾浑 溝沟 滬沪 漁渔 漲涨
+潔洁 濃浓 瀏浏 爐炉 猶犹 獎奖 瑪玛 畢毕 疊叠 癒愈 皺皱 盜盗 睜睁 矯矫 碼码 磚砖
+禦御 稱称 穀谷 窩窝 竊窃 筍笋 築筑 簽签 籃篮 糾纠 紋纹 納纳 純纯 紛纷 紮扎 絡络
+綜综 緊紧 緒绪 緣缘 編编 緩缓 縮缩 織织 繪绘 罷罢 羅罗 翹翘 聳耸 膽胆 臟脏 舉举
+艱艰 莊庄 華华 萬万 葉叶 蔣蒋 薦荐 蘇苏 虛虚 蝦虾 螢萤 蠟蜡 衆众 襪袜 襯衬 覽览
+訊讯 託托 訣诀 詞词 詢询 詐诈 誇夸 誌志 誠诚 誕诞 誘诱 誼谊 諸诸 謀谋 謊谎 謎谜
+謙谦 講讲 謠谣 譜谱 譯译 讚赞 豐丰 貝贝 貞贞 貢贡 貧贫 貪贪 貫贯 貴贵 貸贷 貼贴
+賀贺 賄贿 賓宾 賜赐 賠赔 賢贤 賦赋 賬账 賭赌 賴赖 購购 贈赠 趙赵 跡迹 踐践 蹤踪
+躍跃 軌轨 軟软 較较 載载 輔辅 輝辉 輩辈 轉转 轎轿 辭辞 邏逻 遷迁 適适 遲迟 鄭郑
+釘钉 鈔钞 鈕钮 鉤钩 銅铜 銳锐 鋒锋 鋪铺 鍵键 鍛锻 鎮镇 鏈链 鐺铛 鑰钥 閃闪 閒闲
+閣阁 闊阔 闖闯 陳陈 隻只 雛雏 霧雾 韓韩 頂顶 頌颂 頑顽 頻频 顆颗 顧顾 颳刮 飢饥
+飽饱 餅饼 餘余 餵喂 饒饶 駕驾 駛驶 騎骑 騙骗 騷骚 驅驱 驢驴 鬧闹 鬱郁 鮑鲍 鯨鲸
+鳴鸣 鴨鸭 鴿鸽 鵝鹅 鷹鹰 麵面 黴霉 齡龄 兇凶 殭僵 糰团 僅仅 價价 儀仪 億亿 優优
+償偿 儲储 傳传 傘伞 備备 僱雇 傾倾 偉伟 偵侦 側侧 剛刚 則则 創创 勵励 勸劝 匯汇
+厭厌 厲厉 吶呐 嗚呜 嘆叹 嘗尝 嘩哗 噴喷 嚇吓 囑嘱 園园 圍围 壇坛 墳坟 墜坠 夾夹
+奧奥 寢寝 尷尴 層层 岡冈 峽峡 帥帅 師师 帳帐 帶带 廁厕 彌弥 復复 徹彻 憑凭 憐怜
+懇恳 懸悬 挾挟 捨舍 揮挥 搶抢 撈捞 撐撑 撥拨 擋挡 擠挤 擾扰 攔拦 攜携 敘叙 斬斩
+暈晕 暢畅 曬晒 朧胧 枴拐 桿杆 梟枭 棟栋 楓枫 構构 槓杠 樁桩 橫横 檔档 櫃柜 欄栏
+歐欧 殯殡 氫氢 淵渊 渦涡 湧涌 準准 溼湿 滾滚 漬渍 漸渐 潑泼 澀涩 濁浊 濱滨 瀕濒
+灑洒 灘滩 燭烛 爛烂 牽牵 犧牺 獅狮 獲获 瓊琼 甕瓮 畝亩 瘋疯 癢痒 盃杯 矚瞩 硃朱
+碩硕 礦矿 祿禄 禪禅 稅税 竄窜 篩筛 籌筹 紡纺 紳绅 紹绍 絞绞 綱纲 維维 綿绵 緝缉
+締缔 縫缝 繞绕 繡绣 纏缠 罵骂 羨羡 聶聂 脅胁 膠胶 膩腻 臘腊 艙舱 蔥葱 蔔卜 藍蓝
+蘆芦 虜虏 蛻蜕 蠶蚕 衊蔑 裏里 裡里 褲裤 襲袭 訪访 訝讶 詛诅 諒谅 謹谨 譏讥 譴谴
+豎竖 貿贸 賞赏 賤贱 趨趋 踴踊 輪轮 轟轰 辯辩 遞递 遜逊 遙遥 邁迈 醜丑 釀酿 鈍钝
+銘铭 鋸锯 錦锦 鏟铲 鑄铸 鑑鉴 閩闽 闡阐 陝陕 隸隶 靂雳 鞏巩 韌韧 頸颈 頹颓 顫颤
+飾饰 餃饺 饅馒 騰腾 驕骄 骯肮 鬆松 鬚须 魷鱿 鯉鲤 鱷鳄 鳳凤 鴉鸦 鵬鹏 鶴鹤 鸚鹦
+齋斋 龐庞 釣钓 鯊鲨 墮堕 劊刽 嬰婴 於于 並并
+'''
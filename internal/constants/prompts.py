@@ -71,3 +71,25 @@ PROMPT_FOR_TRUTH = '''
 - 如果用户直接询问结果或具体原因，你应该告诉用户“你需要自己进行猜测”。
 - 请反复、仔细检查你的回复，避免回答错误给用户造成不好的体验。
 '''
+
+PROMPT_FOR_MEMORY_SUMMARY = '''
+# Role: 海龟汤记录员
+
+## 任务
+下面是玩家与主持人在一局“海龟汤”游戏中的问答记录。
+请用简洁的中文概括玩家已经确认的事实和已经排除的猜测，供主持人继续主持游戏时参考。
+
+## 注意事项
+- 只概括记录中已有的信息，不要推测汤底。
+- 不超过200字。
+'''
+
+PROMPT_FOR_INTENTION = '''
+## 输出格式
+不要输出任何解释，只输出一个字母代表你的回答：
+A. 是
+B. 不是
+C. 无关
+D. 是又不是
+E. 其他（需要告诉用户“你需要自己进行猜测”，或者无法判断）
+'''
@@ -14,6 +14,54 @@ from internal.classes.singleton import Singleton
 from internal.utils.helper import timeit
 from internal.utils.retry_with_backoff import aretry_with_constant_backoff
 
+# Sliding window log over one sorted set per subject (KEYS), scored by the Redis server time in ms.
+# ARGV: window in ms, cost, a unique member prefix, then the limit of each key. The hit is recorded in
+# every window only if it fits in all of them. Returns {allowed, 1-based index of the full key, ms to wait}.
+_SLIDING_WINDOW_SCRIPT = """
+local window = tonumber(ARGV[1])
+local cost = tonumber(ARGV[2])
+local member = ARGV[3]
+local t = redis.call('TIME')
+local now = tonumber(t[1]) * 1000 + math.floor(tonumber(t[2]) / 1000)
+for i, key in ipairs(KEYS) do
+    local limit = tonumber(ARGV[3 + i])
+    redis.call('ZREMRANGEBYSCORE', key, '-inf', now - window)
+    if redis.call('ZCARD', key) + cost > limit then
+        local wait = window
+        local oldest = redis.call('ZRANGE', key, 0, 0, 'WITHSCORES')
+        if #oldest > 0 then
+            wait = math.max(1, tonumber(oldest[2]) + window - now)
+        end
+        return {0, i, wait}
+    end
+end
+for _, key in ipairs(KEYS) do
+    for j = 1, cost do
+        redis.call('ZADD', key, now, member .. ':' .. j)
+    end
+    redis.call('PEXPIRE', key, window)
+end
+return {1, 0, 0}
+"""
+
+# Replaces the oldest ARGV[3] values of the list at KEYS[1] with ARGV[5..], keeping whatever was appended
+# since the caller read it. ARGV: the head value as read, the length as read, the number of values to drop,
+# the TTL in secs (0 keeps it), then the new head values. Returns 0 if the list was rewritten meanwhile.
+_TRIM_LIST_HEAD_SCRIPT = """
+local key = KEYS[1]
+if redis.call('LINDEX', key, 0) ~= ARGV[1] or redis.call('LLEN', key) < tonumber(ARGV[2]) then
+    return 0
+end
+redis.call('LTRIM', key, tonumber(ARGV[3]), -1)
+for i = #ARGV, 5, -1 do
+    redis.call('LPUSH', key, ARGV[i])
+end
+if tonumber(ARGV[4]) > 0 then
+    redis.call('EXPIRE', key, tonumber(ARGV[4]))
+end
+return 1
+"""
+
 
 class RedisClientSetupException(Exception):
     pass
@@ -75,6 +123,8 @@ class RedisClient(metaclass=Singleton):
             socket_keepalive_options=socket_keepalive_options
         )
         self._client = aio_redis.Redis.from_pool(connection_pool=_pool)
+        # Registered Lua scripts, keyed by the script source.
+        self._scripts: Dict[str, Any] = {}
 
     def _validate_config(self, conf: Dict[str, Any]) -> bool:
         valid = False
@@ -158,6 +208,26 @@ class RedisClient(metaclass=Singleton):
         finally:
             return (value, existed, done)
 
+    @timeit
+    async def try_get_string(self, key: str, *, timeout: float) -> Tuple[Optional[str], bool]:
+        """
+        Same as exist_or_get_string, but makes one attempt within timeout seconds and never retries, for the
+        reads on the hot path which are cheaper to miss than to wait for. Returns (value, done).
+        """
+        value = None
+        done = False
+        try:
+            value = await asyncio.wait_for(self._client.execute_command("GET", key), timeout=timeout)
+            if value is not None and isinstance(value, bytes):
+                value = value.decode("utf-8")
+            done = True
+        except asyncio.TimeoutError:
+            loguru_logger.warning(f"Timeout to get value for key:{key} in {timeout}s.")
+        except Exception as e:
+            loguru_logger.error(f"Failed to get value for key:{key}, err:{e}.")
+        finally:
+            return (value, done)
+
     @timeit
     @aretry_with_constant_backoff(constant_delay=1, jitter=True, max_retries=3, errors=(redis_exceptions.TimeoutError,))
     async def cache_integer(self, key: str, value: int, ttl: int = 0) -> bool:
@@ -226,6 +296,123 @@ class RedisClient(metaclass=Singleton):
         finally:
             return (value, existed, done)
 
+    @timeit
+    @aretry_with_constant_backoff(constant_delay=1, jitter=True, max_retries=3, errors=(redis_exceptions.TimeoutError,))
+    async def get_list_of_strings(self, key: str) -> Tuple[List[str], bool]:
+        done = False
+        result = []
+        try:
+            values = await self._client.execute_command("LRANGE", key, 0, -1)
+            result = [value.decode("utf-8") if isinstance(value, bytes) else value for value in values]
+            done = True
+        except redis_exceptions.TimeoutError:
+            loguru_logger.error(f"Timeout to get list for key:{key}.")
+            raise redis_exceptions.TimeoutError
+        except Exception as e:
+            loguru_logger.error(f"Failed to get list for key:{key}, err:{e}.")
+        finally:
+            return (result, done)
+
+    @timeit
+    async def try_get_list_of_strings(self, key: str, *, timeout: float) -> Tuple[List[str], bool]:
+        """
+        Same as get_list_of_strings, but makes one attempt within timeout seconds and never retries, for the
+        reads on the hot path which are cheaper to miss than to wait for. Returns (values, done).
+        """
+        done = False
+        result = []
+        try:
+            values = await asyncio.wait_for(self._client.execute_command("LRANGE", key, 0, -1), timeout=timeout)
+            result = [value.decode("utf-8") if isinstance(value, bytes) else value for value in values]
+            done = True
+        except asyncio.TimeoutError:
+            loguru_logger.warning(f"Timeout to get list for key:{key} in {timeout}s.")
+        except Exception as e:
+            loguru_logger.error(f"Failed to get list for key:{key}, err:{e}.")
+        finally:
+            return (result, done)
+
+    @timeit
+    @aretry_with_constant_backoff(constant_delay=1, jitter=True, max_retries=3, errors=(redis_exceptions.TimeoutError,))
+    async def append_to_list(self, key: str, values: List[str], ttl: int = 0, max_len: int = 0) -> bool:
+        done = False
+        try:
+            pipe = self._client.pipeline(transaction=True)
+            pipe.rpush(key, *values)
+            if max_len > 0:
+                # NOTE: Keep the newest max_len values only.
+                pipe.ltrim(key, -max_len, -1)
+            if ttl > 0:
+                pipe.expire(key, ttl)
+            await pipe.execute()
+            done = True
+        except redis_exceptions.TimeoutError:
+            loguru_logger.error(f"Timeout to append to list for key:{key}.")
+            raise redis_exceptions.TimeoutError
+        except Exception as e:
+            loguru_logger.error(f"Failed to append to list for key:{key}, err:{e}.")
+        finally:
+            return done
+
+    @timeit
+    async def eval_lua_script(self, script: str, keys: List[str], args: List[Any]) -> Tuple[Any, bool]:
+        # NOTE: No retry here, the callers of Lua scripts are on the hot path and prefer to degrade.
+        result = None
+        done = False
+        try:
+            if script not in self._scripts:
+                # NOTE: The registered script runs with EVALSHA, and falls back to EVAL on NOSCRIPT.
+                self._scripts[script] = self._client.register_script(script)
+            result = await self._scripts[script](keys=keys, args=args)
+            done = True
+        except Exception as e:
+            loguru_logger.error(f"Failed to eval lua script for keys:{keys}, err:{e}.")
+        finally:
+            return (result, done)
+
+    async def hit_sliding_windows(
+        self,
+        keys: List[str],
+        limits: List[int],
+        *,
+        window_ms: int,
+        member: str,
+        cost: int = 1
+    ) -> Tuple[Optional[Tuple[bool, int, int]], bool]:
+        """
+        Records cost hits in the sliding window of each key in one round trip, unless one of the windows
+        is full. Returns ((allowed, index of the full key or -1, ms to wait until it has room), done).
+        """
+        result, done = await self.eval_lua_script(_SLIDING_WINDOW_SCRIPT, keys, [window_ms, cost, member, *limits])
+        if not done:
+            return (None, False)
+        allowed, index, wait_ms = result
+        return ((int(allowed) == 1, int(index) - 1, int(wait_ms)), True)
+
+    async def trim_list_head(
+        self,
+        key: str,
+        *,
+        expected_head: str,
+        expected_len: int,
+        num_dropped: int,
+        head_values: List[str],
+        ttl: int = 0
+    ) -> Tuple[bool, bool]:
+        """
+        Drops the num_dropped oldest values of a list read earlier and pushes head_values in front, atomically,
+        so that the values appended concurrently are kept. Returns (applied, done), applied is False if the
+        list no longer starts the way it was read.
+        """
+        result, done = await self.eval_lua_script(
+            _TRIM_LIST_HEAD_SCRIPT,
+            [key],
+            [expected_head, expected_len, num_dropped, ttl, *head_values]
+        )
+        if not done:
+            return (False, False)
+        return (int(result) == 1, True)
+
     @staticmethod
     async def random_sleep(min: int, max: int):
         await asyncio.sleep(random.randint(min, max) / 1000)
@@ -1 +1,27 @@
 # -*- coding: utf-8 -*-
+
+KEY_PREFIX = "turtle_soup_game_service"
+
+
+def gen_response_cache_key(fingerprint: str) -> str:
+    return f"{KEY_PREFIX}:response_cache:{fingerprint}"
+
+
+def gen_token_budget_key(scope: str) -> str:
+    return f"{KEY_PREFIX}:token_budget:{scope}"
+
+
+def gen_puzzle_key(puzzle_id: str) -> str:
+    return f"{KEY_PREFIX}:puzzle:{puzzle_id}"
+
+
+def gen_conversation_memory_key(conversation_id: str) -> str:
+    return f"{KEY_PREFIX}:conversation_memory:{conversation_id}"
+
+
+def gen_question_index_key(scope: str) -> str:
+    return f"{KEY_PREFIX}:question_index:{scope}"
+
+
+def gen_rate_limit_key(scope: str, subject: str) -> str:
+    return f"{KEY_PREFIX}:rate_limit:{scope}:{subject}"
@@ -0,0 +1,91 @@
+# -*- coding: utf-8 -*-
+from typing import Any, AsyncIterator, Dict, List, Optional
+
+from internal.llm_engines.base import HTTPLLMEngineAdapter, LLMChatResult
+from internal.utils.openai_tools import estimate_tokens_used
+
+
+class AzureOpenAIEngineAdapter(HTTPLLMEngineAdapter):
+    """Azure OpenAI Service, more info: https://learn.microsoft.com/en-us/azure/ai-services/openai/reference"""
+
+    name = "azure"
+    api_key_env = "AZURE_OPENAI_KEY"
+
+    def __init__(self, *, conf: Optional[Dict[str, Any]] = None):
+        super().__init__(conf=conf)
+        conf = conf or {}
+        self._deployment = conf.get("deployment", self.model)
+        self._api_version = conf.get("api_version", "2024-02-01")
+
+    def _url(self) -> str:
+        return f"{self._api_base}/openai/deployments/{self._deployment}/chat/completions?api-version={self._api_version}"
+
+    def _headers(self) -> Dict[str, str]:
+        return {"api-key": self._api_key, "Content-Type": "application/json"}
+
+    def _payload(self, *, messages: List[Dict[str, str]], max_tokens: int, temperature: float, json_mode: bool) -> Dict[str, Any]:
+        payload = {
+            "messages": messages,
+            "max_tokens": max_tokens,
+            "temperature": temperature,
+            "n": 1,
+        }
+        if json_mode:
+            payload["response_format"] = {"type": "json_object"}
+        return payload
+
+    async def _chat(
+        self,
+        *,
+        messages: List[Dict[str, str]],
+        max_tokens: int,
+        temperature: float,
+        json_mode: bool,
+        preferred_key: Optional[str]
+    ) -> LLMChatResult:
+        data = await self._post_json(
+            self._url(),
+            headers=self._headers(),
+            payload=self._payload(messages=messages, max_tokens=max_tokens, temperature=temperature, json_mode=json_mode),
+            estimated_tokens=estimate_tokens_used(messages, max_tokens)
+        )
+        usage = data.get("usage") or {}
+        return LLMChatResult(
+            engine=self.name,
+            model=data.get("model", self.model),
+            content=data["choices"][0]["message"].get("content") or "",
+            prompt_tokens=usage.get("prompt_tokens", 0),
+            completion_tokens=usage.get("completion_tokens", 0)
+        )
+
+    async def chat_stream(
+        self,
+        *,
+        messages: List[Dict[str, str]],
+        max_tokens: int,
+        temperature: float,
+        json_mode: bool = False,
+        preferred_key: Optional[str] = None
+    ) -> AsyncIterator[str]:
+        payload = self._payload(messages=messages, max_tokens=max_tokens, temperature=temperature, json_mode=json_mode)
+        payload["stream"] = True
+        events = self._post_sse(
+            self._url(),
+            headers=self._headers(),
+            payload=payload,
+            estimated_tokens=estimate_tokens_used(messages, max_tokens)
+        )
+        num_deltas = 0
+        try:
+            async for event in events:
+                choices = event.get("choices") or []
+                if len(choices) == 0:
+                    continue
+                content = (choices[0].get("delta") or {}).get("content")
+                if content:
+                    num_deltas += 1
+                    yield content
+        finally:
+            await events.aclose()
+            # NOTE: Streamed completions carry no usage, each delta carries one token.
+            self.account_tokens(0, num_deltas)
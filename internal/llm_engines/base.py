@@ -0,0 +1,249 @@
+# -*- coding: utf-8 -*-
+import os
+from typing import Any, AsyncIterator, Dict, List, Mapping, Optional
+
+import aiohttp
+import ujson as json
+from multidict import CIMultiDict
+
+from internal.utils import metrics
+from internal.utils.http_tracing import http_trace_config
+from internal.utils.outbound_scheduler import DEFAULT_OUTBOUND_SCHEDULER
+from internal.utils.retry_with_backoff import (
+    aretry_with_deadline_aware_backoff,
+    get_call_time_remaining
+)
+
+
+class LLMEngineSetupException(Exception):
+    pass
+
+
+class LLMEngineError(Exception):
+
+    def __init__(self, message: str, *, status: Optional[int] = None, headers: Optional[Mapping[str, str]] = None):
+        super().__init__(message)
+        self.status = status
+        # NOTE: Read by get_retry_after() to honour the retry-after header.
+        self.headers = CIMultiDict(headers or {})
+
+
+class LLMEngineRateLimitError(LLMEngineError):
+    pass
+
+
+class LLMEngineServerError(LLMEngineError):
+    pass
+
+
+class LLMChatResult:
+
+    def __init__(self, *, engine: str, model: str, content: str, prompt_tokens: int = 0, completion_tokens: int = 0):
+        self.engine = engine
+        self.model = model
+        self.content = content
+        self.prompt_tokens = prompt_tokens
+        self.completion_tokens = completion_tokens
+        self.total_tokens = prompt_tokens + completion_tokens
+
+
+class LLMEngineAdapter:
+    """
+    Base class of the LLM engine adapters. An adapter speaks one provider's chat API, and owns
+    its connection pool, its retry policy and its token accounting.
+
+    Messages are given in the OpenAI chat format, adapters translate them to the provider's one.
+    """
+
+    name = "base"
+    # NOTE: Errors which are retried by chat(), empty means the adapter retries by itself.
+    retryable_errors = (LLMEngineRateLimitError, LLMEngineServerError)
+
+    def __init__(self, *, conf: Optional[Dict[str, Any]] = None):
+        conf = conf or {}
+        self._conf = conf
+        self._enabled = conf.get("enable", False)
+        self.model = conf.get("model", "")
+        self._request_timeout_secs = conf.get("request_timeout_secs", 60)
+        if len(self.retryable_errors) > 0:
+            self._chat_with_retry = aretry_with_deadline_aware_backoff(
+                initial_delay=conf.get("retry_initial_delay_secs", 1),
+                max_retries=conf.get("max_retries", 2),
+                max_delay=conf.get("retry_max_delay_secs", 8),
+                errors=self.retryable_errors
+            )(self._chat)
+        else:
+            self._chat_with_retry = self._chat
+
+    @property
+    def enabled(self) -> bool:
+        return self._enabled
+
+    async def chat(
+        self,
+        *,
+        messages: List[Dict[str, str]],
+        max_tokens: int,
+        temperature: float,
+        json_mode: bool = False,
+        preferred_key: Optional[str] = None
+    ) -> LLMChatResult:
+        result = await self._chat_with_retry(
+            messages=messages,
+            max_tokens=max_tokens,
+            temperature=temperature,
+            json_mode=json_mode,
+            preferred_key=preferred_key
+        )
+        self.account_tokens(result.prompt_tokens, result.completion_tokens)
+        return result
+
+    async def chat_stream(
+        self,
+        *,
+        messages: List[Dict[str, str]],
+        max_tokens: int,
+        temperature: float,
+        json_mode: bool = False,
+        preferred_key: Optional[str] = None
+    ) -> AsyncIterator[str]:
+        """Yields the content deltas of the reply, closing the generator early cancels the upstream request."""
+        # NOTE: Adapters which can't stream yield the whole reply at once.
+        result = await self.chat(
+            messages=messages,
+            max_tokens=max_tokens,
+            temperature=temperature,
+            json_mode=json_mode,
+            preferred_key=preferred_key
+        )
+        yield result.content
+
+    def account_tokens(self, prompt_tokens: int, completion_tokens: int):
+        metrics.incr_counter(f"llm_engine.{self.name}.requests")
+        metrics.incr_counter(f"llm_engine.{self.name}.prompt_tokens", prompt_tokens)
+        metrics.incr_counter(f"llm_engine.{self.name}.completion_tokens", completion_tokens)
+
+    async def close(self):
+        pass
+
+    async def _chat(
+        self,
+        *,
+        messages: List[Dict[str, str]],
+        max_tokens: int,
+        temperature: float,
+        json_mode: bool,
+        preferred_key: Optional[str]
+    ) -> LLMChatResult:
+        raise NotImplementedError
+
+
+class HTTPLLMEngineAdapter(LLMEngineAdapter):
+    """Base class of the adapters which call the provider's REST API directly over their own aiohttp session."""
+
+    api_key_env = ""
+
+    def __init__(self, *, conf: Optional[Dict[str, Any]] = None):
+        super().__init__(conf=conf)
+        conf = conf or {}
+        self._api_base = conf.get("api_base", "").rstrip("/")
+        self._api_key = os.getenv(self.api_key_env, "")
+        if self._enabled and len(self._api_key) == 0:
+            raise LLMEngineSetupException(f"Please set env for {self.api_key_env}.")
+        self._max_connections = conf.get("max_connections", 16)
+        self._http_proxy = conf.get("http_proxy") if conf.get("enable_http_proxy", False) else None
+        self._session: Optional[aiohttp.ClientSession] = None
+
+    def _get_session(self) -> aiohttp.ClientSession:
+        # NOTE: Created lazily, a session must be created inside the running event loop.
+        if self._session is None or self._session.closed:
+            self._session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=self._max_connections),
+                connector_owner=True,
+                timeout=aiohttp.ClientTimeout(total=self._request_timeout_secs),
+                trace_configs=[http_trace_config]
+            )
+        return self._session
+
+    def _get_timeout(self) -> aiohttp.ClientTimeout:
+        # NOTE: The HTTP request must not outlive the deadline of the call.
+        timeout = self._request_timeout_secs
+        time_remaining = get_call_time_remaining()
+        if time_remaining is not None:
+            timeout = min(timeout, time_remaining)
+        return aiohttp.ClientTimeout(total=timeout)
+
+    async def _raise_for_status(self, resp: aiohttp.ClientResponse):
+        if resp.status < 400:
+            return
+        text = await resp.text()
+        message = f"{self.name} API responded {resp.status}: {text[:256]}"
+        if resp.status == 429:
+            raise LLMEngineRateLimitError(message, status=resp.status, headers=resp.headers)
+        if resp.status >= 500:
+            raise LLMEngineServerError(message, status=resp.status, headers=resp.headers)
+        raise LLMEngineError(message, status=resp.status, headers=resp.headers)
+
+    async def _post_json(
+        self,
+        url: str,
+        *,
+        headers: Dict[str, str],
+        payload: Dict[str, Any],
+        estimated_tokens: float = 1
+    ) -> Dict[str, Any]:
+        # NOTE: Queue by priority and fairness here, rather than in arrival order for the connection pool.
+        release_slot = await DEFAULT_OUTBOUND_SCHEDULER.acquire(cost=estimated_tokens)
+        try:
+            async with self._get_session().post(
+                url,
+                headers=headers,
+                data=json.dumps(payload, ensure_ascii=False),
+                timeout=self._get_timeout(),
+                proxy=self._http_proxy
+            ) as resp:
+                await self._raise_for_status(resp)
+                return await resp.json(loads=json.loads, content_type=None)
+        finally:
+            release_slot()
+
+    async def _post_sse(
+        self,
+        url: str,
+        *,
+        headers: Dict[str, str],
+        payload: Dict[str, Any],
+        estimated_tokens: float = 1
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """Yields the JSON events of a server-sent events response, which holds its scheduler slot until closed."""
+        release_slot = await DEFAULT_OUTBOUND_SCHEDULER.acquire(cost=estimated_tokens)
+        try:
+            async with self._get_session().post(
+                url,
+                headers=headers,
+                data=json.dumps(payload, ensure_ascii=False),
+                timeout=self._get_timeout(),
+                proxy=self._http_proxy
+            ) as resp:
+                await self._raise_for_status(resp)
+                async for line in resp.content:
+                    line = line.strip()
+                    if not line.startswith(b"data:"):
+                        continue
+                    data = line[len(b"data:"):].strip()
+                    if data == b"[DONE]":
+                        break
+                    if len(data) > 0:
+                        yield json.loads(data)
+        finally:
+            release_slot()
+
+    async def close(self):
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+
+
+def split_system_prompt(messages: List[Dict[str, str]]):
+    """Splits the OpenAI-style messages into the system prompt and the rest, for the providers taking it apart."""
+    system_prompt = "\n".join(message["content"] for message in messages if message["role"] == "system")
+    return system_prompt, [message for message in messages if message["role"] != "system"]
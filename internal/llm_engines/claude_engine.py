@@ -0,0 +1,106 @@
+# -*- coding: utf-8 -*-
+from typing import Any, AsyncIterator, Dict, List, Optional
+
+from internal.llm_engines.base import (
+    HTTPLLMEngineAdapter,
+    LLMChatResult,
+    split_system_prompt
+)
+from internal.utils.openai_tools import estimate_tokens_used
+
+
+class ClaudeEngineAdapter(HTTPLLMEngineAdapter):
+    """Anthropic Messages API, more info: https://docs.anthropic.com/en/api/messages"""
+
+    name = "claude"
+    api_key_env = "CLAUDE_API_KEY"
+
+    def __init__(self, *, conf: Optional[Dict[str, Any]] = None):
+        super().__init__(conf=conf)
+        conf = conf or {}
+        self._anthropic_version = conf.get("anthropic_version", "2023-06-01")
+
+    def _url(self) -> str:
+        return f"{self._api_base}/v1/messages"
+
+    def _headers(self) -> Dict[str, str]:
+        return {
+            "x-api-key": self._api_key,
+            "anthropic-version": self._anthropic_version,
+            "Content-Type": "application/json",
+        }
+
+    def _payload(self, *, messages: List[Dict[str, str]], max_tokens: int, temperature: float) -> Dict[str, Any]:
+        # NOTE: There is no JSON mode, the truth judgement prompt asks for a JSON object by itself.
+        system_prompt, messages = split_system_prompt(messages)
+        payload = {
+            "model": self.model,
+            "messages": messages,
+            "max_tokens": max_tokens,
+            # NOTE: Claude takes a temperature in [0, 1] rather than [0, 2].
+            "temperature": min(1.0, temperature),
+        }
+        if len(system_prompt) > 0:
+            payload["system"] = system_prompt
+        return payload
+
+    async def _chat(
+        self,
+        *,
+        messages: List[Dict[str, str]],
+        max_tokens: int,
+        temperature: float,
+        json_mode: bool,
+        preferred_key: Optional[str]
+    ) -> LLMChatResult:
+        data = await self._post_json(
+            self._url(),
+            headers=self._headers(),
+            payload=self._payload(messages=messages, max_tokens=max_tokens, temperature=temperature),
+            estimated_tokens=estimate_tokens_used(messages, max_tokens)
+        )
+        usage = data.get("usage") or {}
+        return LLMChatResult(
+            engine=self.name,
+            model=data.get("model", self.model),
+            content="".join(block.get("text", "") for block in data.get("content", []) if block.get("type") == "text"),
+            prompt_tokens=usage.get("input_tokens", 0),
+            completion_tokens=usage.get("output_tokens", 0)
+        )
+
+    async def chat_stream(
+        self,
+        *,
+        messages: List[Dict[str, str]],
+        max_tokens: int,
+        temperature: float,
+        json_mode: bool = False,
+        preferred_key: Optional[str] = None
+    ) -> AsyncIterator[str]:
+        payload = self._payload(messages=messages, max_tokens=max_tokens, temperature=temperature)
+        payload["stream"] = True
+        events = self._post_sse(
+            self._url(),
+            headers=self._headers(),
+            payload=payload,
+            estimated_tokens=estimate_tokens_used(messages, max_tokens)
+        )
+        prompt_tokens = 0
+        completion_tokens = 0
+        try:
+            async for event in events:
+                event_type = event.get("type")
+                if event_type == "message_start":
+                    prompt_tokens = ((event.get("message") or {}).get("usage") or {}).get("input_tokens", 0)
+                elif event_type == "message_delta":
+                    completion_tokens = (event.get("usage") or {}).get("output_tokens", completion_tokens)
+                elif event_type == "content_block_delta":
+                    text = (event.get("delta") or {}).get("text")
+                    if text:
+                        completion_tokens += 1
+                        yield text
+                elif event_type == "message_stop":
+                    break
+        finally:
+            await events.aclose()
+            self.account_tokens(prompt_tokens, completion_tokens)
@@ -0,0 +1,103 @@
+# -*- coding: utf-8 -*-
+from typing import Any, AsyncIterator, Dict, List, Optional
+
+from internal.llm_engines.base import (
+    HTTPLLMEngineAdapter,
+    LLMChatResult,
+    split_system_prompt
+)
+from internal.utils.openai_tools import estimate_tokens_used
+
+
+class GeminiEngineAdapter(HTTPLLMEngineAdapter):
+    """Google Gemini API, more info: https://ai.google.dev/api/generate-content"""
+
+    name = "gemini"
+    api_key_env = "GEMINI_API_KEY"
+
+    def _url(self, method: str) -> str:
+        return f"{self._api_base}/v1beta/models/{self.model}:{method}"
+
+    def _headers(self) -> Dict[str, str]:
+        return {"x-goog-api-key": self._api_key, "Content-Type": "application/json"}
+
+    def _payload(self, *, messages: List[Dict[str, str]], max_tokens: int, temperature: float, json_mode: bool) -> Dict[str, Any]:
+        system_prompt, messages = split_system_prompt(messages)
+        payload = {
+            "contents": [
+                {
+                    "role": "model" if message["role"] == "assistant" else "user",
+                    "parts": [{"text": message["content"]}]
+                }
+                for message in messages
+            ],
+            "generationConfig": {
+                "maxOutputTokens": max_tokens,
+                "temperature": temperature,
+                "candidateCount": 1,
+            },
+        }
+        if len(system_prompt) > 0:
+            payload["systemInstruction"] = {"parts": [{"text": system_prompt}]}
+        if json_mode:
+            payload["generationConfig"]["responseMimeType"] = "application/json"
+        return payload
+
+    @staticmethod
+    def _extract_text(data: Dict[str, Any]) -> str:
+        candidates = data.get("candidates") or []
+        if len(candidates) == 0:
+            return ""
+        parts = (candidates[0].get("content") or {}).get("parts") or []
+        return "".join(part.get("text", "") for part in parts)
+
+    async def _chat(
+        self,
+        *,
+        messages: List[Dict[str, str]],
+        max_tokens: int,
+        temperature: float,
+        json_mode: bool,
+        preferred_key: Optional[str]
+    ) -> LLMChatResult:
+        data = await self._post_json(
+            self._url("generateContent"),
+            headers=self._headers(),
+            payload=self._payload(messages=messages, max_tokens=max_tokens, temperature=temperature, json_mode=json_mode),
+            estimated_tokens=estimate_tokens_used(messages, max_tokens)
+        )
+        usage = data.get("usageMetadata") or {}
+        return LLMChatResult(
+            engine=self.name,
+            model=data.get("modelVersion", self.model),
+            content=self._extract_text(data),
+            prompt_tokens=usage.get("promptTokenCount", 0),
+            completion_tokens=usage.get("candidatesTokenCount", 0)
+        )
+
+    async def chat_stream(
+        self,
+        *,
+        messages: List[Dict[str, str]],
+        max_tokens: int,
+        temperature: float,
+        json_mode: bool = False,
+        preferred_key: Optional[str] = None
+    ) -> AsyncIterator[str]:
+        events = self._post_sse(
+            f"{self._url('streamGenerateContent')}?alt=sse",
+            headers=self._headers(),
+            payload=self._payload(messages=messages, max_tokens=max_tokens, temperature=temperature, json_mode=json_mode),
+            estimated_tokens=estimate_tokens_used(messages, max_tokens)
+        )
+        usage = {}
+        try:
+            async for event in events:
+                # NOTE: Every event carries the usage so far.
+                usage = event.get("usageMetadata") or usage
+                text = self._extract_text(event)
+                if text:
+                    yield text
+        finally:
+            await events.aclose()
+            self.account_tokens(usage.get("promptTokenCount", 0), usage.get("candidatesTokenCount", 0))
@@ -0,0 +1,121 @@
+# -*- coding: utf-8 -*-
+from typing import Any, AsyncIterator, Dict, List, Optional
+
+from internal.llm_engines.base import LLMChatResult, LLMEngineAdapter
+from internal.utils.distributed_token_budget import DistributedTokenBudget
+from internal.utils.openai_key_pool import OpenAIKeyPool
+from internal.utils.openai_tools import (
+    acall_chat_completion_api_with_key_pool,
+    aiter_chat_completion_stream_deltas,
+    estimate_tokens_used
+)
+
+
+class OpenAIEngineAdapter(LLMEngineAdapter):
+    """
+    OpenAI Chat Completions API, through the openai SDK over the session installed in openai.aiosession,
+    routed across the API keys by the key pool and limited by the cluster-wide token budget.
+    """
+
+    name = "openai"
+    # NOTE: acall_chat_completion_api_with_key_pool retries by itself, on another key.
+    retryable_errors = ()
+
+    def __init__(
+        self,
+        *,
+        conf: Optional[Dict[str, Any]] = None,
+        key_pool: OpenAIKeyPool,
+        token_budget: Optional[DistributedTokenBudget] = None
+    ):
+        super().__init__(conf=conf)
+        conf = conf or {}
+        # NOTE: OpenAI is the default engine, it can't be disabled.
+        self._enabled = True
+        self.model = conf.get("chat_model", "gpt-3.5-turbo")
+        self._request_timeout_secs = conf.get("request_timeout_secs", 60)
+        self._key_pool = key_pool
+        self._token_budget = token_budget
+
+    def _kwargs(
+        self,
+        *,
+        messages: List[Dict[str, str]],
+        max_tokens: int,
+        temperature: float,
+        json_mode: bool,
+        preferred_key: Optional[str]
+    ) -> Dict[str, Any]:
+        return dict(
+            key_pool=self._key_pool,
+            token_budget=self._token_budget,
+            estimated_tokens=estimate_tokens_used(messages, max_tokens),
+            preferred_key=preferred_key,
+            messages=messages,
+            model=self.model,
+            frequency_penalty=0.0,
+            presence_penalty=0.0,
+            temperature=temperature,
+            max_tokens=max_tokens,
+            n=1,
+            top_p=1.0,
+            response_format={"type": "json_object"} if json_mode else {"type": "text"},
+            request_timeout=self._request_timeout_secs,
+        )
+
+    async def _chat(
+        self,
+        *,
+        messages: List[Dict[str, str]],
+        max_tokens: int,
+        temperature: float,
+        json_mode: bool,
+        preferred_key: Optional[str]
+    ) -> LLMChatResult:
+        chat_completion = await acall_chat_completion_api_with_key_pool(
+            **self._kwargs(
+                messages=messages,
+                max_tokens=max_tokens,
+                temperature=temperature,
+                json_mode=json_mode,
+                preferred_key=preferred_key
+            )
+        )
+        return LLMChatResult(
+            engine=self.name,
+            model=chat_completion.get("model", self.model),
+            content=chat_completion.choices[0].message.content or "",
+            prompt_tokens=chat_completion.usage.prompt_tokens,
+            completion_tokens=chat_completion.usage.completion_tokens
+        )
+
+    async def chat_stream(
+        self,
+        *,
+        messages: List[Dict[str, str]],
+        max_tokens: int,
+        temperature: float,
+        json_mode: bool = False,
+        preferred_key: Optional[str] = None
+    ) -> AsyncIterator[str]:
+        stream = await acall_chat_completion_api_with_key_pool(
+            stream=True,
+            **self._kwargs(
+                messages=messages,
+                max_tokens=max_tokens,
+                temperature=temperature,
+                json_mode=json_mode,
+                preferred_key=preferred_key
+            )
+        )
+        stream_deltas = aiter_chat_completion_stream_deltas(stream)
+        num_deltas = 0
+        try:
+            async for delta in stream_deltas:
+                num_deltas += 1
+                yield delta
+        finally:
+            # NOTE: Closing the stream early cancels the upstream HTTP request.
+            await stream_deltas.aclose()
+            # NOTE: Streamed completions carry no usage, each delta carries one token.
+            self.account_tokens(0, num_deltas)
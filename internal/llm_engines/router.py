@@ -0,0 +1,155 @@
+# -*- coding: utf-8 -*-
+import asyncio
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+import aiohttp
+import openai.error as openai_error
+from loguru import logger as loguru_logger
+
+from internal.llm_engines.base import LLMEngineAdapter, LLMEngineError
+from internal.utils import metrics
+from internal.utils.admission_control import DEFAULT_ADMISSION_CONTROLLER
+from internal.utils.retry_with_backoff import (
+    get_call_time_remaining,
+    measure_local_waits
+)
+
+# NOTE: The engine rejected the request itself (e.g. too long a prompt), any other engine would as well.
+_REQUEST_ERROR_STATUSES = (400, 404, 413, 422)
+
+
+def is_upstream_error(exc: BaseException) -> bool:
+    """
+    Tells whether exc is the failure of the engine or of the transport to it. The others (deadlines,
+    abandoned calls, local queues and budgets, unparsable replies, bad requests) say nothing about
+    the health of the engine, and no other engine would do better.
+    """
+    if isinstance(exc, LLMEngineError):
+        return exc.status not in _REQUEST_ERROR_STATUSES
+    if isinstance(exc, openai_error.OpenAIError):
+        return not isinstance(exc, openai_error.InvalidRequestError)
+    if isinstance(exc, asyncio.TimeoutError):
+        # NOTE: The HTTP timeout is cut to the deadline of the call, which may be what ran out.
+        time_remaining = get_call_time_remaining()
+        return time_remaining is None or time_remaining > 0
+    if isinstance(exc, aiohttp.ClientError):
+        return True
+    # NOTE: The retries give up with the last error as the cause.
+    return exc.__cause__ is not None and is_upstream_error(exc.__cause__)
+
+
+class LLMEngineHealth:
+
+    def __init__(self):
+        self.samples = 0
+        self.latency_ewma = 0.0
+        self.error_ewma = 0.0
+        self.open_until = 0.0
+
+    def is_open(self, now: float) -> bool:
+        return self.open_until > now
+
+
+class LLMEngineRouter:
+    """
+    Routes each call to the requested LLM engine, and fails over to the next healthy engine when it errors.
+
+    An engine whose error rate or latency (both EWMA) goes over the threshold is taken out of rotation
+    (circuit open) for a while, after which it is tried again (half open), and put back on success. Only
+    the upstream errors (see is_upstream_error) count against an engine and fail over.
+    """
+
+    def __init__(
+        self,
+        *,
+        adapters: List[LLMEngineAdapter],
+        default_engine: str = "openai",
+        conf: Optional[Dict[str, Any]] = None
+    ):
+        conf = conf or {}
+        self._adapters: Dict[str, LLMEngineAdapter] = {adapter.name: adapter for adapter in adapters if adapter.enabled}
+        self._default_engine = default_engine
+        self._enable_failover = conf.get("enable_failover", True)
+        failover_order = conf.get("failover_order", ["openai", "azure", "claude", "gemini"])
+        self._failover_order = [name for name in failover_order if name in self._adapters] + \
+            [name for name in self._adapters if name not in failover_order]
+        self._ewma_alpha = conf.get("ewma_alpha", 0.2)
+        self._min_samples = conf.get("min_samples", 5)
+        self._error_rate_threshold = conf.get("error_rate_threshold", 0.5)
+        self._latency_threshold_secs = conf.get("latency_threshold_secs", 15)
+        self._open_circuit_secs = conf.get("open_circuit_secs", 30)
+        self._health: Dict[str, LLMEngineHealth] = {name: LLMEngineHealth() for name in self._adapters}
+
+    @property
+    def engines(self) -> List[str]:
+        return list(self._failover_order)
+
+    def get(self, engine: str) -> LLMEngineAdapter:
+        """Returns the adapter of the engine, or of the default engine if it isn't enabled."""
+        return self._adapters.get(engine) or self._adapters[self._default_engine]
+
+    def candidates(self, engine: str) -> List[LLMEngineAdapter]:
+        """Returns the adapters to try in order, the requested engine first if it is healthy."""
+        preferred = self.get(engine)
+        if not self._enable_failover:
+            return [preferred]
+        now = time.monotonic()
+        ordered = [preferred] + [self._adapters[name] for name in self._failover_order if name != preferred.name]
+        healthy = [adapter for adapter in ordered if not self._health[adapter.name].is_open(now)]
+        # NOTE: When every engine is out of rotation, trying them anyway beats failing right away.
+        return healthy if len(healthy) > 0 else ordered
+
+    def pick(self, engine: str) -> LLMEngineAdapter:
+        return self.candidates(engine)[0]
+
+    def record(self, engine: str, *, latency: float, ok: bool):
+        # NOTE: The inbound admission limit follows how well the upstream keeps up.
+        DEFAULT_ADMISSION_CONTROLLER.observe_upstream(latency=latency, ok=ok)
+        health = self._health.get(engine)
+        if health is None:
+            return
+        alpha = self._ewma_alpha
+        health.samples += 1
+        health.error_ewma = (1 - alpha) * health.error_ewma + alpha * (0.0 if ok else 1.0)
+        if ok:
+            health.latency_ewma = (1 - alpha) * health.latency_ewma + alpha * latency
+        else:
+            metrics.incr_counter(f"llm_engine.{engine}.errors")
+        metrics.set_gauge(f"llm_engine.{engine}.error_rate", health.error_ewma)
+        metrics.set_gauge(f"llm_engine.{engine}.latency_ewma", health.latency_ewma)
+
+        now = time.monotonic()
+        if health.samples >= self._min_samples and not health.is_open(now) and \
+                (health.error_ewma > self._error_rate_threshold or health.latency_ewma > self._latency_threshold_secs):
+            health.open_until = now + self._open_circuit_secs
+            metrics.incr_counter(f"llm_engine.{engine}.circuit_opened")
+            loguru_logger.warning(
+                f"LLM engine {engine} is unhealthy (error rate: {health.error_ewma:.2f}, "
+                f"latency: {health.latency_ewma:.3f}s), take it out of rotation for {self._open_circuit_secs}s."
+            )
+
+    async def run(self, engine: str, call: Callable[[LLMEngineAdapter], Awaitable[Any]]) -> Any:
+        """Runs call(adapter) on the requested engine, failing over to the next candidate on error."""
+        last_exc = None
+        for idx, adapter in enumerate(self.candidates(engine)):
+            if idx > 0:
+                metrics.incr_counter("llm_engine_router.failovers")
+                loguru_logger.warning(f"Fail over to LLM engine {adapter.name}, err:{last_exc}.")
+            # NOTE: The time queued for a slot or a budget, or backing off, says nothing about the engine.
+            with measure_local_waits() as local_wait_secs:
+                st = time.monotonic()
+                try:
+                    result = await call(adapter)
+                    self.record(adapter.name, latency=time.monotonic() - st - local_wait_secs(), ok=True)
+                    return result
+                except Exception as exc:
+                    if not is_upstream_error(exc):
+                        raise
+                    self.record(adapter.name, latency=time.monotonic() - st - local_wait_secs(), ok=False)
+                    last_exc = exc
+        raise last_exc
+
+    async def close(self):
+        for adapter in self._adapters.values():
+            await adapter.close()
@@ -1,6 +1,7 @@
 # -*- coding: utf-8 -*-
 # Generated by the protocol buffer compiler.  DO NOT EDIT!
 # source: turtle_soup_game_service.proto
+# Protobuf Python Version: 4.25.0
 """Generated protocol buffer code."""
 from google.protobuf import descriptor as _descriptor
 from google.protobuf import descriptor_pool as _descriptor_pool
@@ -13,15 +14,17 @@ _sym_db = _symbol_database.Default()
 
 
 
-DESCRIPTOR = _descriptor_pool.Default().AddSerializedFile(b'\n\x1eturtle_soup_game_service.proto\x12\x18turtle_soup_game_service\"\r\n\x0bPingRequest\"\x0e\n\x0cPongResponse\"%\n\x08\x41IResult\x12\x0c\n\x04\x63ode\x18\x01 \x01(\r\x12\x0b\n\x03msg\x18\x02 \x01(\t\"\x82\x02\n\x17GenerateDialogueRequest\x12\x17\n\x0f\x63onversation_id\x18\x01 \x01(\t\x12\x37\n\nllm_engine\x18\x02 \x01(\x0e\x32#.turtle_soup_game_service.LLMEngine\x12\"\n\x1a\x63onversation_system_prompt\x18\x03 \x01(\t\x12%\n\x1dto_reply_for_general_question\x18\x04 \x01(\x08\x12\x0c\n\x04\x63hat\x18\x05 \x01(\t\x12\x15\n\rext_thread_id\x18\x06 \x01(\t\x12\x0f\n\x07\x65xt_uid\x18\x07 \x01(\t\x12\x14\n\x0c\x65xt_nickname\x18\x08 \x01(\t\"\x9a\x01\n\x18GenerateDialogueResponse\x12/\n\x03ret\x18\x01 \x01(\x0b\x32\".turtle_soup_game_service.AIResult\x12\x17\n\x0f\x63onversation_id\x18\x02 \x01(\t\x12\x0c\n\x04\x63hat\x18\x03 \x01(\t\x12\x15\n\rext_thread_id\x18\x04 \x01(\t\x12\x0f\n\x07\x65xt_uid\x18\x05 \x01(\t*:\n\tLLMEngine\x12\n\n\x06OPENAI\x10\x00\x12\t\n\x05\x41ZURE\x10\x01\x12\n\n\x06GEMINI\x10\x02\x12\n\n\x06\x43LAUDE\x10\x03\x32\xed\x01\n\x15TurtleSoupGameService\x12W\n\x04Ping\x12%.turtle_soup_game_service.PingRequest\x1a&.turtle_soup_game_service.PongResponse\"\x00\x12{\n\x10GenerateDialogue\x12\x31.turtle_soup_game_service.GenerateDialogueRequest\x1a\x32.turtle_soup_game_service.GenerateDialogueResponse\"\x00\x62\x06proto3')
+DESCRIPTOR = _descriptor_pool.Default().AddSerializedFile(b'\n\x1eturtle_soup_game_service.proto\x12\x18turtle_soup_game_service\"\r\n\x0bPingRequest\"\x0e\n\x0cPongResponse\"%\n\x08\x41IResult\x12\x0c\n\x04\x63ode\x18\x01 \x01(\r\x12\x0b\n\x03msg\x18\x02 \x01(\t\"\x82\x02\n\x17GenerateDialogueRequest\x12\x17\n\x0f\x63onversation_id\x18\x01 \x01(\t\x12\x37\n\nllm_engine\x18\x02 \x01(\x0e\x32#.turtle_soup_game_service.LLMEngine\x12\"\n\x1a\x63onversation_system_prompt\x18\x03 \x01(\t\x12%\n\x1dto_reply_for_general_question\x18\x04 \x01(\x08\x12\x0c\n\x04\x63hat\x18\x05 \x01(\t\x12\x15\n\rext_thread_id\x18\x06 \x01(\t\x12\x0f\n\x07\x65xt_uid\x18\x07 \x01(\t\x12\x14\n\x0c\x65xt_nickname\x18\x08 \x01(\t\"\xe3\x01\n\x18GenerateDialogueResponse\x12/\n\x03ret\x18\x01 \x01(\x0b\x32\".turtle_soup_game_service.AIResult\x12\x17\n\x0f\x63onversation_id\x18\x02 \x01(\t\x12\x0c\n\x04\x63hat\x18\x03 \x01(\t\x12\x15\n\rext_thread_id\x18\x04 \x01(\t\x12\x0f\n\x07\x65xt_uid\x18\x05 \x01(\t\x12\x32\n\x07verdict\x18\x06 \x01(\x0e\x32!.turtle_soup_game_service.Verdict\x12\x13\n\x0bis_key_clue\x18\x07 \x01(\x08\"T\n\nTokenUsage\x12\x15\n\rprompt_tokens\x18\x01 \x01(\r\x12\x19\n\x11\x63ompletion_tokens\x18\x02 \x01(\r\x12\x14\n\x0ctotal_tokens\x18\x03 \x01(\r\"\xbf\x02\n\x1eGenerateDialogueStreamResponse\x12/\n\x03ret\x18\x01 \x01(\x0b\x32\".turtle_soup_game_service.AIResult\x12\x17\n\x0f\x63onversation_id\x18\x02 \x01(\t\x12\r\n\x05\x64\x65lta\x18\x03 \x01(\t\x12\x10\n\x08is_final\x18\x04 \x01(\x08\x12\x0c\n\x04\x63hat\x18\x05 \x01(\t\x12\x33\n\x05usage\x18\x06 \x01(\x0b\x32$.turtle_soup_game_service.TokenUsage\x12\x15\n\rext_thread_id\x18\x07 \x01(\t\x12\x0f\n\x07\x65xt_uid\x18\x08 \x01(\t\x12\x32\n\x07verdict\x18\t \x01(\x0e\x32!.turtle_soup_game_service.Verdict\x12\x13\n\x0bis_key_clue\x18\n \x01(\x08\"|\n\x1c\x42\x61tchGenerateDialogueRequest\x12\x43\n\x08requests\x18\x01 \x03(\x0b\x32\x31.turtle_soup_game_service.GenerateDialogueRequest\x12\x17\n\x0fmax_concurrency\x18\x02 \x01(\r\"\x97\x01\n\x1d\x42\x61tchGenerateDialogueResponse\x12/\n\x03ret\x18\x01 \x01(\x0b\x32\".turtle_soup_game_service.AIResult\x12\x45\n\tresponses\x18\x02 \x03(\x0b\x32\x32.turtle_soup_game_service.GenerateDialogueResponse\"_\n\x15RegisterPuzzleRequest\x12\x15\n\rext_thread_id\x18\x01 \x01(\t\x12\r\n\x05story\x18\x02 \x01(\t\x12\r\n\x05truth\x18\x03 \x01(\t\x12\x11\n\tkey_clues\x18\x04 \x03(\t\"`\n\x16RegisterPuzzleResponse\x12/\n\x03ret\x18\x01 \x01(\x0b\x32\".turtle_soup_game_service.AIResult\x12\x15\n\rext_thread_id\x18\x02 \x01(\t*:\n\tLLMEngine\x12\n\n\x06OPENAI\x10\x00\x12\t\n\x05\x41ZURE\x10\x01\x12\n\n\x06GEMINI\x10\x02\x12\n\n\x06\x43LAUDE\x10\x03*\xac\x01\n\x07Verdict\x12\x17\n\x13VERDICT_UNSPECIFIED\x10\x00\x12\x0f\n\x0bVERDICT_YES\x10\x01\x12\x0e\n\nVERDICT_NO\x10\x02\x12\x16\n\x12VERDICT_IRRELEVANT\x10\x03\x12\x15\n\x11VERDICT_PARTIALLY\x10\x04\x12\x12\n\x0eVERDICT_SOLVED\x10\x05\x12\x11\n\rVERDICT_CLOSE\x10\x06\x12\x11\n\rVERDICT_WRONG\x10\x07\x32\xfd\x04\n\x15TurtleSoupGameService\x12W\n\x04Ping\x12%.turtle_soup_game_service.PingRequest\x1a&.turtle_soup_game_service.PongResponse\"\x00\x12{\n\x10GenerateDialogue\x12\x31.turtle_soup_game_service.GenerateDialogueRequest\x1a\x32.turtle_soup_game_service.GenerateDialogueResponse\"\x00\x12\x89\x01\n\x16GenerateDialogueStream\x12\x31.turtle_soup_game_service.GenerateDialogueRequest\x1a\x38.turtle_soup_game_service.GenerateDialogueStreamResponse\"\x00\x30\x01\x12\x8a\x01\n\x15\x42\x61tchGenerateDialogue\x12\x36.turtle_soup_game_service.BatchGenerateDialogueRequest\x1a\x37.turtle_soup_game_service.BatchGenerateDialogueResponse\"\x00\x12u\n\x0eRegisterPuzzle\x12/.turtle_soup_game_service.RegisterPuzzleRequest\x1a\x30.turtle_soup_game_service.RegisterPuzzleResponse\"\x00\x62\x06proto3')
 
 _globals = globals()
 _builder.BuildMessageAndEnumDescriptors(DESCRIPTOR, _globals)
 _builder.BuildTopDescriptorsAndMessages(DESCRIPTOR, 'turtle_soup_game_service_pb2', _globals)
 if _descriptor._USE_C_DESCRIPTORS == False:
   DESCRIPTOR._options = None
-  _globals['_LLMENGINE']._serialized_start=548
-  _globals['_LLMENGINE']._serialized_end=606
+  _globals['_LLMENGINE']._serialized_start=1504
+  _globals['_LLMENGINE']._serialized_end=1562
+  _globals['_VERDICT']._serialized_start=1565
+  _globals['_VERDICT']._serialized_end=1737
   _globals['_PINGREQUEST']._serialized_start=60
   _globals['_PINGREQUEST']._serialized_end=73
   _globals['_PONGRESPONSE']._serialized_start=75
@@ -31,7 +34,19 @@ if _descriptor._USE_C_DESCRIPTORS == False:
   _globals['_GENERATEDIALOGUEREQUEST']._serialized_start=131
   _globals['_GENERATEDIALOGUEREQUEST']._serialized_end=389
   _globals['_GENERATEDIALOGUERESPONSE']._serialized_start=392
-  _globals['_GENERATEDIALOGUERESPONSE']._serialized_end=546
-  _globals['_TURTLESOUPGAMESERVICE']._serialized_start=609
-  _globals['_TURTLESOUPGAMESERVICE']._serialized_end=846
+  _globals['_GENERATEDIALOGUERESPONSE']._serialized_end=619
+  _globals['_TOKENUSAGE']._serialized_start=621
+  _globals['_TOKENUSAGE']._serialized_end=705
+  _globals['_GENERATEDIALOGUESTREAMRESPONSE']._serialized_start=708
+  _globals['_GENERATEDIALOGUESTREAMRESPONSE']._serialized_end=1027
+  _globals['_BATCHGENERATEDIALOGUEREQUEST']._serialized_start=1029
+  _globals['_BATCHGENERATEDIALOGUEREQUEST']._serialized_end=1153
+  _globals['_BATCHGENERATEDIALOGUERESPONSE']._serialized_start=1156
+  _globals['_BATCHGENERATEDIALOGUERESPONSE']._serialized_end=1307
+  _globals['_REGISTERPUZZLEREQUEST']._serialized_start=1309
+  _globals['_REGISTERPUZZLEREQUEST']._serialized_end=1404
+  _globals['_REGISTERPUZZLERESPONSE']._serialized_start=1406
+  _globals['_REGISTERPUZZLERESPONSE']._serialized_end=1502
+  _globals['_TURTLESOUPGAMESERVICE']._serialized_start=1740
+  _globals['_TURTLESOUPGAMESERVICE']._serialized_end=2377
 # @@protoc_insertion_point(module_scope)
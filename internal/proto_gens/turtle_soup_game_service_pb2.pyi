@@ -1,31 +1,51 @@
+from google.protobuf.internal import containers as _containers
 from google.protobuf.internal import enum_type_wrapper as _enum_type_wrapper
 from google.protobuf import descriptor as _descriptor
 from google.protobuf import message as _message
-from typing import ClassVar as _ClassVar, Mapping as _Mapping, Optional as _Optional, Union as _Union
+from typing import ClassVar as _ClassVar, Iterable as _Iterable, Mapping as _Mapping, Optional as _Optional, Union as _Union
 
 DESCRIPTOR: _descriptor.FileDescriptor
 
 class LLMEngine(int, metaclass=_enum_type_wrapper.EnumTypeWrapper):
-    __slots__ = []
+    __slots__ = ()
     OPENAI: _ClassVar[LLMEngine]
     AZURE: _ClassVar[LLMEngine]
     GEMINI: _ClassVar[LLMEngine]
     CLAUDE: _ClassVar[LLMEngine]
+
+class Verdict(int, metaclass=_enum_type_wrapper.EnumTypeWrapper):
+    __slots__ = ()
+    VERDICT_UNSPECIFIED: _ClassVar[Verdict]
+    VERDICT_YES: _ClassVar[Verdict]
+    VERDICT_NO: _ClassVar[Verdict]
+    VERDICT_IRRELEVANT: _ClassVar[Verdict]
+    VERDICT_PARTIALLY: _ClassVar[Verdict]
+    VERDICT_SOLVED: _ClassVar[Verdict]
+    VERDICT_CLOSE: _ClassVar[Verdict]
+    VERDICT_WRONG: _ClassVar[Verdict]
 OPENAI: LLMEngine
 AZURE: LLMEngine
 GEMINI: LLMEngine
 CLAUDE: LLMEngine
+VERDICT_UNSPECIFIED: Verdict
+VERDICT_YES: Verdict
+VERDICT_NO: Verdict
+VERDICT_IRRELEVANT: Verdict
+VERDICT_PARTIALLY: Verdict
+VERDICT_SOLVED: Verdict
+VERDICT_CLOSE: Verdict
+VERDICT_WRONG: Verdict
 
 class PingRequest(_message.Message):
-    __slots__ = []
+    __slots__ = ()
     def __init__(self) -> None: ...
 
 class PongResponse(_message.Message):
-    __slots__ = []
+    __slots__ = ()
     def __init__(self) -> None: ...
 
 class AIResult(_message.Message):
-    __slots__ = ["code", "msg"]
+    __slots__ = ("code", "msg")
     CODE_FIELD_NUMBER: _ClassVar[int]
     MSG_FIELD_NUMBER: _ClassVar[int]
     code: int
@@ -33,7 +53,7 @@ class AIResult(_message.Message):
     def __init__(self, code: _Optional[int] = ..., msg: _Optional[str] = ...) -> None: ...
 
 class GenerateDialogueRequest(_message.Message):
-    __slots__ = ["conversation_id", "llm_engine", "conversation_system_prompt", "to_reply_for_general_question", "chat", "ext_thread_id", "ext_uid", "ext_nickname"]
+    __slots__ = ("conversation_id", "llm_engine", "conversation_system_prompt", "to_reply_for_general_question", "chat", "ext_thread_id", "ext_uid", "ext_nickname")
     CONVERSATION_ID_FIELD_NUMBER: _ClassVar[int]
     LLM_ENGINE_FIELD_NUMBER: _ClassVar[int]
     CONVERSATION_SYSTEM_PROMPT_FIELD_NUMBER: _ClassVar[int]
@@ -53,15 +73,89 @@ class GenerateDialogueRequest(_message.Message):
     def __init__(self, conversation_id: _Optional[str] = ..., llm_engine: _Optional[_Union[LLMEngine, str]] = ..., conversation_system_prompt: _Optional[str] = ..., to_reply_for_general_question: bool = ..., chat: _Optional[str] = ..., ext_thread_id: _Optional[str] = ..., ext_uid: _Optional[str] = ..., ext_nickname: _Optional[str] = ...) -> None: ...
 
 class GenerateDialogueResponse(_message.Message):
-    __slots__ = ["ret", "conversation_id", "chat", "ext_thread_id", "ext_uid"]
+    __slots__ = ("ret", "conversation_id", "chat", "ext_thread_id", "ext_uid", "verdict", "is_key_clue")
+    RET_FIELD_NUMBER: _ClassVar[int]
+    CONVERSATION_ID_FIELD_NUMBER: _ClassVar[int]
+    CHAT_FIELD_NUMBER: _ClassVar[int]
+    EXT_THREAD_ID_FIELD_NUMBER: _ClassVar[int]
+    EXT_UID_FIELD_NUMBER: _ClassVar[int]
+    VERDICT_FIELD_NUMBER: _ClassVar[int]
+    IS_KEY_CLUE_FIELD_NUMBER: _ClassVar[int]
+    ret: AIResult
+    conversation_id: str
+    chat: str
+    ext_thread_id: str
+    ext_uid: str
+    verdict: Verdict
+    is_key_clue: bool
+    def __init__(self, ret: _Optional[_Union[AIResult, _Mapping]] = ..., conversation_id: _Optional[str] = ..., chat: _Optional[str] = ..., ext_thread_id: _Optional[str] = ..., ext_uid: _Optional[str] = ..., verdict: _Optional[_Union[Verdict, str]] = ..., is_key_clue: bool = ...) -> None: ...
+
+class TokenUsage(_message.Message):
+    __slots__ = ("prompt_tokens", "completion_tokens", "total_tokens")
+    PROMPT_TOKENS_FIELD_NUMBER: _ClassVar[int]
+    COMPLETION_TOKENS_FIELD_NUMBER: _ClassVar[int]
+    TOTAL_TOKENS_FIELD_NUMBER: _ClassVar[int]
+    prompt_tokens: int
+    completion_tokens: int
+    total_tokens: int
+    def __init__(self, prompt_tokens: _Optional[int] = ..., completion_tokens: _Optional[int] = ..., total_tokens: _Optional[int] = ...) -> None: ...
+
+class GenerateDialogueStreamResponse(_message.Message):
+    __slots__ = ("ret", "conversation_id", "delta", "is_final", "chat", "usage", "ext_thread_id", "ext_uid", "verdict", "is_key_clue")
     RET_FIELD_NUMBER: _ClassVar[int]
     CONVERSATION_ID_FIELD_NUMBER: _ClassVar[int]
+    DELTA_FIELD_NUMBER: _ClassVar[int]
+    IS_FINAL_FIELD_NUMBER: _ClassVar[int]
     CHAT_FIELD_NUMBER: _ClassVar[int]
+    USAGE_FIELD_NUMBER: _ClassVar[int]
     EXT_THREAD_ID_FIELD_NUMBER: _ClassVar[int]
     EXT_UID_FIELD_NUMBER: _ClassVar[int]
+    VERDICT_FIELD_NUMBER: _ClassVar[int]
+    IS_KEY_CLUE_FIELD_NUMBER: _ClassVar[int]
     ret: AIResult
     conversation_id: str
+    delta: str
+    is_final: bool
     chat: str
+    usage: TokenUsage
     ext_thread_id: str
     ext_uid: str
-    def __init__(self, ret: _Optional[_Union[AIResult, _Mapping]] = ..., conversation_id: _Optional[str] = ..., chat: _Optional[str] = ..., ext_thread_id: _Optional[str] = ..., ext_uid: _Optional[str] = ...) -> None: ...
+    verdict: Verdict
+    is_key_clue: bool
+    def __init__(self, ret: _Optional[_Union[AIResult, _Mapping]] = ..., conversation_id: _Optional[str] = ..., delta: _Optional[str] = ..., is_final: bool = ..., chat: _Optional[str] = ..., usage: _Optional[_Union[TokenUsage, _Mapping]] = ..., ext_thread_id: _Optional[str] = ..., ext_uid: _Optional[str] = ..., verdict: _Optional[_Union[Verdict, str]] = ..., is_key_clue: bool = ...) -> None: ...
+
+class BatchGenerateDialogueRequest(_message.Message):
+    __slots__ = ("requests", "max_concurrency")
+    REQUESTS_FIELD_NUMBER: _ClassVar[int]
+    MAX_CONCURRENCY_FIELD_NUMBER: _ClassVar[int]
+    requests: _containers.RepeatedCompositeFieldContainer[GenerateDialogueRequest]
+    max_concurrency: int
+    def __init__(self, requests: _Optional[_Iterable[_Union[GenerateDialogueRequest, _Mapping]]] = ..., max_concurrency: _Optional[int] = ...) -> None: ...
+
+class BatchGenerateDialogueResponse(_message.Message):
+    __slots__ = ("ret", "responses")
+    RET_FIELD_NUMBER: _ClassVar[int]
+    RESPONSES_FIELD_NUMBER: _ClassVar[int]
+    ret: AIResult
+    responses: _containers.RepeatedCompositeFieldContainer[GenerateDialogueResponse]
+    def __init__(self, ret: _Optional[_Union[AIResult, _Mapping]] = ..., responses: _Optional[_Iterable[_Union[GenerateDialogueResponse, _Mapping]]] = ...) -> None: ...
+
+class RegisterPuzzleRequest(_message.Message):
+    __slots__ = ("ext_thread_id", "story", "truth", "key_clues")
+    EXT_THREAD_ID_FIELD_NUMBER: _ClassVar[int]
+    STORY_FIELD_NUMBER: _ClassVar[int]
+    TRUTH_FIELD_NUMBER: _ClassVar[int]
+    KEY_CLUES_FIELD_NUMBER: _ClassVar[int]
+    ext_thread_id: str
+    story: str
+    truth: str
+    key_clues: _containers.RepeatedScalarFieldContainer[str]
+    def __init__(self, ext_thread_id: _Optional[str] = ..., story: _Optional[str] = ..., truth: _Optional[str] = ..., key_clues: _Optional[_Iterable[str]] = ...) -> None: ...
+
+class RegisterPuzzleResponse(_message.Message):
+    __slots__ = ("ret", "ext_thread_id")
+    RET_FIELD_NUMBER: _ClassVar[int]
+    EXT_THREAD_ID_FIELD_NUMBER: _ClassVar[int]
+    ret: AIResult
+    ext_thread_id: str
+    def __init__(self, ret: _Optional[_Union[AIResult, _Mapping]] = ..., ext_thread_id: _Optional[str] = ...) -> None: ...
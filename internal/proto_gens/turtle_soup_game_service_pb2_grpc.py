@@ -25,6 +25,21 @@ class TurtleSoupGameServiceStub(object):
                 request_serializer=turtle__soup__game__service__pb2.GenerateDialogueRequest.SerializeToString,
                 response_deserializer=turtle__soup__game__service__pb2.GenerateDialogueResponse.FromString,
                 )
+        self.GenerateDialogueStream = channel.unary_stream(
+                '/turtle_soup_game_service.TurtleSoupGameService/GenerateDialogueStream',
+                request_serializer=turtle__soup__game__service__pb2.GenerateDialogueRequest.SerializeToString,
+                response_deserializer=turtle__soup__game__service__pb2.GenerateDialogueStreamResponse.FromString,
+                )
+        self.BatchGenerateDialogue = channel.unary_unary(
+                '/turtle_soup_game_service.TurtleSoupGameService/BatchGenerateDialogue',
+                request_serializer=turtle__soup__game__service__pb2.BatchGenerateDialogueRequest.SerializeToString,
+                response_deserializer=turtle__soup__game__service__pb2.BatchGenerateDialogueResponse.FromString,
+                )
+        self.RegisterPuzzle = channel.unary_unary(
+                '/turtle_soup_game_service.TurtleSoupGameService/RegisterPuzzle',
+                request_serializer=turtle__soup__game__service__pb2.RegisterPuzzleRequest.SerializeToString,
+                response_deserializer=turtle__soup__game__service__pb2.RegisterPuzzleResponse.FromString,
+                )
 
 
 class TurtleSoupGameServiceServicer(object):
@@ -43,6 +58,24 @@ class TurtleSoupGameServiceServicer(object):
         context.set_details('Method not implemented!')
         raise NotImplementedError('Method not implemented!')
 
+    def GenerateDialogueStream(self, request, context):
+        """Missing associated documentation comment in .proto file."""
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details('Method not implemented!')
+        raise NotImplementedError('Method not implemented!')
+
+    def BatchGenerateDialogue(self, request, context):
+        """Missing associated documentation comment in .proto file."""
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details('Method not implemented!')
+        raise NotImplementedError('Method not implemented!')
+
+    def RegisterPuzzle(self, request, context):
+        """Missing associated documentation comment in .proto file."""
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details('Method not implemented!')
+        raise NotImplementedError('Method not implemented!')
+
 
 def add_TurtleSoupGameServiceServicer_to_server(servicer, server):
     rpc_method_handlers = {
@@ -56,6 +89,21 @@ def add_TurtleSoupGameServiceServicer_to_server(servicer, server):
                     request_deserializer=turtle__soup__game__service__pb2.GenerateDialogueRequest.FromString,
                     response_serializer=turtle__soup__game__service__pb2.GenerateDialogueResponse.SerializeToString,
             ),
+            'GenerateDialogueStream': grpc.unary_stream_rpc_method_handler(
+                    servicer.GenerateDialogueStream,
+                    request_deserializer=turtle__soup__game__service__pb2.GenerateDialogueRequest.FromString,
+                    response_serializer=turtle__soup__game__service__pb2.GenerateDialogueStreamResponse.SerializeToString,
+            ),
+            'BatchGenerateDialogue': grpc.unary_unary_rpc_method_handler(
+                    servicer.BatchGenerateDialogue,
+                    request_deserializer=turtle__soup__game__service__pb2.BatchGenerateDialogueRequest.FromString,
+                    response_serializer=turtle__soup__game__service__pb2.BatchGenerateDialogueResponse.SerializeToString,
+            ),
+            'RegisterPuzzle': grpc.unary_unary_rpc_method_handler(
+                    servicer.RegisterPuzzle,
+                    request_deserializer=turtle__soup__game__service__pb2.RegisterPuzzleRequest.FromString,
+                    response_serializer=turtle__soup__game__service__pb2.RegisterPuzzleResponse.SerializeToString,
+            ),
     }
     generic_handler = grpc.method_handlers_generic_handler(
             'turtle_soup_game_service.TurtleSoupGameService', rpc_method_handlers)
@@ -100,3 +148,54 @@ class TurtleSoupGameService(object):
             turtle__soup__game__service__pb2.GenerateDialogueResponse.FromString,
             options, channel_credentials,
             insecure, call_credentials, compression, wait_for_ready, timeout, metadata)
+
+    @staticmethod
+    def GenerateDialogueStream(request,
+            target,
+            options=(),
+            channel_credentials=None,
+            call_credentials=None,
+            insecure=False,
+            compression=None,
+            wait_for_ready=None,
+            timeout=None,
+            metadata=None):
+        return grpc.experimental.unary_stream(request, target, '/turtle_soup_game_service.TurtleSoupGameService/GenerateDialogueStream',
+            turtle__soup__game__service__pb2.GenerateDialogueRequest.SerializeToString,
+            turtle__soup__game__service__pb2.GenerateDialogueStreamResponse.FromString,
+            options, channel_credentials,
+            insecure, call_credentials, compression, wait_for_ready, timeout, metadata)
+
+    @staticmethod
+    def BatchGenerateDialogue(request,
+            target,
+            options=(),
+            channel_credentials=None,
+            call_credentials=None,
+            insecure=False,
+            compression=None,
+            wait_for_ready=None,
+            timeout=None,
+            metadata=None):
+        return grpc.experimental.unary_unary(request, target, '/turtle_soup_game_service.TurtleSoupGameService/BatchGenerateDialogue',
+            turtle__soup__game__service__pb2.BatchGenerateDialogueRequest.SerializeToString,
+            turtle__soup__game__service__pb2.BatchGenerateDialogueResponse.FromString,
+            options, channel_credentials,
+            insecure, call_credentials, compression, wait_for_ready, timeout, metadata)
+
+    @staticmethod
+    def RegisterPuzzle(request,
+            target,
+            options=(),
+            channel_credentials=None,
+            call_credentials=None,
+            insecure=False,
+            compression=None,
+            wait_for_ready=None,
+            timeout=None,
+            metadata=None):
+        return grpc.experimental.unary_unary(request, target, '/turtle_soup_game_service.TurtleSoupGameService/RegisterPuzzle',
+            turtle__soup__game__service__pb2.RegisterPuzzleRequest.SerializeToString,
+            turtle__soup__game__service__pb2.RegisterPuzzleResponse.FromString,
+            options, channel_credentials,
+            insecure, call_credentials, compression, wait_for_ready, timeout, metadata)
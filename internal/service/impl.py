@@ -4,22 +4,110 @@ import hashlib
 import os
 import random
 import time
-from typing import Any, Dict, Optional
+from typing import Any, Dict, List, Optional, Tuple
 
 import aiohttp
 import grpc.aio
 import openai
-import ujson as json
 from loguru import logger as loguru_logger
 
 from internal.classes.singleton import Singleton
+from internal.constants.prompts import PROMPT_FOR_MEMORY_SUMMARY
+from internal.llm_engines.azure_engine import AzureOpenAIEngineAdapter
+from internal.llm_engines.base import LLMEngineAdapter
+from internal.llm_engines.claude_engine import ClaudeEngineAdapter
+from internal.llm_engines.gemini_engine import GeminiEngineAdapter
+from internal.llm_engines.openai_engine import OpenAIEngineAdapter
+from internal.llm_engines.router import LLMEngineRouter, is_upstream_error
 from internal.proto_gens import (
     turtle_soup_game_service_pb2,
     turtle_soup_game_service_pb2_grpc
 )
+from internal.utils import metrics
+from internal.utils.admission_control import (
+    PRIORITY_HIGH,
+    PRIORITY_LOW,
+    PRIORITY_NORMAL
+)
+from internal.utils.conversation_memory import (
+    ConversationMemory,
+    DropOldestPolicy,
+    SummarizeOldestPolicy
+)
+from internal.utils.distributed_token_budget import (
+    DistributedTokenBudget,
+    TokenBudgetExhaustedException
+)
 from internal.utils.helper import timeit
 from internal.utils.http_tracing import http_trace_config
-from internal.utils.openai_tools import acall_chat_completion_api_with_backoff
+from internal.utils.model_cascade import TIER_CHAT, ModelCascade
+from internal.utils.openai_key_pool import OpenAIKeyPool
+from internal.utils.openai_tools import (
+    acalc_tokens_used,
+    anum_tokens_from_messages
+)
+from internal.utils.outbound_scheduler import (
+    DEFAULT_OUTBOUND_SCHEDULER,
+    OutboundQueueTimeoutException,
+    scheduling_context
+)
+from internal.utils.prompt_budget import PromptBudget, PromptTooLargeException
+from internal.utils.puzzle_registry import (
+    Puzzle,
+    PuzzleNotFoundException,
+    PuzzleRegistry
+)
+from internal.utils.question_index import NearDuplicateQuestionIndex
+from internal.utils.rate_limiter import (
+    RateLimitExceededException,
+    UserRateLimiter
+)
+from internal.utils.request_hedging import HedgingPolicy
+from internal.utils.response_cache import (
+    MODE_GENERAL_QUESTION,
+    MODE_TRUTH_JUDGEMENT,
+    ResponseCache
+)
+from internal.utils.retry_with_backoff import (
+    DEFAULT_RETRY_BUDGET,
+    CallAbandonedException,
+    DeadlineExceededException,
+    RetryBudgetExhaustedException,
+    call_context,
+    get_call_time_remaining,
+    measure_local_waits,
+    record_local_wait
+)
+from internal.utils.short_circuit import (
+    ACTION_REJECT,
+    ShortCircuit,
+    ShortCircuitResult
+)
+from internal.utils.single_flight import SingleFlight
+from internal.utils.tokenizer import DEFAULT_TOKENIZER
+from internal.utils.verdict_parser import (
+    TRUTH_VERDICT_CLOSE,
+    TRUTH_VERDICT_SOLVED,
+    TRUTH_VERDICT_WRONG,
+    VERDICT_IRRELEVANT,
+    VERDICT_NO,
+    VERDICT_PARTIALLY,
+    VERDICT_YES,
+    IncrementalJudgementParser,
+    IncrementalVerdictParser,
+    parse_truth_verdict,
+    parse_verdict
+)
+
+VERDICT_TO_PB = {
+    VERDICT_YES: turtle_soup_game_service_pb2.VERDICT_YES,
+    VERDICT_NO: turtle_soup_game_service_pb2.VERDICT_NO,
+    VERDICT_IRRELEVANT: turtle_soup_game_service_pb2.VERDICT_IRRELEVANT,
+    VERDICT_PARTIALLY: turtle_soup_game_service_pb2.VERDICT_PARTIALLY,
+    TRUTH_VERDICT_SOLVED: turtle_soup_game_service_pb2.VERDICT_SOLVED,
+    TRUTH_VERDICT_CLOSE: turtle_soup_game_service_pb2.VERDICT_CLOSE,
+    TRUTH_VERDICT_WRONG: turtle_soup_game_service_pb2.VERDICT_WRONG,
+}
 
 
 class TurtleSoupGameServiceSetupException(Exception):
@@ -37,13 +125,27 @@ class TurtleSoupGameService(turtle_soup_game_service_pb2_grpc.TurtleSoupGameServ
         if openai_key_list is None or len(openai_key_list) == 0:
             raise TurtleSoupGameServiceSetupException("Please set env for OPENAI_KEY_LIST.")
 
+        self._openai_key_list = openai_key_list.split(",")
+        self._openai_key_pool = OpenAIKeyPool(keys=self._openai_key_list, conf=conf.get("openai_key_pool"))
+        self._token_budget = DistributedTokenBudget(conf=conf.get("token_budget"))
+        retry_conf = conf.get("retry", {})
+        DEFAULT_RETRY_BUDGET.configure(
+            ratio=retry_conf.get("retry_budget_ratio", 0.1),
+            min_retries_per_window=retry_conf.get("min_retries_per_window", 10),
+            window_secs=retry_conf.get("window_secs", 10)
+        )
+
+        # NOTE: The scheduler queues the upstream calls by priority and fairness, so that they don't race
+        # for the connection pool below in arrival order, keep its max_concurrency within the pool limit.
+        DEFAULT_OUTBOUND_SCHEDULER.configure(conf=conf.get("outbound_scheduler"))
+
         openai.log = "info"
         # To make async openai requests more efficient.
         openai.aiosession.set(aiohttp.ClientSession(
             connector=aiohttp.TCPConnector(limit=32),
             connector_owner=True,
             timeout=aiohttp.ClientTimeout(total=60),
-            trace_configs=[http_trace_config]
+            trace_configs=[http_trace_config, self._openai_key_pool.trace_config]
         ))
         openai.api_base = conf["openai"]["api_base"]
         if "enable_http_proxy" in conf["openai"] and conf["openai"]["enable_http_proxy"]:
@@ -54,17 +156,102 @@ class TurtleSoupGameService(turtle_soup_game_service_pb2_grpc.TurtleSoupGameServ
         self._openai_conf_intention_model_version = conf["openai"]["intention_model_version"]
         self._openai_conf_chat_model = conf["openai"]["chat_model"]
         self._openai_conf_chat_model_version = conf["openai"]["chat_model_version"]
-        self._openai_key_list = openai_key_list.split(",")
-        self._openai_conf_chat_model_max_tokens = int((4096 - 4 - 128) * 0.95)
+        self._openai_conf_chat_temperature = conf["openai"].get("temperature", 1.0)
         self._openai_conf_chat_enable_memory = conf["openai"]["enable_memory"]
+        self._openai_conf_enable_early_termination = conf["openai"].get("enable_early_termination", False)
+        # Estimated completion tokens of a verdict reply which is read to the end, updated with EWMA.
+        self._verdict_completion_tokens_ewma = float(conf["openai"].get("verdict_completion_tokens_baseline", 32))
+
+        self._response_cache = ResponseCache(conf=conf.get("response_cache"))
+        self._prompt_budget = PromptBudget(conf=conf.get("prompt_budget"), model=self._openai_conf_chat_model)
+        self._short_circuit = ShortCircuit(conf=conf.get("short_circuit"))
+        self._question_index = NearDuplicateQuestionIndex(conf=conf.get("question_index"))
+        self._rate_limiter = UserRateLimiter(conf=conf.get("rate_limit"))
+        self._model_cascade = ModelCascade(
+            conf=conf.get("model_cascade"),
+            model=self._openai_conf_intention_model,
+            key_pool=self._openai_key_pool,
+            token_budget=self._token_budget
+        )
+        self._puzzle_registry = PuzzleRegistry(conf=conf.get("puzzle_registry"))
+        tokenizer_conf = conf.get("tokenizer", {})
+        DEFAULT_TOKENIZER.configure(
+            lru_capacity=tokenizer_conf.get("lru_capacity", 65536),
+            offload_threshold_chars=tokenizer_conf.get("offload_threshold_chars", 2048),
+            max_workers=tokenizer_conf.get("max_workers", 2)
+        )
+        self._enable_single_flight = conf.get("enable_single_flight", True)
+        self._single_flight = SingleFlight(name="single_flight.chat_completion")
+        self._hedging_policy = HedgingPolicy(name="hedging.chat_completion", conf=conf.get("hedging"))
+        self._batch_conf_max_batch_size = conf.get("batch", {}).get("max_batch_size", 64)
+        self._batch_conf_max_concurrency = conf.get("batch", {}).get("max_concurrency", 8)
+
+        llm_engines_conf = conf.get("llm_engines", {})
+        self._llm_engine_router = LLMEngineRouter(
+            adapters=[
+                OpenAIEngineAdapter(conf=conf["openai"], key_pool=self._openai_key_pool, token_budget=self._token_budget),
+                AzureOpenAIEngineAdapter(conf=llm_engines_conf.get("azure")),
+                GeminiEngineAdapter(conf=llm_engines_conf.get("gemini")),
+                ClaudeEngineAdapter(conf=llm_engines_conf.get("claude")),
+            ],
+            default_engine=OpenAIEngineAdapter.name,
+            conf=conf.get("llm_engine_router")
+        )
+
+        memory_conf = conf.get("conversation_memory", {})
+        if memory_conf.get("trim_policy", DropOldestPolicy.name) == SummarizeOldestPolicy.name:
+            memory_trim_policy = SummarizeOldestPolicy(summarizer=self._summarize_conversation, model=self._openai_conf_chat_model)
+        else:
+            memory_trim_policy = DropOldestPolicy()
+        self._conversation_memory = ConversationMemory(
+            conf=memory_conf,
+            model=self._openai_conf_chat_model,
+            policy=memory_trim_policy
+        )
+        self._memory_conf_summary_max_tokens = memory_conf.get("summary_max_tokens", 256)
 
     async def close(self):
+        await self._llm_engine_router.close()
+        DEFAULT_TOKENIZER.shutdown()
         session = openai.aiosession.get()
         if session is not None:
             await session.close()
         else:
             await asyncio.sleep(0)
 
+    @staticmethod
+    def engine_name(llm_engine: int) -> str:
+        try:
+            return turtle_soup_game_service_pb2.LLMEngine.Name(llm_engine).lower()
+        except ValueError:
+            return OpenAIEngineAdapter.name
+
+    @staticmethod
+    def admission_priority(method: str, request: Any) -> Optional[int]:
+        """Priority of an RPC for the admission control, None lets it through, e.g. the health checks."""
+        if method in ("GenerateDialogue", "GenerateDialogueStream"):
+            # NOTE: A truth judgement ends a game, it matters more than one of the many questions.
+            return PRIORITY_NORMAL if request.to_reply_for_general_question else PRIORITY_HIGH
+        if method == "BatchGenerateDialogue":
+            return PRIORITY_LOW
+        if method == "RegisterPuzzle":
+            return PRIORITY_HIGH
+        return None
+
+    @staticmethod
+    def _scheduling_context(
+        request: turtle_soup_game_service_pb2.GenerateDialogueRequest,
+        *,
+        uid: str,
+        user_class: str,
+        priority: Optional[int] = None
+    ):
+        """Schedules the upstream calls of the request in the flow of its room, or else of its user."""
+        flow = f"thread:{request.ext_thread_id}" if len(request.ext_thread_id) > 0 else f"uid:{uid}"
+        if priority is None:
+            priority = PRIORITY_NORMAL if request.to_reply_for_general_question else PRIORITY_HIGH
+        return scheduling_context(flow=flow, priority=priority, user_class=user_class)
+
     @staticmethod
     def new_conversation_id(uid: str = "None", rid: str = "None") -> str:
         return hashlib.md5(f"{uid}.{rid}.{time.time()}.{random.randint(0, 10000)}".encode()).hexdigest()
@@ -91,11 +278,118 @@ class TurtleSoupGameService(turtle_soup_game_service_pb2_grpc.TurtleSoupGameServ
         request: turtle_soup_game_service_pb2.GenerateDialogueRequest,
         context: grpc.aio.ServicerContext
     ):
-        resp = turtle_soup_game_service_pb2.GenerateDialogueResponse()
+        metadata = dict(context.invocation_metadata())
+        uid = metadata.get("x-uid", "None")
+        trace_id = metadata.get("x-request-id", "None")
+        user_class = metadata.get(self._rate_limiter.user_class_metadata_key, "")
+        with call_context(time_remaining=context.time_remaining(), is_abandoned=context.cancelled), \
+                self._scheduling_context(request, uid=uid, user_class=user_class):
+            return await self._generate_dialogue(request, uid=uid, trace_id=trace_id, user_class=user_class)
+
+    @timeit
+    async def BatchGenerateDialogue(
+        self,
+        request: turtle_soup_game_service_pb2.BatchGenerateDialogueRequest,
+        context: grpc.aio.ServicerContext
+    ):
+        resp = turtle_soup_game_service_pb2.BatchGenerateDialogueResponse()
 
         metadata = dict(context.invocation_metadata())
         uid = metadata.get("x-uid", "None")
         trace_id = metadata.get("x-request-id", "None")
+        user_class = metadata.get(self._rate_limiter.user_class_metadata_key, "")
+        span_id = ""
+
+        with loguru_logger.contextualize(trace_id=trace_id, span_id=span_id):
+            loguru_logger.debug(f"Entering BatchGenerateDialogue method context, batch size: {len(request.requests)}...")
+
+            try:
+                if len(request.requests) > self._batch_conf_max_batch_size:
+                    resp.ret.code = 10400
+                    resp.ret.msg = f"Batch size exceeds the limit {self._batch_conf_max_batch_size}"
+                    return resp
+
+                max_concurrency = self._batch_conf_max_concurrency
+                if request.max_concurrency > 0:
+                    max_concurrency = min(max_concurrency, request.max_concurrency)
+                sem = asyncio.Semaphore(max_concurrency)
+                # NOTE: Lease one API key for the whole batch.
+                openai_key = self._openai_key_pool.best_key()
+
+                async def generate_dialogue(item: turtle_soup_game_service_pb2.GenerateDialogueRequest):
+                    # NOTE: The interactive requests go before the batches, whatever their mode.
+                    with self._scheduling_context(item, uid=uid, user_class=user_class, priority=PRIORITY_LOW):
+                        async with sem:
+                            return await self._generate_dialogue(
+                                item,
+                                uid=uid,
+                                trace_id=trace_id,
+                                user_class=user_class,
+                                openai_key=openai_key
+                            )
+
+                # NOTE: asyncio.gather keeps the results in the same order as the requests.
+                with call_context(time_remaining=context.time_remaining(), is_abandoned=context.cancelled):
+                    responses = await asyncio.gather(*[generate_dialogue(item) for item in request.requests])
+                resp.responses.extend(responses)
+                resp.ret.code = 0
+                resp.ret.msg = "OK"
+            except Exception as exc:
+                loguru_logger.error(f"BatchGenerateDialogue RPC Method Internal Error, err:{exc}")
+                resp.ret.code = 10500
+                resp.ret.msg = f"BatchGenerateDialogue RPC Method Internal Error, err:{exc}"
+            finally:
+                return resp
+
+    @timeit
+    async def RegisterPuzzle(
+        self,
+        request: turtle_soup_game_service_pb2.RegisterPuzzleRequest,
+        context: grpc.aio.ServicerContext
+    ):
+        resp = turtle_soup_game_service_pb2.RegisterPuzzleResponse()
+
+        metadata = dict(context.invocation_metadata())
+        trace_id = metadata.get("x-request-id", "None")
+        span_id = request.ext_thread_id
+
+        with loguru_logger.contextualize(trace_id=trace_id, span_id=span_id):
+            loguru_logger.debug("Entering RegisterPuzzle method context...")
+
+            try:
+                if len(request.ext_thread_id) == 0 or len(request.story.strip()) == 0 or len(request.truth.strip()) == 0:
+                    resp.ret.code = 10400
+                    resp.ret.msg = "ext_thread_id, story and truth are required"
+                    return resp
+
+                puzzle = await self._puzzle_registry.register(
+                    puzzle_id=request.ext_thread_id,
+                    story=request.story,
+                    truth=request.truth,
+                    key_clues=list(request.key_clues)
+                )
+                loguru_logger.debug(f"Registered puzzle {puzzle.puzzle_id}@{puzzle.digest}.")
+                resp.ret.code = 0
+                resp.ret.msg = "OK"
+                resp.ext_thread_id = request.ext_thread_id
+            except Exception as exc:
+                loguru_logger.error(f"RegisterPuzzle RPC Method Internal Error, err:{exc}")
+                resp.ret.code = 10500
+                resp.ret.msg = f"RegisterPuzzle RPC Method Internal Error, err:{exc}"
+            finally:
+                return resp
+
+    async def _generate_dialogue(
+        self,
+        request: turtle_soup_game_service_pb2.GenerateDialogueRequest,
+        *,
+        uid: str,
+        trace_id: str,
+        user_class: str = "",
+        openai_key: Optional[str] = None
+    ) -> turtle_soup_game_service_pb2.GenerateDialogueResponse:
+        resp = turtle_soup_game_service_pb2.GenerateDialogueResponse()
+
         conversation_id = request.conversation_id
         if len(conversation_id) == 0:
             conversation_id = self.new_conversation_id(uid, trace_id)
@@ -104,58 +398,130 @@ class TurtleSoupGameService(turtle_soup_game_service_pb2_grpc.TurtleSoupGameServ
         with loguru_logger.contextualize(trace_id=trace_id, span_id=span_id):
             loguru_logger.debug("Entering GenerateDialogue method context...")
 
-            system_prompt = request.conversation_system_prompt.strip()
             user_message = request.chat.strip()
 
+            if request.to_reply_for_general_question:
+                mode = MODE_GENERAL_QUESTION
+            else:
+                mode = MODE_TRUTH_JUDGEMENT
+            if not await self._check_rate_limit(resp, conversation_id=conversation_id, request=request, uid=uid, user_class=user_class):
+                return resp
+            # NOTE: Trivially answerable inputs never reach the LLM.
+            short_circuit = self._short_circuit.check(conversation_id=conversation_id, user_message=user_message, mode=mode)
+            if short_circuit is not None:
+                loguru_logger.debug(f"Short-circuited by rule {short_circuit.rule}.")
+                self._fill_short_circuit_response(resp, short_circuit, conversation_id=conversation_id, request=request, uid=uid)
+                return resp
+
+            engine = self.engine_name(request.llm_engine)
+            # NOTE: The replies are cached by the engine which answers, which is the picked one unless it fails over.
+            llm_engine = self._llm_engine_router.pick(engine)
+
             reply = ""
+            err_code = 10500
+            err_msg = "Failed to invoke OpenAI LLM"
             try:
                 st = time.time()
                 try:
-                    loguru_logger.debug(f"ChatCompletion.Model:{self._openai_conf_chat_model} ChatCompletion.SystemPrompt:\n")
-                    loguru_logger.debug(f"\n{system_prompt}")
-                    loguru_logger.debug(f"ChatCompletion.Model:{self._openai_conf_chat_model} ChatCompletion.UserMessage:\n")
-                    loguru_logger.debug(f"\n{user_message}")
+                    system_prompt, puzzle = await self._resolve_system_prompt(request, mode)
 
-                    openai_key = self._openai_key_list[random.randint(0, len(self._openai_key_list) - 1)]
-                    if request.to_reply_for_general_question:
-                        response_format = {"type": "text"}
+                    if puzzle is not None:
+                        loguru_logger.debug(f"ChatCompletion.Model:{llm_engine.name}/{llm_engine.model} ChatCompletion.Puzzle:{puzzle.puzzle_id}@{puzzle.digest}")
                     else:
-                        response_format = {"type": "json_object"}
-                    
-                    chat_completion = await acall_chat_completion_api_with_backoff(
-                        api_key=openai_key,
-                        messages=[
-                            {
-                                "role": "system",
-                                "content": system_prompt
-                            },
-                            {
-                                "role": "user",
-                                "content": user_message
-                            }
-                        ],
-                        model=self._openai_conf_chat_model,
-                        frequency_penalty=0.0,
-                        presence_penalty=0.0,
-                        temperature=1.0,
-                        max_tokens=256,
-                        n=1,
-                        top_p=1.0,
-                        response_format=response_format,
-                        timeout=60,
+                        loguru_logger.debug(f"ChatCompletion.Model:{llm_engine.name}/{llm_engine.model} ChatCompletion.SystemPrompt:\n")
+                        loguru_logger.debug(f"\n{system_prompt}")
+                    loguru_logger.debug(f"ChatCompletion.Model:{llm_engine.name}/{llm_engine.model} ChatCompletion.UserMessage:\n")
+                    loguru_logger.debug(f"\n{user_message}")
+
+                    history = []
+                    if self._use_conversation_memory(mode):
+                        history = await self._load_conversation_history(
+                            conversation_id,
+                            system_prompt=system_prompt,
+                            user_message=user_message,
+                            mode=mode
+                        )
+                    # NOTE: Turn away an oversized prompt before any network I/O.
+                    user_message, history = await self._prompt_budget.fit(
+                        system_prompt=system_prompt,
+                        user_message=user_message,
+                        history=history,
+                        mode=mode
                     )
-                    total_tokens = chat_completion.usage.total_tokens
-                    prompt_tokens = chat_completion.usage.prompt_tokens
-                    completion_tokens = chat_completion.usage.completion_tokens
-                    loguru_logger.debug(f"Used total_tokens: {total_tokens}, prompt_tokens: {prompt_tokens}, completion_tokens: {completion_tokens}.")
-                    
-                    loguru_logger.debug(f"OpenAI LLM Response:\n{chat_completion}")
-                    _reply = chat_completion.choices[0].message.content
-                    loguru_logger.debug(f"OpenAI LLM Reply:\n{_reply}")
-                    if request.to_reply_for_general_question:
-                        reply = _reply
-                    else:
-                        reply = json.loads(_reply)["result"]
+                    # NOTE: A reply which builds on the earlier turns (e.g. "那他妻子呢") is neither cached nor indexed.
+                    use_cache = len(history) == 0 and not self._response_cache.should_bypass(self._openai_conf_chat_temperature)
+                    fingerprint = self._response_cache_key(system_prompt=system_prompt, user_message=user_message, llm_engine=llm_engine, mode=mode)
+                    if use_cache:
+                        reply = await self._response_cache.get(fingerprint, mode) or ""
+                        if len(reply) > 0:
+                            loguru_logger.debug(f"Hit response cache, reply:\n{reply}")
+                    question_index_scope = self._question_index_scope(system_prompt, llm_engine, mode, history=history)
+                    if len(reply) == 0 and question_index_scope is not None:
+                        # NOTE: A paraphrase of an answered question gets the same verdict.
+                        reply = await self._question_index.lookup(question_index_scope, user_message) or ""
+                        if len(reply) > 0:
+                            loguru_logger.debug(f"Hit question index, reply:\n{reply}")
+
+                    if len(reply) == 0:
+                        time_remaining = get_call_time_remaining()
+
+                        async def generate_reply() -> str:
+                            # NOTE: The shared call outlives any single waiter, it is cancelled by the
+                            # single-flight once every waiter has gone away.
+                            with call_context(time_remaining=time_remaining, is_abandoned=None):
+                                _reply, answered_by = await self._generate_reply(
+                                    engine=engine,
+                                    system_prompt=system_prompt,
+                                    user_message=user_message,
+                                    history=history,
+                                    to_reply_for_general_question=request.to_reply_for_general_question,
+                                    openai_key=openai_key
+                                )
+                            if use_cache and len(_reply) > 0:
+                                await self._response_cache.set(
+                                    self._response_cache_key(system_prompt=system_prompt, user_message=user_message, llm_engine=answered_by, mode=mode),
+                                    mode,
+                                    _reply
+                                )
+                            answered_scope = self._question_index_scope(system_prompt, answered_by, mode, history=history)
+                            if answered_scope is not None:
+                                await self._question_index.add(answered_scope, user_message, _reply)
+                            return _reply
+
+                        # NOTE: Concurrent requests with the identical prompt fingerprint share one upstream call,
+                        # but not a reply built on the history of one conversation, which the fingerprint leaves out.
+                        if self._enable_single_flight and len(history) == 0:
+                            reply = await self._single_flight.do(fingerprint, generate_reply)
+                        else:
+                            reply = await generate_reply()
+
+                    if self._use_conversation_memory(mode) and len(reply) > 0:
+                        await self._conversation_memory.append(conversation_id, self._build_turn(user_message, reply))
+                    self._short_circuit.remember(conversation_id=conversation_id, user_message=request.chat.strip(), mode=mode, reply=reply)
+                except PuzzleNotFoundException as exc:
+                    loguru_logger.warning(f"Failed to resolve the system prompt, err:{exc}.")
+                    err_code = 10404
+                    err_msg = "Puzzle not registered"
+                except PromptTooLargeException as exc:
+                    loguru_logger.warning(f"Failed to pass the pre-flight check, err:{exc}.")
+                    err_code = 10413
+                    err_msg = "Prompt too large"
+                except TokenBudgetExhaustedException as exc:
+                    loguru_logger.warning(f"Failed to invoke OpenAI LLM, err:{exc}.")
+                    err_code = 10429
+                    err_msg = "Upstream token budget exhausted"
+                except (RetryBudgetExhaustedException, OutboundQueueTimeoutException) as exc:
+                    loguru_logger.warning(f"Failed to invoke OpenAI LLM, err:{exc}.")
+                    err_code = 10503
+                    err_msg = "Upstream is overloaded"
+                except DeadlineExceededException as exc:
+                    loguru_logger.warning(f"Failed to invoke OpenAI LLM, err:{exc}.")
+                    err_code = 10504
+                    err_msg = "Deadline exceeded"
+                except CallAbandonedException as exc:
+                    loguru_logger.info(f"Gave up invoking OpenAI LLM, err:{exc}.")
+                    err_code = 10499
+                    err_msg = "Client closed request"
                 except Exception as exc:
                     loguru_logger.error(f"Failed to invoke OpenAI LLM, err:{exc}.")
                 finally:
@@ -165,15 +531,540 @@ class TurtleSoupGameService(turtle_soup_game_service_pb2_grpc.TurtleSoupGameServ
                 resp.ret.code = 0
                 resp.ret.msg = "OK"
                 if len(reply) == 0:
-                    resp.ret.code = 10500
-                    resp.ret.msg = "Failed to invoke OpenAI LLM"
+                    resp.ret.code = err_code
+                    resp.ret.msg = err_msg
                 resp.conversation_id = conversation_id
                 resp.chat = reply
                 resp.ext_thread_id = request.ext_thread_id
                 resp.ext_uid = uid
+                self._fill_verdict(resp, reply, request.to_reply_for_general_question)
             except Exception as exc:
                 loguru_logger.error(f"GenerateDialogue RPC Method Internal Error, err:{exc}")
                 resp.ret.code = 10500
                 resp.ret.msg = f"GenerateDialogue RPC Method Internal Error, err:{exc}"
             finally:
                 return resp
+
+    async def GenerateDialogueStream(
+        self,
+        request: turtle_soup_game_service_pb2.GenerateDialogueRequest,
+        context: grpc.aio.ServicerContext
+    ):
+        metadata = dict(context.invocation_metadata())
+        uid = metadata.get("x-uid", "None")
+        trace_id = metadata.get("x-request-id", "None")
+        user_class = metadata.get(self._rate_limiter.user_class_metadata_key, "")
+        conversation_id = request.conversation_id
+        if len(conversation_id) == 0:
+            conversation_id = self.new_conversation_id(uid, trace_id)
+        span_id = conversation_id
+
+        with loguru_logger.contextualize(trace_id=trace_id, span_id=span_id), \
+                call_context(time_remaining=context.time_remaining(), is_abandoned=context.cancelled), \
+                self._scheduling_context(request, uid=uid, user_class=user_class):
+            loguru_logger.debug("Entering GenerateDialogueStream method context...")
+
+            user_message = request.chat.strip()
+            if request.to_reply_for_general_question:
+                mode = MODE_GENERAL_QUESTION
+            else:
+                mode = MODE_TRUTH_JUDGEMENT
+
+            final_resp = turtle_soup_game_service_pb2.GenerateDialogueStreamResponse()
+            final_resp.is_final = True
+            if not await self._check_rate_limit(final_resp, conversation_id=conversation_id, request=request, uid=uid, user_class=user_class):
+                yield final_resp
+                return
+            short_circuit = self._short_circuit.check(conversation_id=conversation_id, user_message=user_message, mode=mode)
+            if short_circuit is not None:
+                loguru_logger.debug(f"Short-circuited by rule {short_circuit.rule}.")
+                self._fill_short_circuit_response(final_resp, short_circuit, conversation_id=conversation_id, request=request, uid=uid)
+                yield final_resp
+                return
+
+            llm_engine = self._llm_engine_router.pick(self.engine_name(request.llm_engine))
+            reply = ""
+            err_code = 10500
+            err_msg = "Failed to invoke OpenAI LLM"
+            try:
+                st = time.time()
+                try:
+                    system_prompt, _ = await self._resolve_system_prompt(request, mode)
+                    history = []
+                    if self._use_conversation_memory(mode):
+                        history = await self._load_conversation_history(
+                            conversation_id,
+                            system_prompt=system_prompt,
+                            user_message=user_message,
+                            mode=mode
+                        )
+                    # NOTE: Turn away an oversized prompt before any network I/O.
+                    user_message, history = await self._prompt_budget.fit(
+                        system_prompt=system_prompt,
+                        user_message=user_message,
+                        history=history,
+                        mode=mode
+                    )
+                    # NOTE: A reply which builds on the earlier turns (e.g. "那他妻子呢") is neither cached nor indexed.
+                    use_cache = len(history) == 0 and not self._response_cache.should_bypass(self._openai_conf_chat_temperature)
+                    fingerprint = self._response_cache_key(system_prompt=system_prompt, user_message=user_message, llm_engine=llm_engine, mode=mode)
+                    if use_cache:
+                        reply = await self._response_cache.get(fingerprint, mode) or ""
+                        if len(reply) > 0:
+                            loguru_logger.debug(f"Hit response cache, reply:\n{reply}")
+                    question_index_scope = self._question_index_scope(system_prompt, llm_engine, mode, history=history)
+                    if len(reply) == 0 and question_index_scope is not None:
+                        # NOTE: A paraphrase of an answered question gets the same verdict.
+                        reply = await self._question_index.lookup(question_index_scope, user_message) or ""
+                        if len(reply) > 0:
+                            loguru_logger.debug(f"Hit question index, reply:\n{reply}")
+
+                    if len(reply) == 0 and self._use_model_cascade(llm_engine, mode=mode, history=history):
+                        reply = await self._model_cascade.classify(system_prompt=system_prompt, user_message=user_message) or ""
+                        if len(reply) > 0:
+                            loguru_logger.debug(f"Answered by the intention model, reply:\n{reply}")
+                            if use_cache:
+                                await self._response_cache.set(fingerprint, mode, reply)
+
+                    if len(reply) == 0:
+                        messages = self._build_messages(system_prompt=system_prompt, user_message=user_message, history=history)
+                        verdict_parser = None
+                        if request.to_reply_for_general_question and self._openai_conf_enable_early_termination:
+                            verdict_parser = IncrementalVerdictParser()
+                        judgement_parser = None
+                        if not request.to_reply_for_general_question:
+                            judgement_parser = IncrementalJudgementParser()
+                        deltas = []
+                        # NOTE: A stream can't fail over once it has started, only the engine is picked by health.
+                        stream_deltas = llm_engine.chat_stream(
+                            messages=messages,
+                            max_tokens=self._prompt_budget.max_tokens(mode),
+                            temperature=self._openai_conf_chat_temperature,
+                            json_mode=not request.to_reply_for_general_question
+                        )
+                        engine_st = time.monotonic()
+                        engine_ok = False
+                        engine_exc = None
+                        with measure_local_waits() as local_wait_secs:
+                            try:
+                                async for delta in stream_deltas:
+                                    if len(deltas) == 0:
+                                        loguru_logger.debug(f"{llm_engine.name} LLM time to first token: {time.time() - st:.3f}s.")
+                                    deltas.append(delta)
+                                    # NOTE: Only the plain text reply is meaningful to forward, a truth judgement is
+                                    # a JSON object which can only be parsed after the whole completion arrives.
+                                    if request.to_reply_for_general_question:
+                                        yield_st = time.monotonic()
+                                        yield turtle_soup_game_service_pb2.GenerateDialogueStreamResponse(
+                                            conversation_id=conversation_id,
+                                            delta=delta,
+                                            ext_thread_id=request.ext_thread_id,
+                                            ext_uid=uid
+                                        )
+                                        # NOTE: A slow reader holds the stream, which says nothing about the engine.
+                                        record_local_wait(time.monotonic() - yield_st)
+                                    if verdict_parser is not None and verdict_parser.feed(delta):
+                                        break
+                                    # NOTE: Only the result of a truth judgement is returned, not its reason.
+                                    if judgement_parser is not None and judgement_parser.feed(delta) \
+                                            and self._openai_conf_enable_early_termination:
+                                        metrics.incr_counter("early_termination.judgements_terminated")
+                                        break
+                                engine_ok = True
+                            except Exception as exc:
+                                engine_exc = exc
+                                raise
+                            finally:
+                                # NOTE: Closing the stream early cancels the upstream HTTP request.
+                                await stream_deltas.aclose()
+                                # NOTE: A caller who went away, or a local error, says nothing about the engine.
+                                if engine_ok or (engine_exc is not None and is_upstream_error(engine_exc)):
+                                    self._llm_engine_router.record(
+                                        llm_engine.name,
+                                        latency=time.monotonic() - engine_st - local_wait_secs(),
+                                        ok=engine_ok
+                                    )
+                        self._model_cascade.record(TIER_CHAT, latency_secs=time.monotonic() - engine_st)
+                        _reply = "".join(deltas)
+                        if verdict_parser is not None:
+                            self._record_early_termination(verdict_parser)
+                            verdict_parser.finish()
+                            _reply = verdict_parser.reply()
+                        loguru_logger.debug(f"OpenAI LLM Reply:\n{_reply}")
+                        # NOTE: Streamed completions carry no usage, count the tokens locally.
+                        try:
+                            final_resp.usage.prompt_tokens = await anum_tokens_from_messages(messages, model=self._openai_conf_chat_model)
+                            final_resp.usage.completion_tokens = await acalc_tokens_used(_reply)
+                            final_resp.usage.total_tokens = final_resp.usage.prompt_tokens + final_resp.usage.completion_tokens
+                            self._model_cascade.record(
+                                TIER_CHAT,
+                                prompt_tokens=final_resp.usage.prompt_tokens,
+                                completion_tokens=final_resp.usage.completion_tokens
+                            )
+                        except Exception as exc:
+                            loguru_logger.warning(f"Failed to count tokens used, err:{exc}.")
+                        if judgement_parser is not None:
+                            reply = self._parse_judgement(judgement_parser)
+                        else:
+                            reply = _reply
+                        if use_cache and len(reply) > 0:
+                            await self._response_cache.set(fingerprint, mode, reply)
+                        if question_index_scope is not None:
+                            await self._question_index.add(question_index_scope, user_message, reply)
+
+                    if self._use_conversation_memory(mode) and len(reply) > 0:
+                        await self._conversation_memory.append(conversation_id, self._build_turn(user_message, reply))
+                    self._short_circuit.remember(conversation_id=conversation_id, user_message=request.chat.strip(), mode=mode, reply=reply)
+                except PuzzleNotFoundException as exc:
+                    loguru_logger.warning(f"Failed to resolve the system prompt, err:{exc}.")
+                    err_code = 10404
+                    err_msg = "Puzzle not registered"
+                except PromptTooLargeException as exc:
+                    loguru_logger.warning(f"Failed to pass the pre-flight check, err:{exc}.")
+                    err_code = 10413
+                    err_msg = "Prompt too large"
+                except TokenBudgetExhaustedException as exc:
+                    loguru_logger.warning(f"Failed to invoke OpenAI LLM, err:{exc}.")
+                    err_code = 10429
+                    err_msg = "Upstream token budget exhausted"
+                except (RetryBudgetExhaustedException, OutboundQueueTimeoutException) as exc:
+                    loguru_logger.warning(f"Failed to invoke OpenAI LLM, err:{exc}.")
+                    err_code = 10503
+                    err_msg = "Upstream is overloaded"
+                except DeadlineExceededException as exc:
+                    loguru_logger.warning(f"Failed to invoke OpenAI LLM, err:{exc}.")
+                    err_code = 10504
+                    err_msg = "Deadline exceeded"
+                except CallAbandonedException as exc:
+                    loguru_logger.info(f"Gave up invoking OpenAI LLM, err:{exc}.")
+                    err_code = 10499
+                    err_msg = "Client closed request"
+                except Exception as exc:
+                    loguru_logger.error(f"Failed to invoke OpenAI LLM, err:{exc}.")
+                finally:
+                    ed = time.time()
+                    loguru_logger.debug(f"OpenAI LLM Calling used {ed - st:.3f}s.")
+
+                final_resp.ret.code = 0
+                final_resp.ret.msg = "OK"
+                if len(reply) == 0:
+                    final_resp.ret.code = err_code
+                    final_resp.ret.msg = err_msg
+                final_resp.conversation_id = conversation_id
+                final_resp.chat = reply
+                final_resp.ext_thread_id = request.ext_thread_id
+                final_resp.ext_uid = uid
+                self._fill_verdict(final_resp, reply, request.to_reply_for_general_question)
+            except Exception as exc:
+                loguru_logger.error(f"GenerateDialogueStream RPC Method Internal Error, err:{exc}")
+                final_resp.ret.code = 10500
+                final_resp.ret.msg = f"GenerateDialogueStream RPC Method Internal Error, err:{exc}"
+            yield final_resp
+
+    async def _resolve_system_prompt(
+        self,
+        request: turtle_soup_game_service_pb2.GenerateDialogueRequest,
+        mode: str
+    ) -> Tuple[str, Optional[Puzzle]]:
+        """Returns the system prompt sent by the client, or else the one of the puzzle registered under ext_thread_id."""
+        system_prompt = request.conversation_system_prompt.strip()
+        if len(system_prompt) > 0 or len(request.ext_thread_id) == 0:
+            return system_prompt, None
+        puzzle = await self._puzzle_registry.get(request.ext_thread_id)
+        if puzzle is None:
+            raise PuzzleNotFoundException(f"Puzzle {request.ext_thread_id} is not registered.")
+        return puzzle.system_prompt(mode), puzzle
+
+    async def _check_rate_limit(
+        self,
+        resp: Any,
+        *,
+        conversation_id: str,
+        request: turtle_soup_game_service_pb2.GenerateDialogueRequest,
+        uid: str,
+        user_class: str
+    ) -> bool:
+        """Counts the request against the limits of the user and the thread, fills resp and returns False if over."""
+        try:
+            await self._rate_limiter.acquire(uid=uid, ext_thread_id=request.ext_thread_id, user_class=user_class)
+        except RateLimitExceededException as exc:
+            resp.ret.code = 10429
+            resp.ret.msg = str(exc)
+            resp.conversation_id = conversation_id
+            resp.ext_thread_id = request.ext_thread_id
+            resp.ext_uid = uid
+            return False
+        return True
+
+    @staticmethod
+    def _fill_short_circuit_response(
+        resp: Any,
+        short_circuit: ShortCircuitResult,
+        *,
+        conversation_id: str,
+        request: turtle_soup_game_service_pb2.GenerateDialogueRequest,
+        uid: str
+    ):
+        if short_circuit.action == ACTION_REJECT:
+            resp.ret.code = 10400
+            resp.ret.msg = short_circuit.reply
+        else:
+            resp.ret.code = 0
+            resp.ret.msg = "OK"
+            resp.chat = short_circuit.reply
+            TurtleSoupGameService._fill_verdict(resp, short_circuit.reply, request.to_reply_for_general_question)
+        resp.conversation_id = conversation_id
+        resp.ext_thread_id = request.ext_thread_id
+        resp.ext_uid = uid
+
+    @staticmethod
+    def _fill_verdict(resp: Any, reply: str, to_reply_for_general_question: bool):
+        """Fills the structured verdict parsed from the reply, so that clients needn't parse the text."""
+        if len(reply) == 0:
+            return
+        if to_reply_for_general_question:
+            verdict, is_key_clue = parse_verdict(reply)
+        else:
+            verdict, is_key_clue = parse_truth_verdict(reply), False
+        resp.verdict = VERDICT_TO_PB.get(verdict, turtle_soup_game_service_pb2.VERDICT_UNSPECIFIED)
+        resp.is_key_clue = is_key_clue
+
+    def _question_index_scope(
+        self,
+        system_prompt: str,
+        llm_engine: LLMEngineAdapter,
+        mode: str,
+        *,
+        history: List[Dict[str, str]]
+    ) -> Optional[str]:
+        """Returns the scope of the puzzle in the near-duplicate question index, None if it doesn't apply."""
+        # NOTE: A truth judgement weighs a whole story, only the verdicts of questions carry over to paraphrases.
+        # And like the response cache, the index only answers the questions which don't build on earlier turns.
+        if not self._question_index.enabled or mode != MODE_GENERAL_QUESTION or len(history) > 0:
+            return None
+        return hashlib.md5(f"{llm_engine.name}/{llm_engine.model}\x1f{system_prompt}".encode()).hexdigest()
+
+    @staticmethod
+    def _response_cache_key(*, system_prompt: str, user_message: str, llm_engine: LLMEngineAdapter, mode: str) -> str:
+        return ResponseCache.make_key(
+            system_prompt=system_prompt,
+            user_message=user_message,
+            model=f"{llm_engine.name}/{llm_engine.model}",
+            mode=mode
+        )
+
+    def _use_model_cascade(self, llm_engine: LLMEngineAdapter, *, mode: str, history: List[Dict[str, str]]) -> bool:
+        # NOTE: The intention model is an OpenAI Completions model which sees no history, it may only stand in
+        # for the OpenAI chat model, on a question which doesn't build on the earlier turns.
+        return self._model_cascade.enabled and mode == MODE_GENERAL_QUESTION and \
+            llm_engine.name == OpenAIEngineAdapter.name and len(history) == 0
+
+    def _use_conversation_memory(self, mode: str) -> bool:
+        # NOTE: A truth judgement only weighs the guess against the key clues, it needs no history.
+        return self._openai_conf_chat_enable_memory and mode == MODE_GENERAL_QUESTION
+
+    async def _load_conversation_history(
+        self,
+        conversation_id: str,
+        *,
+        system_prompt: str,
+        user_message: str,
+        mode: str
+    ) -> List[Dict[str, str]]:
+        # NOTE: The history gets what is left of the context window by the prompt and the reply.
+        token_budget = self._prompt_budget.prompt_token_budget(mode) - 3 - \
+            await self._conversation_memory.acount_tokens({"role": "system", "content": system_prompt}) - \
+            await self._conversation_memory.acount_tokens({"role": "user", "content": user_message})
+        if token_budget <= 0:
+            return []
+        return await self._conversation_memory.load(conversation_id, token_budget=token_budget)
+
+    async def _summarize_conversation(self, messages: List[Dict[str, str]]) -> str:
+        transcript = "\n".join(
+            f"问：{message['content']}" if message["role"] == "user" else
+            f"答：{message['content']}" if message["role"] == "assistant" else message["content"]
+            for message in messages
+        )
+        result = await self._llm_engine_router.get(OpenAIEngineAdapter.name).chat(
+            messages=self._build_messages(system_prompt=PROMPT_FOR_MEMORY_SUMMARY.strip(), user_message=transcript),
+            max_tokens=self._memory_conf_summary_max_tokens,
+            temperature=0.0
+        )
+        return result.content.strip()
+
+    @staticmethod
+    def _build_messages(
+        *,
+        system_prompt: str,
+        user_message: str,
+        history: Optional[List[Dict[str, str]]] = None
+    ) -> List[Dict[str, str]]:
+        return [
+            {
+                "role": "system",
+                "content": system_prompt
+            },
+            *(history or []),
+            {
+                "role": "user",
+                "content": user_message
+            }
+        ]
+
+    @staticmethod
+    def _build_turn(user_message: str, reply: str) -> List[Dict[str, str]]:
+        return [
+            {
+                "role": "user",
+                "content": user_message
+            },
+            {
+                "role": "assistant",
+                "content": reply
+            }
+        ]
+
+    @staticmethod
+    def _parse_reply(raw_reply: str, to_reply_for_general_question: bool) -> str:
+        if to_reply_for_general_question:
+            return raw_reply
+        judgement_parser = IncrementalJudgementParser()
+        judgement_parser.feed(raw_reply)
+        return TurtleSoupGameService._parse_judgement(judgement_parser)
+
+    @staticmethod
+    def _parse_judgement(judgement_parser: IncrementalJudgementParser) -> str:
+        # NOTE: A malformed judgement is salvaged rather than failed, a retry would cost the whole round trip.
+        result = judgement_parser.result()
+        if result is None:
+            metrics.incr_counter("judgement_parser.failures")
+            raise ValueError(f"Malformed truth judgement: {judgement_parser.raw_reply}")
+        if judgement_parser.salvaged:
+            metrics.incr_counter("judgement_parser.salvaged")
+        return result
+
+    async def _generate_reply(
+        self,
+        *,
+        engine: str,
+        system_prompt: str,
+        user_message: str,
+        to_reply_for_general_question: bool,
+        history: Optional[List[Dict[str, str]]] = None,
+        openai_key: Optional[str] = None
+    ) -> Tuple[str, LLMEngineAdapter]:
+        """Returns the reply, and the engine which answered, which differs from the requested one after a failover."""
+        mode = MODE_GENERAL_QUESTION if to_reply_for_general_question else MODE_TRUTH_JUDGEMENT
+        llm_engine = self._llm_engine_router.pick(engine)
+        if self._use_model_cascade(llm_engine, mode=mode, history=history or []):
+            # NOTE: The intention model answers the questions it is sure about, the rest escalate to the chat model.
+            reply = await self._model_cascade.classify(system_prompt=system_prompt, user_message=user_message, preferred_key=openai_key)
+            if reply is not None:
+                loguru_logger.debug(f"Answered by the intention model, reply:\n{reply}")
+                return reply, llm_engine
+
+        st = time.monotonic()
+        if not self._hedging_policy.enabled:
+            reply = await self._generate_reply_once(
+                engine=engine,
+                system_prompt=system_prompt,
+                user_message=user_message,
+                to_reply_for_general_question=to_reply_for_general_question,
+                history=history,
+                openai_key=openai_key
+            )
+            self._model_cascade.record(TIER_CHAT, latency_secs=time.monotonic() - st)
+            return reply
+
+        primary_key = openai_key or self._openai_key_pool.best_key()
+
+        async def attempt(idx: int) -> Tuple[str, LLMEngineAdapter]:
+            # NOTE: The hedged attempt prefers another key than the slow one.
+            key = primary_key if idx == 0 else self._openai_key_pool.best_key(exclude=[primary_key])
+            return await self._generate_reply_once(
+                engine=engine,
+                system_prompt=system_prompt,
+                user_message=user_message,
+                to_reply_for_general_question=to_reply_for_general_question,
+                history=history,
+                openai_key=key
+            )
+
+        reply = await self._hedging_policy.run(attempt)
+        self._model_cascade.record(TIER_CHAT, latency_secs=time.monotonic() - st)
+        return reply
+
+    async def _generate_reply_once(
+        self,
+        *,
+        engine: str,
+        system_prompt: str,
+        user_message: str,
+        to_reply_for_general_question: bool,
+        history: Optional[List[Dict[str, str]]] = None,
+        openai_key: Optional[str] = None
+    ) -> Tuple[str, LLMEngineAdapter]:
+        messages = self._build_messages(system_prompt=system_prompt, user_message=user_message, history=history)
+
+        async def generate_reply(llm_engine: LLMEngineAdapter) -> Tuple[str, LLMEngineAdapter]:
+            if to_reply_for_general_question and self._openai_conf_enable_early_termination:
+                return await self._generate_verdict_reply(llm_engine, messages=messages, openai_key=openai_key), llm_engine
+
+            result = await llm_engine.chat(
+                messages=messages,
+                max_tokens=self._prompt_budget.max_tokens(MODE_GENERAL_QUESTION if to_reply_for_general_question else MODE_TRUTH_JUDGEMENT),
+                temperature=self._openai_conf_chat_temperature,
+                json_mode=not to_reply_for_general_question,
+                preferred_key=openai_key
+            )
+            loguru_logger.debug(
+                f"Used total_tokens: {result.total_tokens}, prompt_tokens: {result.prompt_tokens}, "
+                f"completion_tokens: {result.completion_tokens}, engine: {result.engine}."
+            )
+            self._model_cascade.record(TIER_CHAT, prompt_tokens=result.prompt_tokens, completion_tokens=result.completion_tokens)
+            loguru_logger.debug(f"{result.engine} LLM Reply:\n{result.content}")
+            return self._parse_reply(result.content, to_reply_for_general_question), llm_engine
+
+        return await self._llm_engine_router.run(engine, generate_reply)
+
+    async def _generate_verdict_reply(
+        self,
+        llm_engine: LLMEngineAdapter,
+        *,
+        messages: List[Dict[str, str]],
+        openai_key: Optional[str] = None
+    ) -> str:
+        """Streams the verdict reply, and cancels the upstream request once the verdict is unambiguous."""
+        verdict_parser = IncrementalVerdictParser()
+        stream_deltas = llm_engine.chat_stream(
+            messages=messages,
+            max_tokens=self._prompt_budget.max_tokens(MODE_GENERAL_QUESTION),
+            temperature=self._openai_conf_chat_temperature,
+            preferred_key=openai_key
+        )
+        try:
+            async for delta in stream_deltas:
+                if verdict_parser.feed(delta):
+                    break
+        finally:
+            # NOTE: Closing the stream early cancels the upstream HTTP request.
+            await stream_deltas.aclose()
+        self._record_early_termination(verdict_parser)
+        # NOTE: The whole reply has arrived, the verdict may still be settled from the tail of it.
+        verdict_parser.finish()
+        loguru_logger.debug(f"{llm_engine.name} LLM Reply:\n{verdict_parser.raw_reply}")
+        return verdict_parser.reply()
+
+    def _record_early_termination(self, verdict_parser: IncrementalVerdictParser):
+        # NOTE: Each streamed delta carries one token.
+        used_tokens = verdict_parser.num_deltas
+        metrics.incr_counter("early_termination.calls")
+        metrics.incr_counter("early_termination.completion_tokens_used", used_tokens)
+        if verdict_parser.settled:
+            metrics.incr_counter("early_termination.terminated")
+            metrics.incr_counter(
+                "early_termination.completion_tokens_saved",
+                max(0.0, self._verdict_completion_tokens_ewma - used_tokens)
+            )
+        else:
+            self._verdict_completion_tokens_ewma = 0.9 * self._verdict_completion_tokens_ewma + 0.1 * used_tokens
@@ -0,0 +1,313 @@
+# -*- coding: utf-8 -*-
+import asyncio
+import heapq
+import time
+from contextlib import asynccontextmanager
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import grpc.aio
+from loguru import logger as loguru_logger
+
+from internal.utils import metrics
+
+# The higher the more important, a queued RPC of a higher priority is always admitted first.
+PRIORITY_LOW = 0
+PRIORITY_NORMAL = 1
+PRIORITY_HIGH = 2
+
+_PRIORITY_NAMES = {
+    PRIORITY_LOW: "low",
+    PRIORITY_NORMAL: "normal",
+    PRIORITY_HIGH: "high",
+}
+
+REJECT_REASON_QUEUE_FULL = "queue_full"
+REJECT_REASON_DEADLINE = "deadline"
+REJECT_REASON_TIMEOUT = "timeout"
+REJECT_REASON_EVICTED = "evicted"
+
+
+class AdmissionRejectedException(Exception):
+
+    def __init__(self, reason: str, msg: str):
+        super().__init__(msg)
+        self.reason = reason
+
+
+class AdmissionController:
+    """
+    Inbound admission control of the RPCs which may reach the upstream LLM.
+
+    - In-flight limit: at most `limit` RPCs run at once, the next ones wait in a bounded priority queue,
+      and are rejected right away once the queue is full, or once their deadline can't be met.
+    - Priority: the queue is served by priority then arrival, a full queue evicts its newest RPC of the
+      lowest priority for a more important one, and the last reserved_ratio_for_high_priority of the
+      limit is only for the high priority RPCs (e.g. the truth judgements).
+    - Adaptive limit (AIMD): the limit shrinks multiplicatively when the upstream errors, or when its
+      short-term latency exceeds latency_tolerance times its long-term latency, and grows additively
+      (by about one per `limit` upstream calls) while it is fully used and the upstream keeps up.
+    """
+
+    def __init__(self, *, conf: Optional[Dict[str, Any]] = None):
+        self.configure(conf=conf)
+        self._inflight = 0
+        self._queue_size = 0
+        # (-priority, seq, priority, future) of the queued RPCs, the granted or abandoned futures are
+        # dropped lazily.
+        self._waiters: List[Tuple[int, int, int, asyncio.Future]] = []
+        self._seq = 0
+        self._upstream_samples = 0
+        self._upstream_latency_short = 0.0
+        self._upstream_latency_long = 0.0
+        self._rpc_latency_ewma = 0.0
+        self._last_decreased_at = 0.0
+
+    def configure(self, *, conf: Optional[Dict[str, Any]] = None):
+        conf = conf or {}
+        self.enabled = conf.get("enable", False)
+        self._enable_adaptive_limit = conf.get("enable_adaptive_limit", True)
+        self._min_limit = conf.get("min_limit", 4)
+        self._max_limit = conf.get("max_limit", 256)
+        self._limit = float(min(self._max_limit, max(self._min_limit, conf.get("initial_limit", 32))))
+        self._reserved_ratio = conf.get("reserved_ratio_for_high_priority", 0.1)
+        self._max_queue_size = conf.get("max_queue_size", 64)
+        self._max_queue_wait_secs = conf.get("max_queue_wait_secs", 2)
+        self._latency_tolerance = conf.get("latency_tolerance", 2.0)
+        self._backoff_ratio = conf.get("backoff_ratio", 0.9)
+        self._decrease_interval_secs = conf.get("decrease_interval_secs", 1)
+        self._min_samples = conf.get("min_samples", 20)
+        self._short_ewma_alpha = conf.get("short_ewma_alpha", 0.2)
+        self._long_ewma_alpha = conf.get("long_ewma_alpha", 0.01)
+        metrics.set_gauge("admission.limit", self._limit)
+
+    @property
+    def limit(self) -> int:
+        return int(self._limit)
+
+    @property
+    def inflight(self) -> int:
+        return self._inflight
+
+    @asynccontextmanager
+    async def admit(self, priority: int, *, time_remaining: Optional[float] = None):
+        """Holds an in-flight slot for the body, raises AdmissionRejectedException if none is granted."""
+        if not self.enabled:
+            yield
+            return
+        await self._acquire(priority, time_remaining=time_remaining)
+        st = time.monotonic()
+        try:
+            yield
+        finally:
+            self._rpc_latency_ewma = 0.9 * self._rpc_latency_ewma + 0.1 * (time.monotonic() - st)
+            self._release()
+
+    def observe_upstream(self, *, latency: float, ok: bool):
+        """Adapts the limit to a finished upstream call."""
+        if not self.enabled or not self._enable_adaptive_limit:
+            return
+        if ok:
+            self._upstream_samples += 1
+            if self._upstream_samples == 1:
+                self._upstream_latency_short = self._upstream_latency_long = latency
+            else:
+                self._upstream_latency_short += self._short_ewma_alpha * (latency - self._upstream_latency_short)
+                self._upstream_latency_long += self._long_ewma_alpha * (latency - self._upstream_latency_long)
+            metrics.set_gauge("admission.upstream_latency_short", self._upstream_latency_short)
+            metrics.set_gauge("admission.upstream_latency_long", self._upstream_latency_long)
+
+        congested = self._upstream_samples >= self._min_samples and \
+            self._upstream_latency_short > self._latency_tolerance * self._upstream_latency_long
+        if not ok or congested:
+            # NOTE: One slow response is followed by the others of the same burst, back off once per interval.
+            now = time.monotonic()
+            if now - self._last_decreased_at < self._decrease_interval_secs:
+                return
+            self._last_decreased_at = now
+            self._set_limit(self._limit * self._backoff_ratio)
+            metrics.incr_counter("admission.limit_decreased")
+            loguru_logger.debug(
+                f"Decreased the admission limit to {self._limit:.1f}, ok: {ok}, latency "
+                f"{self._upstream_latency_short:.3f}s vs {self._upstream_latency_long:.3f}s."
+            )
+        elif self._inflight >= self.limit - 1:
+            # NOTE: An idle service learns nothing about the upstream, only a saturated limit may grow.
+            self._set_limit(self._limit + 1 / self._limit)
+
+    async def _acquire(self, priority: int, *, time_remaining: Optional[float] = None):
+        name = _PRIORITY_NAMES.get(priority, str(priority))
+        # NOTE: Never overtake the queued RPCs of the same or a higher priority.
+        head_priority = self._head_priority()
+        if (head_priority is None or priority > head_priority) and self._inflight < self._capacity(priority):
+            self._grant()
+            metrics.incr_counter(f"admission.{name}.admitted")
+            return
+
+        if self._queue_size >= self._max_queue_size and not self._evict_for(priority):
+            self._reject(name, REJECT_REASON_QUEUE_FULL, f"Admission queue is full ({self._queue_size})")
+        # NOTE: Each queued RPC waits for about one RPC latency per `limit` RPCs ahead of it.
+        estimated_wait_secs = (self._queue_size + 1) * self._rpc_latency_ewma / max(1, self.limit)
+        if time_remaining is not None and time_remaining < estimated_wait_secs:
+            self._reject(
+                name, REJECT_REASON_DEADLINE,
+                f"Deadline {time_remaining:.3f}s is shorter than the estimated queueing {estimated_wait_secs:.3f}s"
+            )
+
+        fut = asyncio.get_event_loop().create_future()
+        self._seq += 1
+        heapq.heappush(self._waiters, (-priority, self._seq, priority, fut))
+        self._queue_size += 1
+        metrics.set_gauge("admission.queue_size", self._queue_size)
+        metrics.incr_counter(f"admission.{name}.queued")
+        timeout = self._max_queue_wait_secs
+        if time_remaining is not None:
+            timeout = min(timeout, time_remaining)
+        st = time.monotonic()
+        try:
+            await asyncio.wait_for(fut, timeout=timeout)
+        except asyncio.TimeoutError:
+            if not self._is_granted(fut):
+                self._reject(name, REJECT_REASON_TIMEOUT, f"Waited for admission longer than {timeout:.3f}s")
+        except asyncio.CancelledError:
+            # NOTE: The slot may have been granted right before the caller gave up, hand it on.
+            if self._is_granted(fut):
+                self._release()
+            raise
+        finally:
+            self._queue_size -= 1
+            metrics.set_gauge("admission.queue_size", self._queue_size)
+            metrics.incr_counter("admission.queue_wait_secs", time.monotonic() - st)
+        metrics.incr_counter(f"admission.{name}.admitted")
+
+    @staticmethod
+    def _is_granted(fut: asyncio.Future) -> bool:
+        return fut.done() and not fut.cancelled() and fut.exception() is None
+
+    def _capacity(self, priority: int) -> int:
+        if priority >= PRIORITY_HIGH:
+            return self.limit
+        return max(1, int(self._limit * (1 - self._reserved_ratio)))
+
+    def _grant(self):
+        self._inflight += 1
+        metrics.set_gauge("admission.inflight", self._inflight)
+
+    def _release(self):
+        self._inflight -= 1
+        metrics.set_gauge("admission.inflight", self._inflight)
+        self._dispatch()
+
+    def _head_priority(self) -> Optional[int]:
+        while len(self._waiters) > 0 and self._waiters[0][3].done():
+            heapq.heappop(self._waiters)
+        return self._waiters[0][2] if len(self._waiters) > 0 else None
+
+    def _dispatch(self):
+        # NOTE: The head has the highest priority, if it doesn't fit neither does anything behind it.
+        while 1:
+            priority = self._head_priority()
+            if priority is None or self._inflight >= self._capacity(priority):
+                return
+            _, _, _, fut = heapq.heappop(self._waiters)
+            self._grant()
+            fut.set_result(None)
+
+    def _evict_for(self, priority: int) -> bool:
+        """Rejects the newest queued RPC of the lowest priority below the given one, if any."""
+        victim = None
+        for entry in self._waiters:
+            if entry[3].done() or entry[2] >= priority:
+                continue
+            if victim is None or (entry[2], -entry[1]) < (victim[2], -victim[1]):
+                victim = entry
+        if victim is None:
+            return False
+        victim[3].set_exception(AdmissionRejectedException(REJECT_REASON_EVICTED, "Evicted by a more important RPC"))
+        metrics.incr_counter(f"admission.{_PRIORITY_NAMES.get(victim[2], str(victim[2]))}.rejected.{REJECT_REASON_EVICTED}")
+        return True
+
+    def _set_limit(self, limit: float):
+        self._limit = min(self._max_limit, max(self._min_limit, limit))
+        metrics.set_gauge("admission.limit", self._limit)
+        # NOTE: A grown limit has room for the queued RPCs right away.
+        self._dispatch()
+
+    @staticmethod
+    def _reject(name: str, reason: str, msg: str):
+        metrics.incr_counter(f"admission.{name}.rejected.{reason}")
+        raise AdmissionRejectedException(reason, msg)
+
+
+DEFAULT_ADMISSION_CONTROLLER = AdmissionController()
+
+
+class AdmissionControlInterceptor(grpc.aio.ServerInterceptor):
+    """
+    Runs every RPC of a priority through the admission controller, and fails the rejected ones early
+    with RESOURCE_EXHAUSTED. priority_of(method, request) returns None for the RPCs to let through, e.g.
+    the health checks.
+    """
+
+    def __init__(
+        self,
+        *,
+        controller: AdmissionController,
+        priority_of: Callable[[str, Any], Optional[int]]
+    ):
+        self._controller = controller
+        self._priority_of = priority_of
+
+    async def intercept_service(self, continuation, handler_call_details: grpc.HandlerCallDetails):
+        handler = await continuation(handler_call_details)
+        if handler is None or not self._controller.enabled:
+            return handler
+        method = handler_call_details.method.rsplit("/", 1)[-1]
+        controller = self._controller
+        priority_of = self._priority_of
+
+        async def abort(context: grpc.aio.ServicerContext, exc: AdmissionRejectedException):
+            loguru_logger.debug(f"Rejected {method}, reason: {exc.reason}, err:{exc}.")
+            await context.abort(grpc.StatusCode.RESOURCE_EXHAUSTED, f"Server is overloaded, {exc}")
+
+        if handler.unary_unary is not None:
+            unary_unary = handler.unary_unary
+
+            async def admitted_unary_unary(request: Any, context: grpc.aio.ServicerContext):
+                priority = priority_of(method, request)
+                if priority is None:
+                    return await unary_unary(request, context)
+                try:
+                    async with controller.admit(priority, time_remaining=context.time_remaining()):
+                        return await unary_unary(request, context)
+                except AdmissionRejectedException as exc:
+                    await abort(context, exc)
+
+            return grpc.unary_unary_rpc_method_handler(
+                admitted_unary_unary,
+                request_deserializer=handler.request_deserializer,
+                response_serializer=handler.response_serializer
+            )
+
+        if handler.unary_stream is not None:
+            unary_stream = handler.unary_stream
+
+            async def admitted_unary_stream(request: Any, context: grpc.aio.ServicerContext):
+                priority = priority_of(method, request)
+                if priority is None:
+                    async for resp in unary_stream(request, context):
+                        yield resp
+                    return
+                try:
+                    async with controller.admit(priority, time_remaining=context.time_remaining()):
+                        async for resp in unary_stream(request, context):
+                            yield resp
+                except AdmissionRejectedException as exc:
+                    await abort(context, exc)
+
+            return grpc.unary_stream_rpc_method_handler(
+                admitted_unary_stream,
+                request_deserializer=handler.request_deserializer,
+                response_serializer=handler.response_serializer
+            )
+
+        return handler
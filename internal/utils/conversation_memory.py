@@ -0,0 +1,188 @@
+# -*- coding: utf-8 -*-
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+import ujson as json
+from loguru import logger as loguru_logger
+
+import internal.extensions.ext_redis as ext_redis
+from internal.extensions.ext_redis.keys import gen_conversation_memory_key
+from internal.utils import metrics
+from internal.utils.openai_tools import anum_tokens_from_messages
+from internal.utils.ttl_lru_cache import TTLLRUCache
+
+
+async def acount_message_tokens(message: Dict[str, str], model: str) -> int:
+    """Returns the number of tokens a message takes in the prompt, or a cheap upper bound if it can't be tokenized."""
+    try:
+        # NOTE: num_tokens_from_messages counts 3 more tokens for priming the reply.
+        return await anum_tokens_from_messages([message], model=model) - 3
+    except Exception as exc:
+        loguru_logger.warning(f"Failed to count tokens of message, estimate it instead, err:{exc}.")
+        return len(message["content"]) + 4
+
+
+class MemoryEntry:
+    __slots__ = ("role", "content", "tokens", "is_summary")
+
+    def __init__(self, *, role: str, content: str, tokens: int, is_summary: bool = False):
+        self.role = role
+        self.content = content
+        # NOTE: Counted once when the entry is created, old turns are never tokenized again.
+        self.tokens = tokens
+        self.is_summary = is_summary
+
+    def message(self) -> Dict[str, str]:
+        return {"role": self.role, "content": self.content}
+
+    def dumps(self) -> str:
+        return json.dumps({"role": self.role, "content": self.content, "tokens": self.tokens, "is_summary": self.is_summary}, ensure_ascii=False)
+
+    @classmethod
+    def loads(cls, value: str) -> "MemoryEntry":
+        raw = json.loads(value)
+        return cls(role=raw["role"], content=raw["content"], tokens=raw["tokens"], is_summary=raw.get("is_summary", False))
+
+
+class MemoryTrimPolicy:
+    """Decides what becomes of the old turns trimmed off the conversation memory."""
+
+    name = "drop"
+
+    async def compact(self, dropped: List[MemoryEntry]) -> Optional[MemoryEntry]:
+        """Returns the entry standing in for the dropped turns, None means they are simply forgotten."""
+        return None
+
+
+class DropOldestPolicy(MemoryTrimPolicy):
+    name = "drop"
+
+
+class SummarizeOldestPolicy(MemoryTrimPolicy):
+    """Folds the dropped turns (and the previous summary among them) into one summary message."""
+
+    name = "summarize"
+
+    def __init__(self, *, summarizer: Callable[[List[Dict[str, str]]], Awaitable[str]], model: str):
+        self._summarizer = summarizer
+        self._model = model
+
+    async def compact(self, dropped: List[MemoryEntry]) -> Optional[MemoryEntry]:
+        summary = await self._summarizer([entry.message() for entry in dropped])
+        if len(summary) == 0:
+            return None
+        message = {"role": "system", "content": f"此前的问答摘要：{summary}"}
+        return MemoryEntry(
+            role=message["role"],
+            content=message["content"],
+            tokens=await acount_message_tokens(message, self._model),
+            is_summary=True
+        )
+
+
+class ConversationMemory:
+    """
+    Per-conversation chat history, stored in Redis (or in-process if Redis is disabled) with the token
+    count of each message, and trimmed to the token budget of the call from the newest turn backwards.
+
+    The trimmed turns are handed to the trim policy, and replaced by what it returns at the head of the
+    stored history (in one Lua script in Redis), so that the next call doesn't load them again and the turns
+    appended meanwhile are kept.
+    """
+
+    def __init__(self, *, conf: Optional[Dict[str, Any]] = None, model: str, policy: Optional[MemoryTrimPolicy] = None):
+        conf = conf or {}
+        self._model = model
+        self._ttl_secs = conf.get("ttl_secs", 86400)
+        self._policy = policy or DropOldestPolicy()
+        self._local = TTLLRUCache(capacity=conf.get("local_capacity", 10000), default_ttl=self._ttl_secs)
+
+    async def acount_tokens(self, message: Dict[str, str]) -> int:
+        return await acount_message_tokens(message, self._model)
+
+    async def load(self, conversation_id: str, *, token_budget: int) -> List[Dict[str, str]]:
+        """Returns the most recent history which fits in token_budget, oldest first."""
+        entries = await self._read(conversation_id)
+        if len(entries) == 0:
+            return []
+
+        kept: List[MemoryEntry] = []
+        used_tokens = 0
+        for entry in reversed(entries):
+            if used_tokens + entry.tokens > token_budget:
+                break
+            kept.append(entry)
+            used_tokens += entry.tokens
+        kept.reverse()
+        # NOTE: Never keep an answer without its question.
+        while len(kept) > 0 and kept[0].role == "assistant":
+            used_tokens -= kept.pop(0).tokens
+
+        if len(kept) < len(entries):
+            dropped = entries[:len(entries) - len(kept)]
+            metrics.incr_counter("conversation_memory.trimmed_messages", len(dropped))
+            try:
+                summary = await self._policy.compact(dropped)
+            except Exception as exc:
+                loguru_logger.warning(f"Failed to compact the trimmed turns with policy {self._policy.name}, drop them, err:{exc}.")
+                summary = None
+            head: List[MemoryEntry] = []
+            if summary is not None:
+                # NOTE: The summary takes its share of the budget, at the cost of the oldest kept turns.
+                while len(kept) > 0 and used_tokens + summary.tokens > token_budget:
+                    used_tokens -= kept.pop(0).tokens
+                if used_tokens + summary.tokens <= token_budget:
+                    head = [summary]
+                    used_tokens += summary.tokens
+            await self._trim(conversation_id, entries, num_dropped=len(entries) - len(kept), head=head)
+            kept = head + kept
+
+        metrics.set_gauge("conversation_memory.loaded_tokens", used_tokens)
+        return [entry.message() for entry in kept]
+
+    async def append(self, conversation_id: str, messages: List[Dict[str, str]]):
+        entries = [
+            MemoryEntry(role=message["role"], content=message["content"], tokens=await self.acount_tokens(message))
+            for message in messages
+        ]
+        redis_client = ext_redis.instance()
+        if redis_client is not None:
+            done = await redis_client.append_to_list(
+                gen_conversation_memory_key(conversation_id),
+                [entry.dumps() for entry in entries],
+                ttl=self._ttl_secs
+            )
+            if done:
+                return
+            loguru_logger.warning(f"Failed to append to conversation memory {conversation_id} in Redis, keep it locally.")
+        self._local.set(conversation_id, (self._local.get(conversation_id) or []) + entries)
+
+    async def _read(self, conversation_id: str) -> List[MemoryEntry]:
+        redis_client = ext_redis.instance()
+        if redis_client is not None:
+            values, done = await redis_client.get_list_of_strings(gen_conversation_memory_key(conversation_id))
+            if done:
+                return [MemoryEntry.loads(value) for value in values]
+        return list(self._local.get(conversation_id) or [])
+
+    async def _trim(self, conversation_id: str, entries: List[MemoryEntry], *, num_dropped: int, head: List[MemoryEntry]):
+        """Replaces the num_dropped oldest of the entries read with head, keeping the turns appended since."""
+        redis_client = ext_redis.instance()
+        if redis_client is not None:
+            applied, done = await redis_client.trim_list_head(
+                gen_conversation_memory_key(conversation_id),
+                expected_head=entries[0].dumps(),
+                expected_len=len(entries),
+                num_dropped=num_dropped,
+                head_values=[entry.dumps() for entry in head],
+                ttl=self._ttl_secs
+            )
+            if done:
+                if not applied:
+                    # NOTE: Trimmed by a concurrent call already, the next load trims again if need be.
+                    metrics.incr_counter("conversation_memory.trim_conflicts")
+                return
+            loguru_logger.warning(f"Failed to trim conversation memory {conversation_id} in Redis, trim it next time.")
+            return
+        current = self._local.get(conversation_id) or []
+        if len(current) >= len(entries) and current[0] is entries[0]:
+            self._local.set(conversation_id, head + current[num_dropped:])
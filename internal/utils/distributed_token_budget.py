@@ -0,0 +1,157 @@
+# -*- coding: utf-8 -*-
+import asyncio
+import time
+from typing import Any, Dict, Optional
+
+from loguru import logger as loguru_logger
+
+import internal.extensions.ext_redis as ext_redis
+from internal.extensions.ext_redis.keys import gen_token_budget_key
+from internal.utils import metrics
+from internal.utils.token_bucket import TokenBucket
+
+# Refills the bucket by the elapsed Redis server time, then tries to take ARGV[3] tokens out of it.
+# Returns {allowed, tokens left, seconds to wait until the request can be satisfied}.
+_RESERVE_SCRIPT = """
+local capacity = tonumber(ARGV[1])
+local rate = tonumber(ARGV[2])
+local requested = tonumber(ARGV[3])
+local t = redis.call('TIME')
+local now = tonumber(t[1]) + tonumber(t[2]) / 1000000
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(state[1])
+local ts = tonumber(state[2])
+if tokens == nil or ts == nil then
+    tokens = capacity
+    ts = now
+end
+tokens = math.min(capacity, tokens + math.max(0, now - ts) * rate)
+local allowed = 0
+local wait = 0
+if tokens >= requested then
+    tokens = tokens - requested
+    allowed = 1
+else
+    wait = (requested - tokens) / rate
+end
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'ts', tostring(now))
+redis.call('EXPIRE', KEYS[1], math.ceil(capacity / rate) * 2)
+return {allowed, tostring(tokens), tostring(wait)}
+"""
+
+# Refills the bucket by the elapsed Redis server time, then gives ARGV[3] tokens back to it
+# (takes them out if negative, the bucket may go into debt).
+_ADJUST_SCRIPT = """
+local capacity = tonumber(ARGV[1])
+local rate = tonumber(ARGV[2])
+local delta = tonumber(ARGV[3])
+local t = redis.call('TIME')
+local now = tonumber(t[1]) + tonumber(t[2]) / 1000000
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(state[1])
+local ts = tonumber(state[2])
+if tokens == nil or ts == nil then
+    tokens = capacity
+    ts = now
+end
+tokens = math.min(capacity, tokens + math.max(0, now - ts) * rate + delta)
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'ts', tostring(now))
+redis.call('EXPIRE', KEYS[1], math.ceil(capacity / rate) * 2)
+return tostring(tokens)
+"""
+
+TIER_REDIS = "redis"
+TIER_LOCAL = "local"
+
+
+class TokenBudgetExhaustedException(Exception):
+    pass
+
+
+class TokenReservation:
+
+    def __init__(self, *, tier: str, tokens: float):
+        self.tier = tier
+        self.tokens = tokens
+
+
+class DistributedTokenBudget:
+    """
+    Cluster-wide upstream token budget (TPM), shared by all the replicas through a token
+    bucket in Redis, updated atomically by Lua scripts.
+
+    Each call reserves its estimated prompt+completion tokens before invoking the upstream,
+    and reconciles the reservation against the actual usage afterwards. When Redis is
+    unreachable, it degrades to a local-only bucket holding this replica's share of the budget.
+    """
+
+    def __init__(self, *, conf: Optional[Dict[str, Any]] = None):
+        conf = conf or {}
+        self._enabled = conf.get("enable", False)
+        self._scope = conf.get("scope", "org")
+        self._tpm_limit = float(conf.get("tpm_limit", 300000))
+        self._rate = self._tpm_limit / 60
+        self._max_wait_secs = conf.get("max_wait_secs", 2)
+        # NOTE: How long to stay local-only after Redis failed, so that we don't pay for a
+        # Redis round trip (and its timeout) on every call while it is down.
+        self._redis_retry_interval_secs = conf.get("redis_retry_interval_secs", 5)
+        self._redis_unavailable_until = 0.0
+        self._local_bucket = TokenBucket(capacity=self._tpm_limit * conf.get("local_fallback_share", 0.25))
+
+    @property
+    def enabled(self) -> bool:
+        return self._enabled
+
+    async def reserve(self, tokens: float) -> TokenReservation:
+        """Reserves tokens, waits up to max_wait_secs for the bucket to refill, raises TokenBudgetExhaustedException otherwise."""
+        deadline = time.monotonic() + self._max_wait_secs
+        while 1:
+            tier, allowed, wait_secs = await self._try_reserve(tokens)
+            if allowed:
+                metrics.incr_counter(f"token_budget.{tier}.reserved_tokens", tokens)
+                return TokenReservation(tier=tier, tokens=tokens)
+            if time.monotonic() + wait_secs > deadline:
+                metrics.incr_counter("token_budget.rejections")
+                raise TokenBudgetExhaustedException(f"Upstream token budget exhausted, {tokens} tokens requested.")
+            metrics.incr_counter("token_budget.waits")
+            await asyncio.sleep(wait_secs)
+
+    async def reconcile(self, reservation: TokenReservation, used_tokens: float):
+        """Gives back the over-reserved tokens, or takes the under-reserved ones."""
+        delta = reservation.tokens - used_tokens
+        if delta == 0:
+            return
+        if reservation.tier == TIER_REDIS and self._redis_available():
+            _, done = await ext_redis.instance().eval_lua_script(
+                _ADJUST_SCRIPT,
+                [gen_token_budget_key(self._scope)],
+                [self._tpm_limit, self._rate, delta]
+            )
+            if done:
+                return
+            self._mark_redis_unavailable()
+        self._local_bucket.consume(-delta)
+
+    async def _try_reserve(self, tokens: float):
+        if self._redis_available():
+            result, done = await ext_redis.instance().eval_lua_script(
+                _RESERVE_SCRIPT,
+                [gen_token_budget_key(self._scope)],
+                [self._tpm_limit, self._rate, tokens]
+            )
+            if done:
+                allowed, _, wait_secs = result
+                return TIER_REDIS, int(allowed) == 1, float(wait_secs)
+            self._mark_redis_unavailable()
+
+        metrics.incr_counter("token_budget.local_fallbacks")
+        if self._local_bucket.try_consume(tokens):
+            return TIER_LOCAL, True, 0.0
+        return TIER_LOCAL, False, self._local_bucket.seconds_until_available(tokens)
+
+    def _redis_available(self) -> bool:
+        return ext_redis.instance() is not None and self._redis_unavailable_until < time.monotonic()
+
+    def _mark_redis_unavailable(self):
+        loguru_logger.warning(f"Redis is unreachable, limit the upstream token budget locally for {self._redis_retry_interval_secs}s.")
+        self._redis_unavailable_until = time.monotonic() + self._redis_retry_interval_secs
@@ -0,0 +1,86 @@
+# -*- coding: utf-8 -*-
+import asyncio
+import gc
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, Optional
+
+from loguru import logger as loguru_logger
+
+try:
+    import uvloop
+except ImportError:
+    uvloop = None
+
+BACKEND_AUTO = "auto"
+BACKEND_ASYNCIO = "asyncio"
+BACKEND_UVLOOP = "uvloop"
+
+
+class _LoguruHandler(logging.Handler):
+    """Forwards the records of a stdlib logger (e.g. the slow callback warnings of asyncio) to loguru."""
+
+    def emit(self, record: logging.LogRecord):
+        loguru_logger.opt(exception=record.exc_info).log(record.levelname, record.getMessage())
+
+
+def create_event_loop(conf: Optional[Dict[str, Any]] = None) -> asyncio.AbstractEventLoop:
+    """
+    Creates the event loop of the server from the event_loop config:
+
+    - backend: "asyncio", "uvloop", or "auto" (uvloop if installed, otherwise asyncio).
+    - default_executor_workers: size of the default executor, which runs the DNS lookups
+      (getaddrinfo) of aiohttp among others, 0 keeps the asyncio default.
+    - slow_callback_duration_secs: with debug on, every callback or task step blocking the loop
+      longer than this is logged with its source, e.g. a tokenization done on the loop.
+    """
+    conf = conf or {}
+    backend = conf.get("backend", BACKEND_AUTO)
+    if backend == BACKEND_UVLOOP and uvloop is None:
+        loguru_logger.warning("uvloop is not installed, use the asyncio event loop instead.")
+    if backend in (BACKEND_AUTO, BACKEND_UVLOOP) and uvloop is not None:
+        loop = uvloop.new_event_loop()
+    else:
+        loop = asyncio.new_event_loop()
+
+    default_executor_workers = conf.get("default_executor_workers", 0)
+    if default_executor_workers > 0:
+        loop.set_default_executor(ThreadPoolExecutor(max_workers=default_executor_workers, thread_name_prefix="asyncio"))
+
+    # NOTE: asyncio only measures the callbacks in debug mode, which costs a few percent of throughput.
+    if conf.get("debug", False):
+        loop.set_debug(True)
+        loop.slow_callback_duration = conf.get("slow_callback_duration_secs", 0.1)
+        asyncio_logger = logging.getLogger("asyncio")
+        if not any(isinstance(handler, _LoguruHandler) for handler in asyncio_logger.handlers):
+            asyncio_logger.addHandler(_LoguruHandler())
+            asyncio_logger.propagate = False
+    loguru_logger.info(
+        f"Created {type(loop).__module__}.{type(loop).__name__}, default executor workers: "
+        f"{default_executor_workers or 'default'}, debug: {loop.get_debug()}."
+    )
+    return loop
+
+
+def tune_gc(conf: Optional[Dict[str, Any]] = None):
+    """Applies gc.threshold of the gc config, e.g. [50000, 20, 20] to collect the young generation less often."""
+    conf = conf or {}
+    threshold = conf.get("threshold")
+    if threshold:
+        gc.set_threshold(*threshold)
+        loguru_logger.info(f"Set GC threshold to {gc.get_threshold()}.")
+
+
+def freeze_gc(conf: Optional[Dict[str, Any]] = None):
+    """
+    Moves every object allocated so far (modules, tokenizers, config, the servicer) into the permanent
+    generation, so that the collections never scan them again. Each worker is exec'ed and starts up on its
+    own, so it freezes its own startup objects, nothing is shared with the supervisor.
+    """
+    conf = conf or {}
+    if not conf.get("freeze_after_startup", True):
+        return
+    # NOTE: Collect first, so that no garbage gets frozen with the live objects.
+    gc.collect()
+    gc.freeze()
+    loguru_logger.info(f"Froze {gc.get_freeze_count()} objects out of the GC.")
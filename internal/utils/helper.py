@@ -2,6 +2,7 @@
 import asyncio
 import platform
 import random
+import re
 import sys
 import time
 from functools import wraps
@@ -71,20 +72,17 @@ def get_hostname() -> str:
     return platform.node()
 
 
+# NOTE: Built once, membership is a hash lookup and removal is a single regex pass in C (which, unlike
+# str.translate with a dict table, doesn't fall back to a per-character lookup on non-ASCII text).
+PUNCTUATION_SET = frozenset(PUNCTUATION_LIST)
+PUNCTUATION_PATTERN = re.compile(f"[{re.escape(PUNCTUATION_LIST)}]+")
+
+
 def is_text_all_punctuation(text: str) -> bool:
     """Check if a text is all punctuation."""
-    yes = True
-    for char in text:
-        if str(char) not in PUNCTUATION_LIST:
-            yes = False
-            break
-    return yes
+    return PUNCTUATION_SET.issuperset(text)
 
 
 def remove_all_punctuations(text: str) -> str:
     """Remove all punctuations from a text."""
-    new_text_arr = []
-    for char in text:
-        if str(char) not in PUNCTUATION_LIST:
-            new_text_arr.append(str(char))
-    return "".join(new_text_arr)
+    return PUNCTUATION_PATTERN.sub("", text)
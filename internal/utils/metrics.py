@@ -0,0 +1,54 @@
+# -*- coding: utf-8 -*-
+import asyncio
+from collections import defaultdict
+from typing import Dict
+
+from loguru import logger as loguru_logger
+
+# Process-wide registry of monotonically increasing counters.
+_COUNTERS: Dict[str, float] = defaultdict(float)
+# Process-wide registry of point-in-time gauges.
+_GAUGES: Dict[str, float] = {}
+
+
+def incr_counter(name: str, value: float = 1):
+    """Increase the counter by the given value."""
+    _COUNTERS[name] += value
+
+
+def get_counter(name: str) -> float:
+    """Get the current value of the counter."""
+    return _COUNTERS.get(name, 0)
+
+
+def set_gauge(name: str, value: float):
+    """Set the gauge to the given value."""
+    _GAUGES[name] = value
+
+
+def get_gauge(name: str) -> float:
+    """Get the current value of the gauge."""
+    return _GAUGES.get(name, 0)
+
+
+def ratio(numerator: float, denominator: float) -> float:
+    """Safe division used to derive ratio gauges from counters."""
+    if denominator <= 0:
+        return 0.0
+    return numerator / denominator
+
+
+def snapshot() -> Dict[str, float]:
+    """Get a copy of all counters and gauges."""
+    snap = dict(_COUNTERS)
+    snap.update(_GAUGES)
+    return snap
+
+
+async def report_metrics_periodically(interval_secs: float):
+    """Log a snapshot of all metrics every interval_secs seconds."""
+    while 1:
+        await asyncio.sleep(interval_secs)
+        snap = snapshot()
+        if len(snap) > 0:
+            loguru_logger.info("Metrics: " + ", ".join(f"{k}={v:g}" for k, v in sorted(snap.items())))
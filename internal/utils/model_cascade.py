@@ -0,0 +1,150 @@
+# -*- coding: utf-8 -*-
+import asyncio
+import math
+import time
+from typing import Any, Dict, List, Optional
+
+from loguru import logger as loguru_logger
+
+from internal.constants.prompts import PROMPT_FOR_INTENTION
+from internal.utils import metrics
+from internal.utils.distributed_token_budget import (
+    DistributedTokenBudget,
+    TokenBudgetExhaustedException
+)
+from internal.utils.openai_key_pool import OpenAIKeyPool
+from internal.utils.openai_tools import acall_completion_api_with_key_pool
+from internal.utils.retry_with_backoff import (
+    CallAbandonedException,
+    DeadlineExceededException
+)
+from internal.utils.verdict_parser import (
+    VERDICT_IRRELEVANT,
+    VERDICT_NO,
+    VERDICT_PARTIALLY,
+    VERDICT_YES
+)
+
+TIER_INTENTION = "intention"
+TIER_CHAT = "chat"
+
+# NOTE: The intention model answers with one letter, which is one token, so that the logprobs of the
+# first token tell how sure it is. "E" (anything else) always escalates.
+_LABEL_TO_VERDICT = {
+    "A": VERDICT_YES,
+    "B": VERDICT_NO,
+    "C": VERDICT_IRRELEVANT,
+    "D": VERDICT_PARTIALLY,
+}
+
+
+class ModelCascade:
+    """
+    Two-tier cascade for the general questions: the cheap and fast intention model (a Completions model,
+    e.g. gpt-3.5-turbo-instruct) classifies the question into a verdict first, and only when it is not
+    confident enough, or the verdict is one to escalate, does the question go to the chat model.
+
+    Truth judgements never go through the cascade. Each tier counts its calls, latency, tokens and cost
+    as model_cascade.{tier}.*.
+    """
+
+    def __init__(
+        self,
+        *,
+        conf: Optional[Dict[str, Any]] = None,
+        model: str,
+        key_pool: OpenAIKeyPool,
+        token_budget: Optional[DistributedTokenBudget] = None
+    ):
+        conf = conf or {}
+        self.enabled = conf.get("enable", False)
+        self._model = model
+        self._key_pool = key_pool
+        self._token_budget = token_budget
+        self._confidence_threshold = conf.get("confidence_threshold", 0.9)
+        # NOTE: Only the chat model tells whether a question touches a key clue ("这个问题很关键").
+        self._escalate_verdicts = set(conf.get("escalate_verdicts", [VERDICT_YES, VERDICT_PARTIALLY]))
+        self._request_timeout_secs = conf.get("request_timeout_secs", 10)
+        self._cost_per_1k_tokens = conf.get("cost_per_1k_tokens", {})
+
+    async def classify(self, *, system_prompt: str, user_message: str, preferred_key: Optional[str] = None) -> Optional[str]:
+        """Returns the verdict reply of the intention model if it is confident, None means to escalate."""
+        prompt = f"{system_prompt}\n{PROMPT_FOR_INTENTION.strip()}\n\n用户提问：{user_message}\n回答："
+        st = time.monotonic()
+        try:
+            completion = await acall_completion_api_with_key_pool(
+                key_pool=self._key_pool,
+                token_budget=self._token_budget,
+                # NOTE: A CJK character never takes more than one token.
+                estimated_tokens=len(prompt) + 1,
+                preferred_key=preferred_key,
+                model=self._model,
+                prompt=prompt,
+                max_tokens=1,
+                temperature=0.0,
+                logprobs=5,
+                request_timeout=self._request_timeout_secs
+            )
+        except (DeadlineExceededException, CallAbandonedException, TokenBudgetExhaustedException, asyncio.CancelledError):
+            raise
+        except Exception as exc:
+            loguru_logger.warning(f"Failed to classify the question with the intention model, escalate it, err:{exc}.")
+            metrics.incr_counter(f"model_cascade.{TIER_INTENTION}.errors")
+            self._record_escalation()
+            return None
+        self.record(
+            TIER_INTENTION,
+            latency_secs=time.monotonic() - st,
+            prompt_tokens=completion.usage.prompt_tokens,
+            completion_tokens=completion.usage.completion_tokens
+        )
+
+        label, confidence = self._parse_label(completion.choices[0].logprobs.top_logprobs)
+        metrics.set_gauge(f"model_cascade.{TIER_INTENTION}.last_confidence", confidence)
+        verdict = _LABEL_TO_VERDICT.get(label)
+        if verdict is None or confidence < self._confidence_threshold or verdict in self._escalate_verdicts:
+            loguru_logger.debug(f"Escalated the question to the chat model, label:{label}, confidence:{confidence:.3f}.")
+            self._record_escalation()
+            return None
+        metrics.incr_counter(f"model_cascade.{TIER_INTENTION}.answered")
+        self._update_answered_ratio()
+        return f"{verdict}。"
+
+    def record(self, tier: str, *, latency_secs: Optional[float] = None, prompt_tokens: int = 0, completion_tokens: int = 0):
+        if latency_secs is not None:
+            metrics.incr_counter(f"model_cascade.{tier}.calls")
+            metrics.incr_counter(f"model_cascade.{tier}.latency_secs", latency_secs)
+        if prompt_tokens > 0 or completion_tokens > 0:
+            metrics.incr_counter(f"model_cascade.{tier}.prompt_tokens", prompt_tokens)
+            metrics.incr_counter(f"model_cascade.{tier}.completion_tokens", completion_tokens)
+            prices = self._cost_per_1k_tokens.get(tier, {})
+            metrics.incr_counter(
+                f"model_cascade.{tier}.cost",
+                (prompt_tokens * prices.get("prompt", 0) + completion_tokens * prices.get("completion", 0)) / 1000
+            )
+
+    @staticmethod
+    def _parse_label(top_logprobs: List[Dict[str, float]]):
+        """Returns the most likely label and its probability."""
+        if len(top_logprobs) == 0:
+            return None, 0.0
+        probs: Dict[str, float] = {}
+        for token, logprob in top_logprobs[0].items():
+            # NOTE: " A" and "A" are different tokens of the same label.
+            label = token.strip().upper()
+            if label in _LABEL_TO_VERDICT or label == "E":
+                probs[label] = probs.get(label, 0.0) + math.exp(logprob)
+        if len(probs) == 0:
+            return None, 0.0
+        label = max(probs, key=probs.get)
+        return label, probs[label]
+
+    def _record_escalation(self):
+        metrics.incr_counter(f"model_cascade.{TIER_INTENTION}.escalated")
+        self._update_answered_ratio()
+
+    @staticmethod
+    def _update_answered_ratio():
+        answered = metrics.get_counter(f"model_cascade.{TIER_INTENTION}.answered")
+        escalated = metrics.get_counter(f"model_cascade.{TIER_INTENTION}.escalated")
+        metrics.set_gauge(f"model_cascade.{TIER_INTENTION}.answered_ratio", metrics.ratio(answered, answered + escalated))
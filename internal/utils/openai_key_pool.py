@@ -0,0 +1,199 @@
+# -*- coding: utf-8 -*-
+import random
+import re
+import time
+from types import SimpleNamespace
+from typing import Any, Dict, Iterable, List, Mapping, Optional
+
+import aiohttp
+from aiohttp.tracing import TraceRequestEndParams
+from loguru import logger as loguru_logger
+
+from internal.utils import metrics
+from internal.utils.token_bucket import TokenBucket
+
+_DURATION_PATTERN = re.compile(r"(\d+(?:\.\d+)?)(ms|h|m|s)")
+_DURATION_UNITS = {"h": 3600.0, "m": 60.0, "s": 1.0, "ms": 0.001}
+
+
+def parse_ratelimit_reset(value: Optional[str]) -> Optional[float]:
+    """Parses the x-ratelimit-reset-* header (e.g. "1s", "6m0s", "120ms") into seconds."""
+    if not value:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    matches = _DURATION_PATTERN.findall(value)
+    if len(matches) == 0:
+        return None
+    return sum(float(num) * _DURATION_UNITS[unit] for num, unit in matches)
+
+
+class OpenAIKeyState:
+
+    def __init__(self, *, key: str, alias: str, rpm_limit: float, tpm_limit: float):
+        self.key = key
+        self.alias = alias
+        self.rpm_bucket = TokenBucket(capacity=rpm_limit)
+        self.tpm_bucket = TokenBucket(capacity=tpm_limit)
+        self.cooldown_until = 0.0
+        self.in_flight = 0
+
+    def is_cooling_down(self, now: float) -> bool:
+        return self.cooldown_until > now
+
+    def headroom(self) -> float:
+        return min(self.rpm_bucket.headroom(), self.tpm_bucket.headroom())
+
+    def rank(self):
+        # NOTE: Keys with (nearly) the same headroom are picked at random, to spread the load evenly.
+        return (round(self.headroom(), 2), -self.in_flight, random.random())
+
+
+class OpenAIKeyPool:
+    """
+    Rate-limit-aware scheduler over the OpenAI API keys.
+
+    Each key tracks its RPM/TPM budget with token buckets, seeded from the x-ratelimit-*
+    response headers. Calls are routed to the key with the most headroom, and a key is
+    cooled down on RateLimitError.
+    """
+
+    def __init__(
+        self,
+        *,
+        keys: List[str],
+        conf: Optional[Dict[str, Any]] = None
+    ):
+        conf = conf or {}
+        self._default_cooldown_secs = conf.get("cooldown_secs", 10)
+        self._states: Dict[str, OpenAIKeyState] = {}
+        for idx, key in enumerate(keys):
+            self._states[key] = OpenAIKeyState(
+                key=key,
+                alias=f"key{idx}",
+                rpm_limit=conf.get("default_rpm_limit", 500),
+                tpm_limit=conf.get("default_tpm_limit", 30000)
+            )
+
+        self.trace_config = aiohttp.TraceConfig()
+        self.trace_config.on_request_end.append(self._on_request_end)
+
+    def __len__(self) -> int:
+        return len(self._states)
+
+    def best_key(self, *, exclude: Iterable[str] = ()) -> str:
+        """Returns the key with the most headroom, without reserving anything on it."""
+        now = time.monotonic()
+        exclude = set(exclude)
+        candidates = [state for state in self._states.values() if state.key not in exclude]
+        if len(candidates) == 0:
+            candidates = list(self._states.values())
+        available = [state for state in candidates if not state.is_cooling_down(now)]
+        if len(available) == 0:
+            return min(candidates, key=lambda state: state.cooldown_until).key
+        return max(available, key=lambda state: state.rank()).key
+
+    def acquire(
+        self,
+        *,
+        estimated_tokens: float = 0,
+        preferred_key: Optional[str] = None,
+        exclude: Iterable[str] = ()
+    ) -> str:
+        """Picks the key with the most headroom and reserves one request and the estimated tokens on it."""
+        now = time.monotonic()
+        exclude = set(exclude)
+        candidates = [state for state in self._states.values() if state.key not in exclude]
+        if len(candidates) == 0:
+            candidates = list(self._states.values())
+        available = [state for state in candidates if not state.is_cooling_down(now)]
+
+        chosen = None
+        if preferred_key is not None and preferred_key in self._states:
+            preferred = self._states[preferred_key]
+            if preferred in available and preferred.rpm_bucket.available() >= 1 and \
+                    preferred.tpm_bucket.available() >= estimated_tokens:
+                chosen = preferred
+        if chosen is None and len(available) > 0:
+            chosen = max(available, key=lambda state: state.rank())
+        if chosen is None:
+            # NOTE: Every key is cooling down, take the one which recovers first.
+            chosen = min(candidates, key=lambda state: state.cooldown_until)
+            metrics.incr_counter("openai_key_pool.all_keys_cooling_down")
+
+        chosen.rpm_bucket.consume(1)
+        chosen.tpm_bucket.consume(estimated_tokens)
+        chosen.in_flight += 1
+        self._report(chosen)
+        return chosen.key
+
+    def release(self, key: str, *, estimated_tokens: float = 0, used_tokens: Optional[float] = None):
+        """Releases the key, and reconciles the reserved tokens with the actual usage if known."""
+        state = self._states.get(key)
+        if state is None:
+            return
+        state.in_flight = max(0, state.in_flight - 1)
+        if used_tokens is not None:
+            state.tpm_bucket.consume(used_tokens - estimated_tokens)
+        self._report(state)
+
+    def cool_down(self, key: str, *, retry_after: Optional[float] = None):
+        state = self._states.get(key)
+        if state is None:
+            return
+        cooldown_secs = retry_after if retry_after is not None and retry_after > 0 else self._default_cooldown_secs
+        state.cooldown_until = max(state.cooldown_until, time.monotonic() + cooldown_secs)
+        metrics.incr_counter(f"openai_key_pool.{state.alias}.cooldowns")
+        loguru_logger.warning(f"OpenAI API key {state.alias} is rate limited, cooling down for {cooldown_secs:.3f}s.")
+
+    def update_from_headers(self, key: str, headers: Mapping[str, str]):
+        state = self._states.get(key)
+        if state is None:
+            return
+        try:
+            if "x-ratelimit-remaining-requests" in headers:
+                state.rpm_bucket.reset(
+                    capacity=float(headers.get("x-ratelimit-limit-requests", state.rpm_bucket.capacity)),
+                    remaining=float(headers["x-ratelimit-remaining-requests"]),
+                    reset_in_secs=parse_ratelimit_reset(headers.get("x-ratelimit-reset-requests"))
+                )
+            if "x-ratelimit-remaining-tokens" in headers:
+                state.tpm_bucket.reset(
+                    capacity=float(headers.get("x-ratelimit-limit-tokens", state.tpm_bucket.capacity)),
+                    remaining=float(headers["x-ratelimit-remaining-tokens"]),
+                    reset_in_secs=parse_ratelimit_reset(headers.get("x-ratelimit-reset-tokens"))
+                )
+        except ValueError as exc:
+            loguru_logger.warning(f"Failed to parse rate limit headers of OpenAI API key {state.alias}, err:{exc}.")
+        self._report(state)
+
+    def utilisation(self) -> Dict[str, Dict[str, float]]:
+        now = time.monotonic()
+        return {
+            state.alias: {
+                "rpm_utilisation": 1 - state.rpm_bucket.headroom(),
+                "tpm_utilisation": 1 - state.tpm_bucket.headroom(),
+                "in_flight": state.in_flight,
+                "cooling_down": float(state.is_cooling_down(now)),
+            }
+            for state in self._states.values()
+        }
+
+    def _report(self, state: OpenAIKeyState):
+        metrics.set_gauge(f"openai_key_pool.{state.alias}.rpm_utilisation", 1 - state.rpm_bucket.headroom())
+        metrics.set_gauge(f"openai_key_pool.{state.alias}.tpm_utilisation", 1 - state.tpm_bucket.headroom())
+        metrics.set_gauge(f"openai_key_pool.{state.alias}.in_flight", state.in_flight)
+
+    async def _on_request_end(
+        self,
+        session: aiohttp.ClientSession,
+        trace_config_ctx: SimpleNamespace,
+        params: TraceRequestEndParams
+    ):
+        authorization = params.headers.get("Authorization", "")
+        if not authorization.startswith("Bearer "):
+            return
+        key = authorization[len("Bearer "):]
+        self.update_from_headers(key, params.response.headers)
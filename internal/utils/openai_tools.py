@@ -1,40 +1,183 @@
 # -*- coding: utf-8 -*-
-from typing import Dict, List
+import time
+from functools import lru_cache
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional, Tuple
 
 import openai
 import openai.error as openai_error
-import tiktoken
 from loguru import logger as loguru_logger
 
-from internal.utils.retry_with_backoff import aretry_with_exponential_backoff
+from internal.utils.distributed_token_budget import DistributedTokenBudget
+from internal.utils.openai_key_pool import OpenAIKeyPool, parse_ratelimit_reset
+from internal.utils.outbound_scheduler import DEFAULT_OUTBOUND_SCHEDULER
+from internal.utils.retry_with_backoff import (
+    aretry_with_deadline_aware_backoff,
+    get_call_time_remaining,
+    record_local_wait
+)
+from internal.utils.tokenizer import DEFAULT_TOKENIZER
 
 
-@aretry_with_exponential_backoff(errors=(openai_error.RateLimitError,))
-def acall_completion_api_with_backoff(**kwargs):
-    return openai.Completion.acreate(**kwargs)
+@aretry_with_deadline_aware_backoff(errors=(openai_error.RateLimitError,))
+async def acall_chat_completion_api_with_key_pool(
+    *,
+    key_pool: OpenAIKeyPool,
+    estimated_tokens: float = 0,
+    preferred_key: Optional[str] = None,
+    token_budget: Optional[DistributedTokenBudget] = None,
+    **kwargs
+):
+    """
+    Calls the Chat Completions API (more info: https://platform.openai.com/docs/api-reference/chat), retried
+    with backoff on RateLimitError. Each attempt is routed to the API key with the most headroom, and reserves
+    its estimated tokens from the cluster-wide token budget if given.
+    """
+    return await _acreate_with_key_pool(
+        openai.ChatCompletion,
+        key_pool=key_pool,
+        estimated_tokens=estimated_tokens,
+        preferred_key=preferred_key,
+        token_budget=token_budget,
+        **kwargs
+    )
 
 
-@aretry_with_exponential_backoff(errors=(openai_error.RateLimitError,))
-def acall_chat_completion_api_with_backoff(**kwargs):
-    """More info: https://platform.openai.com/docs/api-reference/chat"""
-    return openai.ChatCompletion.acreate(**kwargs)
+@aretry_with_deadline_aware_backoff(errors=(openai_error.RateLimitError,))
+async def acall_completion_api_with_key_pool(
+    *,
+    key_pool: OpenAIKeyPool,
+    estimated_tokens: float = 0,
+    preferred_key: Optional[str] = None,
+    token_budget: Optional[DistributedTokenBudget] = None,
+    **kwargs
+):
+    """Same as acall_chat_completion_api_with_key_pool, but for the Completions API (e.g. gpt-3.5-turbo-instruct)."""
+    return await _acreate_with_key_pool(
+        openai.Completion,
+        key_pool=key_pool,
+        estimated_tokens=estimated_tokens,
+        preferred_key=preferred_key,
+        token_budget=token_budget,
+        **kwargs
+    )
+
+
+async def _acreate_with_key_pool(
+    api: Any,
+    *,
+    key_pool: OpenAIKeyPool,
+    estimated_tokens: float,
+    preferred_key: Optional[str],
+    token_budget: Optional[DistributedTokenBudget],
+    **kwargs
+):
+    # NOTE: The HTTP request must not outlive the deadline of the call.
+    time_remaining = get_call_time_remaining()
+    if time_remaining is not None:
+        kwargs["request_timeout"] = min(kwargs.get("request_timeout") or time_remaining, time_remaining)
+
+    reservation = None
+    if token_budget is not None and token_budget.enabled:
+        st = time.monotonic()
+        reservation = await token_budget.reserve(estimated_tokens)
+        record_local_wait(time.monotonic() - st)
+    api_key = None
+    release_slot = None
+    used_tokens = None
+    # NOTE: A failed attempt costs no upstream tokens, a streamed one keeps its estimate.
+    budget_used_tokens = 0
+    try:
+        # NOTE: Queue by priority and fairness here, rather than in arrival order for the connection pool.
+        release_slot = await DEFAULT_OUTBOUND_SCHEDULER.acquire(cost=estimated_tokens)
+        # NOTE: Pick the key once dispatched, its headroom may have changed while queueing.
+        api_key = key_pool.acquire(estimated_tokens=estimated_tokens, preferred_key=preferred_key)
+        completion = await api.acreate(api_key=api_key, **kwargs)
+        if not kwargs.get("stream", False):
+            used_tokens = completion.usage.total_tokens
+            budget_used_tokens = used_tokens
+        else:
+            budget_used_tokens = estimated_tokens
+            # NOTE: A stream holds its connection until it is closed, and so does it hold its slot.
+            completion, release_slot = _SlotReleasingStream(completion, release_slot), None
+        return completion
+    except openai_error.RateLimitError as exc:
+        key_pool.cool_down(api_key, retry_after=parse_ratelimit_reset((exc.headers or {}).get("retry-after")))
+        raise exc
+    finally:
+        if release_slot is not None:
+            release_slot()
+        if api_key is not None:
+            key_pool.release(api_key, estimated_tokens=estimated_tokens, used_tokens=used_tokens)
+        if reservation is not None:
+            st = time.monotonic()
+            await token_budget.reconcile(reservation, budget_used_tokens)
+            record_local_wait(time.monotonic() - st)
+
+
+class _SlotReleasingStream:
+    """
+    Streamed completion which gives its scheduler slot back once closed or exhausted. Unlike an async
+    generator, closing it releases the slot even if it has never been iterated.
+    """
+
+    def __init__(self, stream: AsyncIterator[Any], release: Callable[[], None]):
+        self._stream = stream
+        self._release = release
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self) -> Any:
+        try:
+            return await self._stream.__anext__()
+        except BaseException:
+            self._release_once()
+            raise
+
+    async def aclose(self):
+        try:
+            await self._stream.aclose()
+        finally:
+            self._release_once()
+
+    def _release_once(self):
+        if self._release is not None:
+            self._release, release = None, self._release
+            release()
+
+
+def estimate_tokens_used(messages: List[Dict[str, str]], max_tokens: int) -> int:
+    """Returns a cheap upper bound of the tokens used by a chat completion, without tokenizing."""
+    # NOTE: A CJK character never takes more than one token in cl100k_base.
+    return sum(len(message["content"]) + 4 for message in messages) + 3 + max_tokens
+
+
+async def aiter_chat_completion_stream_deltas(stream: AsyncIterator[Any]) -> AsyncIterator[str]:
+    """Yields the content deltas of a streamed chat completion, and closes the upstream response once done."""
+    try:
+        async for chunk in stream:
+            if len(chunk.choices) == 0:
+                continue
+            content = chunk.choices[0].delta.get("content")
+            if content:
+                yield content
+    finally:
+        await stream.aclose()
 
 
 def calc_tokens_used(prompt: str) -> int:
     """Returns the number of tokens in a text string."""
-    encoding = tiktoken.encoding_for_model("gpt-3.5-turbo")
-    token_cnt = len(encoding.encode(prompt))
-    return token_cnt
+    return DEFAULT_TOKENIZER.count(prompt, "gpt-3.5-turbo")
 
 
-def num_tokens_from_messages(messages: List[Dict[str, str]], model: str = "gpt-3.5-turbo-0613") -> int:
-    """Return the number of tokens used by a list of messages."""
-    try:
-        encoding = tiktoken.encoding_for_model(model)
-    except KeyError:
-        loguru_logger.warning("Warning: Model not found. Using cl100k_base encoding.")
-        encoding = tiktoken.get_encoding("cl100k_base")
+async def acalc_tokens_used(prompt: str) -> int:
+    """Same as calc_tokens_used, but tokenizes large inputs off the event loop."""
+    return await DEFAULT_TOKENIZER.acount(prompt, "gpt-3.5-turbo")
+
 
+@lru_cache(maxsize=None)
+def _message_overheads(model: str) -> Tuple[str, int, int]:
+    """Returns the model to count the tokens with, tokens_per_message and tokens_per_name."""
     if model in {
         "gpt-3.5-turbo-0613",
         "gpt-3.5-turbo-16k-0613",
@@ -43,31 +186,47 @@ def num_tokens_from_messages(messages: List[Dict[str, str]], model: str = "gpt-3
         "gpt-4-0613",
         "gpt-4-32k-0613"
     }:
-        tokens_per_message = 3
-        tokens_per_name = 1
+        return model, 3, 1
     elif model == "gpt-3.5-turbo-0301":
         # every message follows <|start|>{role/name}\n{content}<|end|>\n
-        tokens_per_message = 4
         # if there's a name, the role is omitted
-        tokens_per_name = -1
+        return model, 4, -1
     elif "gpt-3.5-turbo" in model:
         loguru_logger.warning("Warning: gpt-3.5-turbo may update over time. Returning num tokens assuming gpt-3.5-turbo-0613.")
-        return num_tokens_from_messages(messages, model="gpt-3.5-turbo-0613")
+        return _message_overheads("gpt-3.5-turbo-0613")
     elif "gpt-4" in model:
         loguru_logger.warning("Warning: gpt-4 may update over time. Returning num tokens assuming gpt-4-0613.")
-        return num_tokens_from_messages(messages, model="gpt-4-0613")
+        return _message_overheads("gpt-4-0613")
     else:
         raise NotImplementedError(
             f"""num_tokens_from_messages() is not implemented for model {model}. See https://github.com/openai/openai-python/blob/main/chatml.md for information on how messages are converted to tokens."""
         )
 
+
+def _sum_message_tokens(messages: List[Dict[str, str]], counts: List[int], tokens_per_message: int, tokens_per_name: int) -> int:
     num_tokens = 0
+    idx = 0
     for message in messages:
         num_tokens += tokens_per_message
-        for key, value in message.items():
-            num_tokens += len(encoding.encode(value))
+        for key in message:
+            num_tokens += counts[idx]
+            idx += 1
             if key == "name":
                 num_tokens += tokens_per_name
     # every reply is primed with <|start|>assistant<|message|>
     num_tokens += 3
     return num_tokens
+
+
+def num_tokens_from_messages(messages: List[Dict[str, str]], model: str = "gpt-3.5-turbo-0613") -> int:
+    """Return the number of tokens used by a list of messages."""
+    model, tokens_per_message, tokens_per_name = _message_overheads(model)
+    counts = [DEFAULT_TOKENIZER.count(value, model) for message in messages for value in message.values()]
+    return _sum_message_tokens(messages, counts, tokens_per_message, tokens_per_name)
+
+
+async def anum_tokens_from_messages(messages: List[Dict[str, str]], model: str = "gpt-3.5-turbo-0613") -> int:
+    """Same as num_tokens_from_messages, but tokenizes the uncached messages in one batch, off the event loop if large."""
+    model, tokens_per_message, tokens_per_name = _message_overheads(model)
+    counts = await DEFAULT_TOKENIZER.acount_batch([value for message in messages for value in message.values()], model)
+    return _sum_message_tokens(messages, counts, tokens_per_message, tokens_per_name)
@@ -0,0 +1,178 @@
+# -*- coding: utf-8 -*-
+import asyncio
+import heapq
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from internal.utils import metrics
+from internal.utils.admission_control import (
+    PRIORITY_HIGH,
+    PRIORITY_LOW,
+    PRIORITY_NORMAL
+)
+from internal.utils.retry_with_backoff import (
+    DeadlineExceededException,
+    get_call_time_remaining,
+    record_local_wait
+)
+from internal.utils.ttl_lru_cache import TTLLRUCache
+
+_PRIORITY_NAMES = {
+    PRIORITY_LOW: "low",
+    PRIORITY_NORMAL: "normal",
+    PRIORITY_HIGH: "high",
+}
+
+# (flow, priority, user class) of the upstream calls made by the current request.
+_SCHEDULING: ContextVar[Optional[Tuple[str, int, str]]] = ContextVar("outbound-scheduling", default=None)
+
+
+class OutboundQueueTimeoutException(Exception):
+    pass
+
+
+@contextmanager
+def scheduling_context(*, flow: str, priority: int = PRIORITY_NORMAL, user_class: str = ""):
+    """Tells the outbound scheduler whom the upstream calls of the current request are made for."""
+    token = _SCHEDULING.set((flow, priority, user_class))
+    try:
+        yield
+    finally:
+        _SCHEDULING.reset(token)
+
+
+class OutboundScheduler:
+    """
+    Schedules the upstream LLM calls over at most max_concurrency connections, instead of letting them
+    race for the connection pool in arrival order.
+
+    - Priority classes: a queued call of a higher priority (e.g. a truth judgement) is always dispatched
+      before the lower ones (e.g. the questions, then the batches).
+    - Weighted fair queueing within a class: each flow (a room, or a user without one) gets a virtual
+      finish tag advanced by the estimated tokens of its calls divided by the weight of its user class,
+      and the smallest tag goes first, so that one busy room can't starve the others.
+
+    Every upstream attempt goes through it: the OpenAI SDK calls of the key pool, and the HTTP requests of
+    the other engine adapters.
+    """
+
+    def __init__(self, *, conf: Optional[Dict[str, Any]] = None):
+        self.configure(conf=conf)
+        self._inflight = 0
+        self._queue_size = 0
+        self._queue_depths: Dict[int, int] = {priority: 0 for priority in _PRIORITY_NAMES}
+        # (-priority, finish tag, seq, start tag, future) of the queued calls.
+        self._waiters: List[Tuple[int, float, int, float, asyncio.Future]] = []
+        self._seq = 0
+        self._virtual_time = 0.0
+
+    def configure(self, *, conf: Optional[Dict[str, Any]] = None):
+        conf = conf or {}
+        self.enabled = conf.get("enable", False)
+        self._max_concurrency = conf.get("max_concurrency", 32)
+        self._max_queue_wait_secs = conf.get("max_queue_wait_secs", 30)
+        self._weights: Dict[str, float] = conf.get("weights", {})
+        self._default_weight = conf.get("default_weight", 1)
+        # NOTE: A flow which is evicted restarts at the virtual time, as if it had been idle.
+        self._finish_tags = TTLLRUCache(capacity=conf.get("max_flows", 10000))
+
+    async def acquire(self, *, cost: float = 1) -> Callable[[], None]:
+        """Waits for a connection slot for one upstream call, returns the function to give it back."""
+        if not self.enabled:
+            return _noop
+        flow, priority, user_class = _SCHEDULING.get() or ("", PRIORITY_NORMAL, "")
+        name = _PRIORITY_NAMES.get(priority, str(priority))
+        start_tag = max(self._virtual_time, self._finish_tags.get(flow, 0.0))
+        charge = max(1.0, cost) / self._weights.get(user_class, self._default_weight)
+        finish_tag = start_tag + charge
+        self._finish_tags.set(flow, finish_tag)
+
+        if self._queue_size == 0 and self._inflight < self._max_concurrency:
+            self._virtual_time = start_tag
+            self._grant()
+            self._record_wait(name, 0.0)
+            return self._release
+
+        fut = asyncio.get_event_loop().create_future()
+        self._seq += 1
+        st = time.monotonic()
+        heapq.heappush(self._waiters, (-priority, finish_tag, self._seq, start_tag, fut))
+        self._set_queue_depth(priority, 1)
+        # NOTE: The slots of the calls which gave up while queued may be free already.
+        self._dispatch()
+        timeout = self._max_queue_wait_secs
+        time_remaining = get_call_time_remaining()
+        if time_remaining is not None:
+            timeout = min(timeout, max(0.0, time_remaining))
+        try:
+            await asyncio.wait_for(fut, timeout=timeout)
+        except asyncio.TimeoutError:
+            if not self._is_granted(fut):
+                self._refund(flow, charge)
+                metrics.incr_counter(f"outbound_scheduler.{name}.timeouts")
+                if time_remaining is not None and timeout < self._max_queue_wait_secs:
+                    raise DeadlineExceededException(f"Deadline exceeded while queueing for the upstream, waited {timeout:.3f}s.")
+                raise OutboundQueueTimeoutException(f"Queued for the upstream longer than {timeout:.3f}s.")
+        except asyncio.CancelledError:
+            # NOTE: The slot may have been granted right before the caller gave up, hand it on.
+            if self._is_granted(fut):
+                self._release()
+            else:
+                self._refund(flow, charge)
+            raise
+        finally:
+            self._set_queue_depth(priority, -1)
+        wait_secs = time.monotonic() - st
+        self._record_wait(name, wait_secs)
+        record_local_wait(wait_secs)
+        return self._release
+
+    def _refund(self, flow: str, charge: float):
+        # NOTE: A call which never went out mustn't push back the later calls of its flow.
+        finish_tag = self._finish_tags.get(flow)
+        if finish_tag is not None:
+            self._finish_tags.set(flow, max(self._virtual_time, finish_tag - charge))
+
+    def _grant(self):
+        self._inflight += 1
+        metrics.set_gauge("outbound_scheduler.inflight", self._inflight)
+
+    def _release(self):
+        self._inflight -= 1
+        metrics.set_gauge("outbound_scheduler.inflight", self._inflight)
+        self._dispatch()
+
+    def _dispatch(self):
+        while self._inflight < self._max_concurrency and len(self._waiters) > 0:
+            _, _, _, start_tag, fut = heapq.heappop(self._waiters)
+            if fut.done():
+                continue
+            # NOTE: Start-time virtual clock, the flows which show up later start from where service is.
+            self._virtual_time = max(self._virtual_time, start_tag)
+            self._grant()
+            fut.set_result(None)
+
+    @staticmethod
+    def _is_granted(fut: asyncio.Future) -> bool:
+        return fut.done() and not fut.cancelled() and fut.exception() is None
+
+    def _set_queue_depth(self, priority: int, delta: int):
+        self._queue_size += delta
+        self._queue_depths[priority] = self._queue_depths.get(priority, 0) + delta
+        metrics.set_gauge("outbound_scheduler.queue_depth", self._queue_size)
+        metrics.set_gauge(f"outbound_scheduler.{_PRIORITY_NAMES.get(priority, str(priority))}.queue_depth", self._queue_depths[priority])
+
+    @staticmethod
+    def _record_wait(name: str, wait_secs: float):
+        metrics.incr_counter(f"outbound_scheduler.{name}.dispatched")
+        metrics.incr_counter(f"outbound_scheduler.{name}.wait_secs", wait_secs)
+        metrics.set_gauge(f"outbound_scheduler.{name}.last_wait_secs", wait_secs)
+
+
+def _noop():
+    pass
+
+
+DEFAULT_OUTBOUND_SCHEDULER = OutboundScheduler()
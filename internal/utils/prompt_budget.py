@@ -0,0 +1,134 @@
+# -*- coding: utf-8 -*-
+from typing import Any, Dict, List, Optional, Tuple
+
+from loguru import logger as loguru_logger
+
+from internal.utils import metrics
+from internal.utils.openai_tools import anum_tokens_from_messages
+from internal.utils.response_cache import (
+    MODE_GENERAL_QUESTION,
+    MODE_TRUTH_JUDGEMENT
+)
+from internal.utils.tokenizer import DEFAULT_TOKENIZER
+
+OVERFLOW_POLICY_REJECT = "reject"
+OVERFLOW_POLICY_TRUNCATE = "truncate"
+
+# Context windows of the chat models, matched by the longest prefix of the model name.
+_CONTEXT_WINDOW_TOKENS = {
+    "gpt-3.5-turbo": 4096,
+    "gpt-3.5-turbo-16k": 16385,
+    "gpt-3.5-turbo-1106": 16385,
+    "gpt-3.5-turbo-0125": 16385,
+    "gpt-4": 8192,
+    "gpt-4-32k": 32768,
+    "gpt-4-1106-preview": 128000,
+    "gpt-4-0125-preview": 128000,
+    "gpt-4-turbo": 128000,
+    "gpt-4o": 128000,
+}
+_DEFAULT_CONTEXT_WINDOW_TOKENS = 4096
+
+
+def context_window_tokens(model: str) -> int:
+    """Returns the context window of the chat model, that of the smallest one if it is unknown."""
+    prefixes = [prefix for prefix in _CONTEXT_WINDOW_TOKENS if model.startswith(prefix)]
+    if len(prefixes) == 0:
+        return _DEFAULT_CONTEXT_WINDOW_TOKENS
+    return _CONTEXT_WINDOW_TOKENS[max(prefixes, key=len)]
+
+
+class PromptTooLargeException(Exception):
+    pass
+
+
+class PromptBudget:
+    """
+    Pre-flight check of the prompt size, done locally before any network I/O, so that an oversized
+    prompt is turned away (or truncated) here rather than by the upstream after a full round trip.
+
+    The completion budget (max_tokens) is picked per mode: a verdict is a handful of tokens, a JSON
+    truth judgement with its reason needs more.
+    """
+
+    def __init__(self, *, conf: Optional[Dict[str, Any]] = None, model: str):
+        conf = conf or {}
+        self._model = model
+        self.enabled = conf.get("enable", True)
+        # NOTE: 0 derives it from the chat model, leaving room for the counting error of the local tokenizer.
+        self.context_window_tokens = conf.get("context_window_tokens", 0) or int((context_window_tokens(model) - 4 - 128) * 0.95)
+        self._overflow_policy = conf.get("overflow_policy", OVERFLOW_POLICY_TRUNCATE)
+        # NOTE: Truncating the question below this many tokens leaves nothing worth answering.
+        self._min_user_message_tokens = conf.get("min_user_message_tokens", 16)
+        max_tokens_conf = conf.get("max_tokens", {})
+        self._max_tokens = {
+            MODE_GENERAL_QUESTION: max_tokens_conf.get(MODE_GENERAL_QUESTION, 48),
+            MODE_TRUTH_JUDGEMENT: max_tokens_conf.get(MODE_TRUTH_JUDGEMENT, 256),
+        }
+
+    def max_tokens(self, mode: str) -> int:
+        return self._max_tokens.get(mode, self._max_tokens[MODE_TRUTH_JUDGEMENT])
+
+    def prompt_token_budget(self, mode: str) -> int:
+        """Returns how many tokens the prompt may take, what is left of the context window by the reply."""
+        return self.context_window_tokens - self.max_tokens(mode)
+
+    async def fit(
+        self,
+        *,
+        system_prompt: str,
+        user_message: str,
+        history: List[Dict[str, str]],
+        mode: str
+    ) -> Tuple[str, List[Dict[str, str]]]:
+        """
+        Returns the user message and the history to send, truncated to the prompt budget if the overflow
+        policy allows it. Raises PromptTooLargeException if the prompt doesn't fit.
+        """
+        if not self.enabled:
+            return user_message, history
+
+        token_budget = self.prompt_token_budget(mode)
+        try:
+            system_tokens = await self._acount_message_tokens({"role": "system", "content": system_prompt})
+            user_tokens = await self._acount_message_tokens({"role": "user", "content": user_message})
+            history_tokens = [await self._acount_message_tokens(message) for message in history]
+        except Exception as exc:
+            # NOTE: Without a tokenizer the upstream is left to judge, rather than guessing here.
+            loguru_logger.warning(f"Failed to count prompt tokens, skip the pre-flight check, err:{exc}.")
+            return user_message, history
+
+        # NOTE: Every reply is primed with 3 tokens.
+        prompt_tokens = system_tokens + user_tokens + sum(history_tokens) + 3
+        metrics.set_gauge("prompt_budget.prompt_tokens", prompt_tokens)
+        if prompt_tokens <= token_budget:
+            return user_message, history
+
+        if self._overflow_policy != OVERFLOW_POLICY_TRUNCATE:
+            metrics.incr_counter("prompt_budget.rejected")
+            raise PromptTooLargeException(f"Prompt takes {prompt_tokens} tokens, exceeds the budget {token_budget}.")
+
+        # NOTE: The system prompt holds the rules of the game, only the history and the question can be cut,
+        # the oldest turns go first.
+        history = list(history)
+        while len(history) > 0 and prompt_tokens > token_budget:
+            history.pop(0)
+            prompt_tokens -= history_tokens.pop(0)
+        # NOTE: Never keep an answer without its question.
+        while len(history) > 0 and history[0]["role"] == "assistant":
+            history.pop(0)
+            prompt_tokens -= history_tokens.pop(0)
+        if prompt_tokens > token_budget:
+            # NOTE: The role and separators of the user message take 4 tokens.
+            user_message_budget = user_tokens - 4 - (prompt_tokens - token_budget)
+            if user_message_budget < self._min_user_message_tokens:
+                metrics.incr_counter("prompt_budget.rejected")
+                raise PromptTooLargeException(f"Prompt takes {prompt_tokens} tokens, exceeds the budget {token_budget} even if truncated.")
+            user_message = DEFAULT_TOKENIZER.truncate(user_message, user_message_budget, self._model)
+        metrics.incr_counter("prompt_budget.truncated")
+        loguru_logger.warning(f"Truncated the prompt to the budget {token_budget} tokens.")
+        return user_message, history
+
+    async def _acount_message_tokens(self, message: Dict[str, str]) -> int:
+        # NOTE: num_tokens_from_messages counts 3 more tokens for priming the reply.
+        return await anum_tokens_from_messages([message], model=self._model) - 3
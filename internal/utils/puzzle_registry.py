@@ -0,0 +1,100 @@
+# -*- coding: utf-8 -*-
+import hashlib
+import re
+from typing import Any, Dict, List, Optional
+
+import ujson as json
+from loguru import logger as loguru_logger
+
+import internal.extensions.ext_redis as ext_redis
+from internal.constants.prompts import PROMPT_FOR_QUESTION, PROMPT_FOR_TRUTH
+from internal.extensions.ext_redis.keys import gen_puzzle_key
+from internal.utils import metrics
+from internal.utils.response_cache import MODE_GENERAL_QUESTION
+from internal.utils.ttl_lru_cache import TTLLRUCache
+
+# NOTE: The templates hold literal braces (the JSON output format), so they can't go through str.format.
+_PLACEHOLDER_PATTERN = re.compile(r"\{(story|truth|tips|key_clues)\}")
+
+
+def render_prompt(template: str, **values: str) -> str:
+    return _PLACEHOLDER_PATTERN.sub(lambda m: values.get(m.group(1), m.group(0)), template).strip()
+
+
+class PuzzleNotFoundException(Exception):
+    pass
+
+
+class Puzzle:
+    __slots__ = ("puzzle_id", "question_prompt", "truth_prompt", "digest")
+
+    def __init__(self, *, puzzle_id: str, story: str, truth: str, key_clues: List[str]):
+        clues = "\n".join(f"- {clue.strip()}" for clue in key_clues if len(clue.strip()) > 0)
+        self.puzzle_id = puzzle_id
+        self.question_prompt = render_prompt(PROMPT_FOR_QUESTION, story=story.strip(), truth=truth.strip(), tips=clues)
+        self.truth_prompt = render_prompt(PROMPT_FOR_TRUTH, truth=truth.strip(), key_clues=clues)
+        # NOTE: Short stand-in for the prompts, e.g. in logs.
+        self.digest = hashlib.md5(f"{self.question_prompt}\x1f{self.truth_prompt}".encode()).hexdigest()[:12]
+
+    def system_prompt(self, mode: str) -> str:
+        if mode == MODE_GENERAL_QUESTION:
+            return self.question_prompt
+        return self.truth_prompt
+
+
+class PuzzleRegistry:
+    """
+    Server-side registry of the puzzles, so that clients send the puzzle ID (ext_thread_id) rather than
+    the rendered system prompt on every call.
+
+    Puzzles are rendered once into PROMPT_FOR_QUESTION / PROMPT_FOR_TRUTH and kept in a bounded in-process
+    index, the raw puzzles are persisted in Redis so that every replica can load them lazily.
+    """
+
+    def __init__(self, *, conf: Optional[Dict[str, Any]] = None):
+        conf = conf or {}
+        self._enable_redis_tier = conf.get("enable_redis_tier", True)
+        self._ttl_secs = conf.get("ttl_secs", 0)
+        self._local = TTLLRUCache(capacity=conf.get("capacity", 10000))
+
+    async def register(self, *, puzzle_id: str, story: str, truth: str, key_clues: List[str]) -> Puzzle:
+        puzzle = Puzzle(puzzle_id=puzzle_id, story=story, truth=truth, key_clues=key_clues)
+        self._local.set(puzzle_id, puzzle)
+        metrics.incr_counter("puzzle_registry.registrations")
+        metrics.set_gauge("puzzle_registry.local_size", len(self._local))
+
+        redis_client = ext_redis.instance()
+        if self._enable_redis_tier and redis_client is not None:
+            value = json.dumps({"story": story, "truth": truth, "key_clues": list(key_clues)}, ensure_ascii=False)
+            try:
+                done = await redis_client.cache_string(gen_puzzle_key(puzzle_id), value, ttl=self._ttl_secs)
+            except Exception as exc:
+                loguru_logger.warning(f"Failed to write puzzle {puzzle_id} to Redis, err:{exc}.")
+                done = False
+            if not done:
+                loguru_logger.warning(f"Puzzle {puzzle_id} is only registered on this replica.")
+        return puzzle
+
+    async def get(self, puzzle_id: str) -> Optional[Puzzle]:
+        puzzle = self._local.get(puzzle_id)
+        if puzzle is not None:
+            metrics.incr_counter("puzzle_registry.local_hits")
+            return puzzle
+
+        redis_client = ext_redis.instance()
+        if self._enable_redis_tier and redis_client is not None:
+            try:
+                value, existed, _ = await redis_client.exist_or_get_string(gen_puzzle_key(puzzle_id))
+            except Exception as exc:
+                loguru_logger.warning(f"Failed to read puzzle {puzzle_id} from Redis, err:{exc}.")
+                value, existed = None, False
+            if existed:
+                raw = json.loads(value)
+                puzzle = Puzzle(puzzle_id=puzzle_id, story=raw["story"], truth=raw["truth"], key_clues=raw["key_clues"])
+                self._local.set(puzzle_id, puzzle)
+                metrics.incr_counter("puzzle_registry.redis_hits")
+                metrics.set_gauge("puzzle_registry.local_size", len(self._local))
+                return puzzle
+
+        metrics.incr_counter("puzzle_registry.misses")
+        return None
@@ -0,0 +1,152 @@
+# -*- coding: utf-8 -*-
+import re
+import time
+from typing import Any, Dict, Optional
+
+import ujson as json
+from loguru import logger as loguru_logger
+
+import internal.extensions.ext_redis as ext_redis
+from internal.extensions.ext_redis.keys import gen_question_index_key
+from internal.utils import metrics
+from internal.utils.text_normalizer import DEFAULT_TEXT_NORMALIZER
+from internal.utils.ttl_lru_cache import TTLLRUCache
+from internal.utils.verdict_parser import ALL_VERDICTS
+
+# NOTE: "A不A" / "A没A" is how a yes-no question is asked, not a negation, e.g. 是不是 / 有没有 / 会不会.
+_A_NOT_A_PATTERN = re.compile(r"(.)[不没]\1")
+# NOTE: "是否" asks a yes-no question like "A不A" does, and the sentence-final particles only mark it as one,
+# e.g. 他死了吗 / 他是否死了. The particles within a sentence may carry meaning, they are kept.
+_QUESTION_MARKER_PATTERN = re.compile(r"是否|[吗嘛呢吧啊呀哦么]+$")
+# The characters two paraphrases may differ by, e.g. 他死了 / 他是死的. Anything else is a different question.
+_FILLER_PATTERN = re.compile(r"[是的了]")
+
+
+def canonicalize_question(question: str) -> str:
+    """Normalizes a question, and strips the wording which doesn't change its meaning."""
+    question = DEFAULT_TEXT_NORMALIZER.normalize(question)
+    question = _A_NOT_A_PATTERN.sub(r"\1", question)
+    return _QUESTION_MARKER_PATTERN.sub("", question)
+
+
+def strip_fillers(question: str) -> str:
+    """Returns the content of a canonicalized question, which two paraphrases of it must share exactly."""
+    return _FILLER_PATTERN.sub("", question)
+
+
+def is_indexable_answer(answer: str) -> bool:
+    """Only verdicts are facts of the puzzle, which hold for every paraphrase of the question."""
+    answer = DEFAULT_TEXT_NORMALIZER.normalize(answer)
+    return any(answer.startswith(verdict) for verdict in ALL_VERDICTS)
+
+
+class PuzzleQuestionIndex:
+    """The answers to the questions of one puzzle, keyed by their content, evicting the least recently used once full."""
+
+    def __init__(self, *, capacity: int):
+        self._capacity = capacity
+        self._answers = TTLLRUCache(capacity=capacity)
+        self.synced_at = 0.0
+
+    def __len__(self) -> int:
+        return len(self._answers)
+
+    def get(self, content: str) -> Optional[str]:
+        return self._answers.get(content)
+
+    def add(self, content: str, answer: str):
+        if len(self._answers) >= self._capacity and self._answers.get(content) is None:
+            metrics.incr_counter("question_index.evictions")
+        self._answers.set(content, answer)
+
+
+class NearDuplicateQuestionIndex:
+    """
+    Per-puzzle near-duplicate answer index, which answers the paraphrases of an already answered question
+    (e.g. "他死了吗" and "他是不是死了") with its verdict, fully locally without any embedding API.
+
+    Questions are canonicalized (the question markers and the "A不A" forms) and stripped of the fillers
+    (是 / 的 / 了), and only the questions with the very same content match: a single other character (人肉 /
+    狗肉) or a reordering (男人杀了女人 / 女人杀了男人) makes another question, however similar.
+    The puzzles are kept in a bounded LRU, and the answered questions of each puzzle are appended to a
+    capped Redis list, which every replica loads lazily and syncs periodically.
+    """
+
+    def __init__(self, *, conf: Optional[Dict[str, Any]] = None):
+        conf = conf or {}
+        self.enabled = conf.get("enable", False)
+        self._capacity_per_puzzle = conf.get("capacity_per_puzzle", 512)
+        self._enable_redis_tier = conf.get("enable_redis_tier", True)
+        self._redis_read_timeout_secs = conf.get("redis_read_timeout_secs", 0.2)
+        self._ttl_secs = conf.get("ttl_secs", 86400)
+        self._sync_interval_secs = conf.get("sync_interval_secs", 60)
+        self._puzzles = TTLLRUCache(capacity=conf.get("max_puzzles", 256))
+
+    async def lookup(self, scope: str, question: str) -> Optional[str]:
+        """Returns the answer of a near-duplicate question of the puzzle, None if there is none."""
+        index = await self._get_index(scope)
+        content = strip_fillers(canonicalize_question(question))
+        answer = index.get(content) if len(content) > 0 else None
+        if answer is None:
+            metrics.incr_counter("question_index.misses")
+            return None
+        metrics.incr_counter("question_index.hits")
+        return answer
+
+    async def add(self, scope: str, question: str, answer: str):
+        if not is_indexable_answer(answer):
+            return
+        question = canonicalize_question(question)
+        content = strip_fillers(question)
+        if len(content) == 0:
+            return
+        index = await self._get_index(scope)
+        if index.get(content) is not None:
+            return
+        index.add(content, answer)
+
+        redis_client = ext_redis.instance()
+        if self._enable_redis_tier and redis_client is not None:
+            try:
+                await redis_client.append_to_list(
+                    gen_question_index_key(scope),
+                    [json.dumps({"question": question, "answer": answer}, ensure_ascii=False)],
+                    ttl=self._ttl_secs,
+                    max_len=self._capacity_per_puzzle
+                )
+            except Exception as exc:
+                loguru_logger.warning(f"Failed to write question index {scope} to Redis, err:{exc}.")
+
+    async def _get_index(self, scope: str) -> PuzzleQuestionIndex:
+        index = self._puzzles.get(scope)
+        if index is None:
+            index = PuzzleQuestionIndex(capacity=self._capacity_per_puzzle)
+            self._puzzles.set(scope, index)
+            metrics.set_gauge("question_index.puzzles", len(self._puzzles))
+        if time.monotonic() - index.synced_at >= self._sync_interval_secs:
+            index.synced_at = time.monotonic()
+            await self._sync(scope, index)
+        return index
+
+    async def _sync(self, scope: str, index: PuzzleQuestionIndex):
+        """Merges in the questions answered by the other replicas."""
+        redis_client = ext_redis.instance()
+        if not self._enable_redis_tier or redis_client is None:
+            return
+        # NOTE: The lookup waits for the sync, a slow Redis costs a miss rather than the latency of every question.
+        values, done = await redis_client.try_get_list_of_strings(gen_question_index_key(scope), timeout=self._redis_read_timeout_secs)
+        if not done:
+            metrics.incr_counter("question_index.redis_read_failures")
+            return
+        for value in values:
+            try:
+                entry = json.loads(value)
+                question, answer = entry["question"], entry["answer"]
+            except (ValueError, TypeError, KeyError) as exc:
+                # NOTE: One bad entry must not take the whole puzzle down with it.
+                metrics.incr_counter("question_index.bad_entries")
+                loguru_logger.warning(f"Skipped a bad entry of question index {scope}, err:{exc}.")
+                continue
+            content = strip_fillers(question)
+            if len(content) > 0 and index.get(content) is None:
+                index.add(content, answer)
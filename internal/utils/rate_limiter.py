@@ -0,0 +1,132 @@
+# -*- coding: utf-8 -*-
+import time
+import uuid
+from collections import deque
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+from loguru import logger as loguru_logger
+
+import internal.extensions.ext_redis as ext_redis
+from internal.extensions.ext_redis.keys import gen_rate_limit_key
+from internal.utils import metrics
+from internal.utils.ttl_lru_cache import TTLLRUCache
+
+SCOPE_UID = "uid"
+SCOPE_THREAD = "thread"
+
+_ANONYMOUS_UIDS = ("", "None")
+
+
+class RateLimitExceededException(Exception):
+
+    def __init__(self, *, scope: str, retry_after_secs: float):
+        super().__init__(f"Too many requests per {scope}, retry after {retry_after_secs:.1f}s")
+        self.scope = scope
+        self.retry_after_secs = retry_after_secs
+
+
+class UserRateLimiter:
+    """
+    Per-user (x-uid) and per-thread (ext_thread_id) sliding window rate limiter, shared by all the
+    replicas through one Redis sorted set per subject, checked and updated in one Lua round trip.
+
+    - Tiers: the limits depend on the user class (the user_class_metadata_key metadata of the RPC),
+      0 means unlimited. An unknown class gets the tier of default_user_class.
+    - Blocked cache: a rejected subject is remembered locally until its window has room again, so that
+      a caller who keeps retrying doesn't cost a Redis round trip per retry.
+    - When Redis is unreachable, it degrades to in-process windows, which only see this replica's share
+      of the requests.
+    """
+
+    def __init__(self, *, conf: Optional[Dict[str, Any]] = None):
+        conf = conf or {}
+        self.enabled = conf.get("enable", False)
+        self.user_class_metadata_key = conf.get("user_class_metadata_key", "x-user-class")
+        self._default_user_class = conf.get("default_user_class", "free")
+        self._tiers: Dict[str, Dict[str, Any]] = conf.get("tiers", {})
+        self._redis_retry_interval_secs = conf.get("redis_retry_interval_secs", 5)
+        self._redis_unavailable_until = 0.0
+        # (scope, subject) -> when it has room again
+        self._blocked = TTLLRUCache(capacity=conf.get("blocked_cache_capacity", 10000))
+        # (scope, subject) -> the monotonic times of its hits, for the local fallback
+        self._local_windows = TTLLRUCache(capacity=conf.get("local_cache_capacity", 10000))
+
+    async def acquire(self, *, uid: str, ext_thread_id: str, user_class: str = "", cost: int = 1):
+        """Counts one request of the user in the thread, raises RateLimitExceededException if over a limit."""
+        if not self.enabled:
+            return
+        tier = self._tiers.get(user_class) or self._tiers.get(self._default_user_class, {})
+        subjects: List[Tuple[str, str, int]] = []
+        # NOTE: The callers without a uid would all share one window, they are limited per thread only.
+        if uid not in _ANONYMOUS_UIDS and tier.get("max_requests_per_uid", 0) > 0:
+            subjects.append((SCOPE_UID, uid, tier["max_requests_per_uid"]))
+        if len(ext_thread_id) > 0 and tier.get("max_requests_per_thread", 0) > 0:
+            subjects.append((SCOPE_THREAD, ext_thread_id, tier["max_requests_per_thread"]))
+        if len(subjects) == 0:
+            return
+
+        now = time.monotonic()
+        for scope, subject, _ in subjects:
+            blocked_until = self._blocked.get((scope, subject))
+            if blocked_until is not None and blocked_until > now:
+                metrics.incr_counter("rate_limit.blocked_cache_hits")
+                self._reject(scope, blocked_until - now)
+
+        window_secs = tier.get("window_secs", 60)
+        index, wait_secs = await self._hit(subjects, window_secs=window_secs, cost=cost)
+        if index < 0:
+            metrics.incr_counter("rate_limit.allowed")
+            return
+        scope, subject, _ = subjects[index]
+        self._blocked.set((scope, subject), now + wait_secs, ttl=wait_secs)
+        loguru_logger.info(f"Rate limited {scope} {subject}, class: {user_class or self._default_user_class}, retry after {wait_secs:.1f}s.")
+        self._reject(scope, wait_secs)
+
+    async def _hit(self, subjects: List[Tuple[str, str, int]], *, window_secs: float, cost: int) -> Tuple[int, float]:
+        """Returns the index of the full window, -1 if the hit fits in all of them, and the seconds to wait."""
+        if self._redis_available():
+            result, done = await ext_redis.instance().hit_sliding_windows(
+                [gen_rate_limit_key(scope, subject) for scope, subject, _ in subjects],
+                [limit for _, _, limit in subjects],
+                window_ms=int(window_secs * 1000),
+                member=uuid.uuid4().hex,
+                cost=cost
+            )
+            if done:
+                allowed, index, wait_ms = result
+                return (-1, 0.0) if allowed else (index, wait_ms / 1000)
+            self._mark_redis_unavailable()
+
+        metrics.incr_counter("rate_limit.local_fallbacks")
+        return self._hit_locally(subjects, window_secs=window_secs, cost=cost)
+
+    def _hit_locally(self, subjects: List[Tuple[str, str, int]], *, window_secs: float, cost: int) -> Tuple[int, float]:
+        now = time.monotonic()
+        windows: List[Deque[float]] = []
+        for idx, (scope, subject, limit) in enumerate(subjects):
+            window = self._local_windows.get((scope, subject))
+            if window is None:
+                window = deque()
+                self._local_windows.set((scope, subject), window, ttl=window_secs)
+            while len(window) > 0 and window[0] <= now - window_secs:
+                window.popleft()
+            if len(window) + cost > limit:
+                return idx, (window[0] + window_secs - now) if len(window) > 0 else window_secs
+            windows.append(window)
+        for (scope, subject, _), window in zip(subjects, windows):
+            window.extend([now] * cost)
+            # NOTE: Refresh the TTL, so that an active subject never loses its window.
+            self._local_windows.set((scope, subject), window, ttl=window_secs)
+        return -1, 0.0
+
+    def _redis_available(self) -> bool:
+        return ext_redis.instance() is not None and self._redis_unavailable_until < time.monotonic()
+
+    def _mark_redis_unavailable(self):
+        loguru_logger.warning(f"Redis is unreachable, rate limit the users locally for {self._redis_retry_interval_secs}s.")
+        self._redis_unavailable_until = time.monotonic() + self._redis_retry_interval_secs
+
+    @staticmethod
+    def _reject(scope: str, retry_after_secs: float):
+        metrics.incr_counter(f"rate_limit.rejected.{scope}")
+        raise RateLimitExceededException(scope=scope, retry_after_secs=retry_after_secs)
@@ -0,0 +1,88 @@
+# -*- coding: utf-8 -*-
+import asyncio
+import time
+from collections import deque
+from typing import Any, Awaitable, Callable, Deque, Dict, Optional
+
+from internal.utils import metrics
+from internal.utils.retry_with_backoff import RetryBudget
+
+
+class HedgingPolicy:
+    """
+    Opt-in request hedging. When the first attempt hasn't returned by a percentile of the recent
+    latency, a second attempt is fired, the first answer wins and the loser is cancelled.
+
+    Hedges are drawn from a budget capped at a ratio of the requests, so that hedging can't double
+    the token spend.
+    """
+
+    def __init__(self, *, name: str = "hedging", conf: Optional[Dict[str, Any]] = None):
+        conf = conf or {}
+        self._name = name
+        self._enabled = conf.get("enable", False)
+        self._percentile = conf.get("percentile", 0.95)
+        self._min_samples = conf.get("min_samples", 32)
+        self._min_delay_secs = conf.get("min_delay_secs", 0.5)
+        self._latencies: Deque[float] = deque(maxlen=conf.get("window_size", 256))
+        self._budget = RetryBudget(
+            ratio=conf.get("max_hedge_ratio", 0.05),
+            min_retries_per_window=0,
+            window_secs=conf.get("budget_window_secs", 10)
+        )
+
+    @property
+    def enabled(self) -> bool:
+        return self._enabled
+
+    def hedge_delay(self) -> Optional[float]:
+        """Returns how long to wait for the first attempt before hedging, None means not enough samples yet."""
+        if len(self._latencies) < self._min_samples:
+            return None
+        latencies = sorted(self._latencies)
+        idx = min(len(latencies) - 1, int(len(latencies) * self._percentile))
+        return max(self._min_delay_secs, latencies[idx])
+
+    async def run(self, attempt_factory: Callable[[int], Awaitable[Any]]) -> Any:
+        """Runs attempt_factory(0), hedged with attempt_factory(1) if the first attempt is too slow."""
+        st = time.monotonic()
+        metrics.incr_counter(f"{self._name}.requests")
+        self._budget.record_request()
+        delay = self.hedge_delay() if self._enabled else None
+        if delay is not None:
+            metrics.set_gauge(f"{self._name}.delay_secs", delay)
+
+        primary = asyncio.ensure_future(attempt_factory(0))
+        attempts = [primary]
+        try:
+            if delay is not None:
+                done, _ = await asyncio.wait({primary}, timeout=delay)
+                if len(done) == 0:
+                    if self._budget.try_withdraw():
+                        metrics.incr_counter(f"{self._name}.fired")
+                        attempts.append(asyncio.ensure_future(attempt_factory(1)))
+                    else:
+                        metrics.incr_counter(f"{self._name}.budget_exhausted")
+
+            pending = set(attempts)
+            first_exc = None
+            while len(pending) > 0:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for attempt in done:
+                    if attempt.exception() is None:
+                        self._latencies.append(time.monotonic() - st)
+                        if attempt is not primary:
+                            metrics.incr_counter(f"{self._name}.wins")
+                        metrics.set_gauge(
+                            f"{self._name}.win_ratio",
+                            metrics.ratio(metrics.get_counter(f"{self._name}.wins"), metrics.get_counter(f"{self._name}.fired"))
+                        )
+                        return attempt.result()
+                    if first_exc is None or attempt is primary:
+                        first_exc = attempt.exception()
+            raise first_exc
+        finally:
+            # NOTE: Cancel the loser, or both attempts if the caller has gone away.
+            for attempt in attempts:
+                if not attempt.done():
+                    attempt.cancel()
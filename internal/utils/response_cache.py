@@ -0,0 +1,90 @@
+# -*- coding: utf-8 -*-
+import hashlib
+from typing import Any, Dict, Optional
+
+from loguru import logger as loguru_logger
+
+import internal.extensions.ext_redis as ext_redis
+from internal.extensions.ext_redis.keys import gen_response_cache_key
+from internal.utils import metrics
+from internal.utils.text_normalizer import DEFAULT_TEXT_NORMALIZER
+from internal.utils.ttl_lru_cache import TTLLRUCache
+
+MODE_GENERAL_QUESTION = "general_question"
+MODE_TRUTH_JUDGEMENT = "truth_judgement"
+
+
+class ResponseCache:
+    """
+    Two-tier LLM reply cache, a bounded in-process LRU in front of the shared Redis tier.
+    """
+
+    def __init__(self, *, conf: Optional[Dict[str, Any]] = None):
+        conf = conf or {}
+        self._enabled = conf.get("enable", False)
+        self._enable_redis_tier = conf.get("enable_redis_tier", True)
+        self._redis_read_timeout_secs = conf.get("redis_read_timeout_secs", 0.1)
+        self._bypass_when_temperature_positive = conf.get("bypass_when_temperature_positive", False)
+        self._ttl_secs = {
+            MODE_GENERAL_QUESTION: conf.get("general_question_ttl_secs", 3600),
+            MODE_TRUTH_JUDGEMENT: conf.get("truth_judgement_ttl_secs", 600),
+        }
+        self._local = TTLLRUCache(capacity=conf.get("lru_capacity", 4096))
+
+    @staticmethod
+    def normalize_message(message: str) -> str:
+        return DEFAULT_TEXT_NORMALIZER.normalize(message)
+
+    @classmethod
+    def make_key(cls, *, system_prompt: str, user_message: str, model: str, mode: str) -> str:
+        fingerprint = "\x1f".join([system_prompt, cls.normalize_message(user_message), model, mode])
+        return hashlib.sha256(fingerprint.encode()).hexdigest()
+
+    def should_bypass(self, temperature: float) -> bool:
+        if not self._enabled:
+            return True
+        if self._bypass_when_temperature_positive and temperature > 0:
+            metrics.incr_counter("response_cache.bypasses")
+            return True
+        return False
+
+    async def get(self, key: str, mode: str) -> Optional[str]:
+        value = self._local.get(key)
+        if value is not None:
+            metrics.incr_counter("response_cache.local_hits")
+            self._update_hit_ratio()
+            return value
+
+        redis_client = ext_redis.instance()
+        if self._enable_redis_tier and redis_client is not None:
+            # NOTE: A miss only costs an LLM call, which a slow Redis mustn't delay on top, never retry.
+            value, done = await redis_client.try_get_string(gen_response_cache_key(key), timeout=self._redis_read_timeout_secs)
+            if not done:
+                metrics.incr_counter("response_cache.redis_read_failures")
+            elif value is not None:
+                metrics.incr_counter("response_cache.redis_hits")
+                self._local.set(key, value, ttl=self._ttl_secs.get(mode, 0))
+                self._update_hit_ratio()
+                return value
+
+        metrics.incr_counter("response_cache.misses")
+        self._update_hit_ratio()
+        return None
+
+    async def set(self, key: str, mode: str, value: str):
+        ttl = self._ttl_secs.get(mode, 0)
+        self._local.set(key, value, ttl=ttl)
+        metrics.set_gauge("response_cache.local_size", len(self._local))
+
+        redis_client = ext_redis.instance()
+        if self._enable_redis_tier and redis_client is not None:
+            try:
+                await redis_client.cache_string(gen_response_cache_key(key), value, ttl=ttl)
+            except Exception as exc:
+                loguru_logger.warning(f"Failed to write response cache to Redis, err:{exc}.")
+
+    @staticmethod
+    def _update_hit_ratio():
+        hits = metrics.get_counter("response_cache.local_hits") + metrics.get_counter("response_cache.redis_hits")
+        total = hits + metrics.get_counter("response_cache.misses")
+        metrics.set_gauge("response_cache.hit_ratio", metrics.ratio(hits, total))
@@ -1,6 +1,11 @@
 # -*- coding: utf-8 -*-
 import asyncio
 import random
+import time
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Callable, Deque, List, Optional
 
 from loguru import logger as loguru_logger
 
@@ -81,3 +86,188 @@ def aretry_with_constant_backoff(
                     raise exc
         return wrapper
     return decorator
+
+
+class DeadlineExceededException(Exception):
+    pass
+
+
+class CallAbandonedException(Exception):
+    pass
+
+
+class RetryBudgetExhaustedException(Exception):
+    pass
+
+
+# Monotonic deadline of the current call, None means no deadline.
+_CALL_DEADLINE: ContextVar[Optional[float]] = ContextVar("call-deadline", default=None)
+# Tells whether the caller of the current call has gone away.
+_CALL_IS_ABANDONED: ContextVar[Optional[Callable[[], bool]]] = ContextVar("call-is-abandoned", default=None)
+# Seconds the current upstream call has spent waiting locally (queues, budgets, backoff), see measure_local_waits().
+_CALL_LOCAL_WAITS: ContextVar[Optional[List[float]]] = ContextVar("call-local-waits", default=None)
+
+
+@contextmanager
+def call_context(*, time_remaining: Optional[float] = None, is_abandoned: Optional[Callable[[], bool]] = None):
+    """Propagates the deadline and the liveness of the caller (e.g. a gRPC context) to the retries of the current call."""
+    deadline = time.monotonic() + time_remaining if time_remaining is not None else None
+    deadline_token = _CALL_DEADLINE.set(deadline)
+    is_abandoned_token = _CALL_IS_ABANDONED.set(is_abandoned)
+    try:
+        yield
+    finally:
+        _CALL_DEADLINE.reset(deadline_token)
+        _CALL_IS_ABANDONED.reset(is_abandoned_token)
+
+
+def get_call_time_remaining() -> Optional[float]:
+    """Returns the seconds left before the deadline of the current call, None means no deadline."""
+    deadline = _CALL_DEADLINE.get()
+    if deadline is None:
+        return None
+    return deadline - time.monotonic()
+
+
+def is_call_abandoned() -> bool:
+    is_abandoned = _CALL_IS_ABANDONED.get()
+    return is_abandoned is not None and is_abandoned()
+
+
+@contextmanager
+def measure_local_waits():
+    """Sums up the local waits (see record_local_wait) of the upstream call made in the body, yields their getter."""
+    waits = [0.0]
+    token = _CALL_LOCAL_WAITS.set(waits)
+    try:
+        yield lambda: waits[0]
+    finally:
+        _CALL_LOCAL_WAITS.reset(token)
+
+
+def record_local_wait(secs: float):
+    """Tells that the current upstream call spent secs waiting before or between its requests, not for the upstream."""
+    waits = _CALL_LOCAL_WAITS.get()
+    if waits is not None:
+        waits[0] += secs
+
+
+def get_retry_after(exc: Exception) -> Optional[float]:
+    """Returns the delay asked by the Retry-After (or retry-after-ms) header attached to the error, if any."""
+    headers = getattr(exc, "headers", None)
+    if not headers:
+        return None
+    try:
+        if "retry-after-ms" in headers:
+            return float(headers["retry-after-ms"]) / 1000
+        if "retry-after" in headers:
+            return float(headers["retry-after"])
+    except (TypeError, ValueError):
+        pass
+    return None
+
+
+class RetryBudget:
+    """
+    Process-wide retry budget, caps the retries at a ratio of the requests over a sliding window,
+    so that retries can't turn an upstream brownout into a retry storm.
+    """
+
+    def __init__(self, *, ratio: float = 0.1, min_retries_per_window: int = 10, window_secs: int = 10):
+        self._ratio = ratio
+        self._min_retries_per_window = min_retries_per_window
+        self._window_secs = window_secs
+        # [second, requests, retries] for each second in the window.
+        self._buckets: Deque[List[int]] = deque()
+
+    def configure(self, *, ratio: float, min_retries_per_window: int, window_secs: int):
+        self._ratio = ratio
+        self._min_retries_per_window = min_retries_per_window
+        self._window_secs = window_secs
+
+    def _current_bucket(self) -> List[int]:
+        now = int(time.monotonic())
+        while len(self._buckets) > 0 and self._buckets[0][0] <= now - self._window_secs:
+            self._buckets.popleft()
+        if len(self._buckets) == 0 or self._buckets[-1][0] != now:
+            self._buckets.append([now, 0, 0])
+        return self._buckets[-1]
+
+    def record_request(self):
+        self._current_bucket()[1] += 1
+
+    def try_withdraw(self) -> bool:
+        bucket = self._current_bucket()
+        requests = sum(b[1] for b in self._buckets)
+        retries = sum(b[2] for b in self._buckets)
+        if retries >= max(self._min_retries_per_window, self._ratio * requests):
+            return False
+        bucket[2] += 1
+        return True
+
+
+DEFAULT_RETRY_BUDGET = RetryBudget()
+
+
+def aretry_with_deadline_aware_backoff(
+    *,
+    initial_delay: float = 1,
+    exponential_base: float = 2,
+    jitter: bool = True,
+    max_retries: int = 3,
+    max_delay: float = 8,
+    errors: tuple = (Exception,),
+    retry_budget: Optional[RetryBudget] = DEFAULT_RETRY_BUDGET
+):
+    """
+    Retry a function with exponential backoff, which honors Retry-After, never sleeps past the deadline
+    of the current call (see call_context), gives up once the caller has gone away, and draws every
+    retry from the retry budget.
+    """
+    def decorator(func):
+        async def wrapper(*args, **kwargs):
+            # Initialize variables
+            num_retries = 0
+            delay = initial_delay
+            if retry_budget is not None:
+                retry_budget.record_request()
+            # Loop until a successful response or max_retries is hit or an exception is raised
+            while 1:
+                if is_call_abandoned():
+                    raise CallAbandonedException("The caller has gone away.")
+                time_remaining = get_call_time_remaining()
+                if time_remaining is not None and time_remaining <= 0:
+                    raise DeadlineExceededException("The deadline of the call has been exceeded.")
+                try:
+                    return await func(*args, **kwargs)
+                # Retry on specified errors
+                except errors as exc:
+                    loguru_logger.error(f"caught error: {exc}, num_retries: {num_retries}.")
+                    # Increment retries
+                    num_retries += 1
+                    # Check if max retries has been reached
+                    if num_retries > max_retries:
+                        raise Exception(
+                            f"Maximum number of retries ({max_retries}) exceeded."
+                        ) from exc
+                    # Increment the delay, the server knows better when to retry
+                    delay = min(max_delay, delay * exponential_base * (1 + jitter * random.random()))
+                    retry_after = get_retry_after(exc)
+                    sleep_delay = retry_after if retry_after is not None else delay
+                    # Don't sleep for an answer nobody will wait for
+                    time_remaining = get_call_time_remaining()
+                    if time_remaining is not None and sleep_delay >= time_remaining:
+                        raise DeadlineExceededException(
+                            f"The deadline of the call would be exceeded after sleeping for {sleep_delay} seconds."
+                        )
+                    if retry_budget is not None and not retry_budget.try_withdraw():
+                        raise RetryBudgetExhaustedException("The retry budget has been exhausted.")
+                    # Sleep for the delay
+                    loguru_logger.info(f"create (backoff): sleeping for {sleep_delay} seconds.")
+                    await asyncio.sleep(sleep_delay)
+                    record_local_wait(sleep_delay)
+                # Raise exceptions for any errors not specified
+                except Exception as exc:
+                    raise exc
+        return wrapper
+    return decorator
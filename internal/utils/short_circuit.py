@@ -0,0 +1,97 @@
+# -*- coding: utf-8 -*-
+import re
+from typing import Any, Dict, Optional
+
+from internal.utils import metrics
+from internal.utils.helper import (
+    is_text_all_punctuation,
+    remove_all_punctuations
+)
+from internal.utils.text_normalizer import DEFAULT_TEXT_NORMALIZER
+from internal.utils.ttl_lru_cache import TTLLRUCache
+
+RULE_EMPTY = "empty"
+RULE_PUNCTUATION_ONLY = "punctuation_only"
+RULE_EMOJI_ONLY = "emoji_only"
+RULE_EXACT_REPEAT = "exact_repeat"
+
+ACTION_REPLY = "reply"
+ACTION_REJECT = "reject"
+
+# NOTE: Pictographs, dingbats and flags, with the joiners, variation selectors and keycaps gluing them together.
+_EMOJI_ONLY_PATTERN = re.compile(
+    "[\U0001F000-\U0001FAFF\u2600-\u27BF\u2B00-\u2BFF\u2190-\u21FF\u3030\u303D\u3297\u3299"
+    "\u200D\uFE0E\uFE0F\u20E3\U000E0020-\U000E007F]+"
+)
+
+DEFAULT_RULES = {
+    RULE_EMPTY: {"enable": True, "action": ACTION_REJECT, "reply": "Empty question"},
+    RULE_PUNCTUATION_ONLY: {"enable": True, "action": ACTION_REPLY, "reply": "请用文字描述你的问题。"},
+    RULE_EMOJI_ONLY: {"enable": True, "action": ACTION_REPLY, "reply": "请用文字描述你的问题。"},
+    # NOTE: A repeat is answered with the reply to the last question, its reply option is unused.
+    RULE_EXACT_REPEAT: {"enable": True, "action": ACTION_REPLY, "reply": ""},
+}
+
+
+class ShortCircuitResult:
+    __slots__ = ("rule", "action", "reply")
+
+    def __init__(self, *, rule: str, action: str, reply: str):
+        self.rule = rule
+        self.action = action
+        self.reply = reply
+
+
+class ShortCircuit:
+    """
+    Pre-LLM rule engine, which answers (or rejects) the trivially answerable inputs locally: empty,
+    punctuation-only or emoji-only messages, and repeats of the last question of the conversation
+    (compared after normalization).
+
+    The rules are checked in order, with plain string scans only, and each hit is counted as
+    short_circuit.{rule}.hits.
+    """
+
+    def __init__(self, *, conf: Optional[Dict[str, Any]] = None):
+        conf = conf or {}
+        self.enabled = conf.get("enable", True)
+        rules_conf = conf.get("rules", {})
+        self._rules = {
+            name: {**default, **rules_conf.get(name, {})} for name, default in DEFAULT_RULES.items()
+        }
+        # conversation_id + mode -> (last question, its reply)
+        self._last_turns = TTLLRUCache(
+            capacity=conf.get("repeat_capacity", 10000),
+            default_ttl=conf.get("repeat_ttl_secs", 600)
+        )
+
+    def check(self, *, conversation_id: str, user_message: str, mode: str) -> Optional[ShortCircuitResult]:
+        """Returns how to answer the message locally, None means it has to go to the LLM."""
+        if not self.enabled:
+            return None
+
+        rule = None
+        if len(user_message) == 0:
+            rule = RULE_EMPTY
+        elif is_text_all_punctuation(user_message):
+            rule = RULE_PUNCTUATION_ONLY
+        elif _EMOJI_ONLY_PATTERN.fullmatch(remove_all_punctuations(user_message)) is not None:
+            rule = RULE_EMOJI_ONLY
+        if rule is not None and self._rules[rule]["enable"]:
+            return self._hit(rule)
+        if self._rules[RULE_EXACT_REPEAT]["enable"]:
+            last_turn = self._last_turns.get(f"{conversation_id}.{mode}")
+            # NOTE: "他是人吗" and "他是人吗？" are the same question.
+            if last_turn is not None and last_turn[0] == DEFAULT_TEXT_NORMALIZER.normalize(user_message):
+                return self._hit(RULE_EXACT_REPEAT, reply=last_turn[1])
+        return None
+
+    def remember(self, *, conversation_id: str, user_message: str, mode: str, reply: str):
+        """Keeps the answered question of the conversation, to catch its repeat."""
+        if self.enabled and self._rules[RULE_EXACT_REPEAT]["enable"] and len(reply) > 0:
+            self._last_turns.set(f"{conversation_id}.{mode}", (DEFAULT_TEXT_NORMALIZER.normalize(user_message), reply))
+
+    def _hit(self, rule: str, reply: Optional[str] = None) -> ShortCircuitResult:
+        rule_conf = self._rules[rule]
+        metrics.incr_counter(f"short_circuit.{rule}.hits")
+        return ShortCircuitResult(rule=rule, action=rule_conf["action"], reply=reply if reply is not None else rule_conf["reply"])
@@ -0,0 +1,63 @@
+# -*- coding: utf-8 -*-
+import asyncio
+from typing import Any, Awaitable, Callable, Dict
+
+from internal.utils import metrics
+
+
+class _Call:
+
+    def __init__(self, task: asyncio.Future):
+        self.task = task
+        self.waiters = 0
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent calls sharing the same key into one shared upstream call.
+
+    The upstream call runs in its own task, so cancelling one waiter does not affect
+    the others. The upstream task is only cancelled when its last waiter goes away.
+    """
+
+    def __init__(self, *, name: str = "single_flight"):
+        self._name = name
+        self._inflight: Dict[str, _Call] = {}
+
+    def __len__(self) -> int:
+        return len(self._inflight)
+
+    async def do(self, key: str, coro_factory: Callable[[], Awaitable[Any]]) -> Any:
+        call = self._inflight.get(key)
+        if call is None:
+            call = _Call(asyncio.ensure_future(coro_factory()))
+            self._inflight[key] = call
+            call.task.add_done_callback(lambda task: self._on_done(key, call))
+        else:
+            metrics.incr_counter(f"{self._name}.coalesced")
+        metrics.incr_counter(f"{self._name}.calls")
+        metrics.set_gauge(
+            f"{self._name}.coalescing_ratio",
+            metrics.ratio(metrics.get_counter(f"{self._name}.coalesced"), metrics.get_counter(f"{self._name}.calls"))
+        )
+
+        call.waiters += 1
+        try:
+            return await asyncio.shield(call.task)
+        except asyncio.CancelledError:
+            if call.waiters == 1 and not call.task.done():
+                # NOTE: Nobody else is waiting for the result, detach the call first so that
+                # a new caller won't join a task which is being cancelled.
+                if self._inflight.get(key) is call:
+                    del self._inflight[key]
+                call.task.cancel()
+            raise
+        finally:
+            call.waiters -= 1
+
+    def _on_done(self, key: str, call: _Call):
+        if self._inflight.get(key) is call:
+            del self._inflight[key]
+        # NOTE: Mark the exception as retrieved, the waiters (if any) have already got it.
+        if not call.task.cancelled():
+            call.task.exception()
@@ -0,0 +1,94 @@
+# -*- coding: utf-8 -*-
+import re
+from typing import Dict, Iterable, List, Optional, Pattern
+
+from internal.constants.hanzi import TRADITIONAL_TO_SIMPLIFIED_PAIRS
+from internal.utils.helper import PUNCTUATION_SET
+
+# NOTE: U+FF01..U+FF5E are the full-width forms of the printable ASCII characters, U+3000 is the ideographic space.
+FULLWIDTH_TO_HALFWIDTH = {chr(0x3000): " ", **{chr(code): chr(code - 0xFEE0) for code in range(0xFF01, 0xFF5F)}}
+TRADITIONAL_TO_SIMPLIFIED = {pair[0]: pair[1] for pair in TRADITIONAL_TO_SIMPLIFIED_PAIRS.split()}
+
+# Joins the texts of a batch, so that the whole batch goes through each regex at once.
+_BATCH_SEPARATOR = "\x00"
+
+
+def _compile_char_class(chars: Iterable[str], extra: str = "") -> Optional[Pattern]:
+    chars = "".join(sorted(chars))
+    if len(chars) == 0 and len(extra) == 0:
+        return None
+    return re.compile(f"[{re.escape(chars)}{extra}]+")
+
+
+class TextNormalizer:
+    """
+    Normalizes the player messages for cache keys, filters and dedup: full-width/half-width folding,
+    traditional/simplified folding, lowercasing, whitespace collapsing and punctuation removal.
+
+    Each step is one precompiled regex pass in C. The character folds only touch the (rare) characters
+    to fold, instead of looking every character up. Traditional/simplified folding is done by the builtin
+    character table only, never by an optional library such as OpenCC, so that every replica normalizes
+    alike (see DEFAULT_TEXT_NORMALIZER).
+    """
+
+    def __init__(
+        self,
+        *,
+        fold_width: bool = True,
+        fold_traditional: bool = True,
+        lowercase: bool = True,
+        collapse_whitespace: bool = True,
+        remove_punctuation: bool = False
+    ):
+        folds: Dict[str, str] = {}
+        if fold_width:
+            folds.update(FULLWIDTH_TO_HALFWIDTH)
+        if fold_traditional:
+            folds.update(TRADITIONAL_TO_SIMPLIFIED)
+        self._removal_pattern = None
+        if remove_punctuation:
+            # NOTE: The full-width punctuations are removed right away rather than folded first. Spaces are
+            # punctuation, so every whitespace goes as well.
+            removals = PUNCTUATION_SET | {char for char, folded in folds.items() if folded in PUNCTUATION_SET}
+            folds = {char: folded for char, folded in folds.items() if char not in removals}
+            self._removal_pattern = _compile_char_class(removals, extra=r"\s")
+        self._folds = folds
+        self._fold_pattern = _compile_char_class(folds)
+        self._lowercase = lowercase
+        self._collapse_whitespace = collapse_whitespace and not remove_punctuation
+
+    def normalize(self, text: str) -> str:
+        return self._normalize(text)
+
+    def normalize_batch(self, texts: List[str]) -> List[str]:
+        """Same as normalize over a list of texts, with the whole batch going through each step at once."""
+        if len(texts) == 0:
+            return []
+        joined = _BATCH_SEPARATOR.join(texts)
+        if joined.count(_BATCH_SEPARATOR) != len(texts) - 1:
+            # NOTE: A text holds the separator itself, it can't be split back.
+            return [self.normalize(text) for text in texts]
+        joined = self._normalize(joined, collapse_whitespace=False)
+        if not self._collapse_whitespace:
+            return joined.split(_BATCH_SEPARATOR)
+        return [" ".join(text.split()) for text in joined.split(_BATCH_SEPARATOR)]
+
+    def _normalize(self, text: str, collapse_whitespace: Optional[bool] = None) -> str:
+        if self._removal_pattern is not None:
+            text = self._removal_pattern.sub("", text)
+        if self._fold_pattern is not None:
+            text = self._fold_pattern.sub(self._fold, text)
+        if self._lowercase:
+            text = text.lower()
+        if collapse_whitespace is None:
+            collapse_whitespace = self._collapse_whitespace
+        if collapse_whitespace:
+            text = " ".join(text.split())
+        return text
+
+    def _fold(self, match: "re.Match") -> str:
+        return "".join(self._folds[char] for char in match.group())
+
+
+# NOTE: Cache keys are shared by every replica, the normalization must not be configurable per replica.
+DEFAULT_TEXT_NORMALIZER = TextNormalizer(remove_punctuation=True)
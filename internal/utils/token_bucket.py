@@ -0,0 +1,66 @@
+# -*- coding: utf-8 -*-
+import time
+from typing import Optional
+
+
+class TokenBucket:
+    """
+    In-process token bucket, refilled continuously at capacity / period_secs.
+
+    The bucket may go into debt (negative tokens) when the actual usage is reconciled
+    after the fact, the debt is paid back by the refill.
+    """
+
+    def __init__(self, *, capacity: float, period_secs: float = 60):
+        self._capacity = float(capacity)
+        self._rate = self._capacity / period_secs
+        self._tokens = self._capacity
+        self._updated_at = time.monotonic()
+
+    @property
+    def capacity(self) -> float:
+        return self._capacity
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self._capacity, self._tokens + (now - self._updated_at) * self._rate)
+        self._updated_at = now
+
+    def available(self) -> float:
+        self._refill()
+        return self._tokens
+
+    def headroom(self) -> float:
+        """Fraction of the capacity which is currently available."""
+        if self._capacity <= 0:
+            return 0.0
+        return max(0.0, self.available()) / self._capacity
+
+    def try_consume(self, n: float) -> bool:
+        self._refill()
+        if self._tokens < n:
+            return False
+        self._tokens -= n
+        return True
+
+    def consume(self, n: float):
+        self._refill()
+        self._tokens -= n
+
+    def seconds_until_available(self, n: float) -> float:
+        self._refill()
+        if self._tokens >= n or self._rate <= 0:
+            return 0.0
+        return (n - self._tokens) / self._rate
+
+    def reset(self, *, capacity: Optional[float] = None, remaining: Optional[float] = None, reset_in_secs: Optional[float] = None):
+        """Re-seeds the bucket, e.g. from the rate limit state reported by the upstream."""
+        self._refill()
+        if capacity is not None and capacity > 0:
+            self._rate = self._rate * capacity / self._capacity
+            self._capacity = float(capacity)
+        if remaining is not None:
+            self._tokens = min(self._capacity, float(remaining))
+            # NOTE: The upstream refills the bucket completely by the reset time.
+            if reset_in_secs is not None and reset_in_secs > 0 and self._tokens < self._capacity:
+                self._rate = (self._capacity - self._tokens) / reset_in_secs
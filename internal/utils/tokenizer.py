@@ -0,0 +1,204 @@
+# -*- coding: utf-8 -*-
+import asyncio
+import hashlib
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterable, List, Optional
+
+import tiktoken
+from loguru import logger as loguru_logger
+
+from internal.utils import metrics
+from internal.utils.ttl_lru_cache import TTLLRUCache
+
+
+class Tokenizer:
+    """
+    Token counting service, shared by the whole process.
+
+    Encoders are loaded once per model, and token counts are memoized by content hash, so that
+    the fixed system prompt of a puzzle is only tokenized once. Large inputs are tokenized on a
+    thread pool (tiktoken releases the GIL), to keep the event loop responsive.
+
+    When the encoder of a model can't be loaded (e.g. no BPE file in the cache and no network),
+    the counts fall back to an estimate of one token per character (no fewer than the common CJK
+    and ASCII characters take), and loading is retried every load_retry_interval_secs.
+    """
+
+    def __init__(
+        self,
+        *,
+        lru_capacity: int = 65536,
+        offload_threshold_chars: int = 2048,
+        max_workers: int = 2,
+        load_retry_interval_secs: float = 60
+    ):
+        self._encodings: Dict[str, tiktoken.Encoding] = {}
+        # model -> when to try loading its encoder again
+        self._load_failed_until: Dict[str, float] = {}
+        self._load_retry_interval_secs = load_retry_interval_secs
+        self._counts = TTLLRUCache(capacity=lru_capacity)
+        self._offload_threshold_chars = offload_threshold_chars
+        self._max_workers = max_workers
+        self._executor: Optional[ThreadPoolExecutor] = None
+
+    def configure(self, *, lru_capacity: int, offload_threshold_chars: int, max_workers: int):
+        self._counts = TTLLRUCache(capacity=lru_capacity)
+        self._offload_threshold_chars = offload_threshold_chars
+        if max_workers != self._max_workers and self._executor is not None:
+            self._executor.shutdown(wait=False)
+            self._executor = None
+        self._max_workers = max_workers
+
+    def get_encoding(self, model: str) -> tiktoken.Encoding:
+        encoding = self._encodings.get(model)
+        if encoding is None:
+            try:
+                encoding = tiktoken.encoding_for_model(model)
+            except KeyError:
+                loguru_logger.warning(f"Model {model} not found, using cl100k_base encoding.")
+                encoding = tiktoken.get_encoding("cl100k_base")
+            self._encodings[model] = encoding
+        return encoding
+
+    def preload(self, models: Iterable[str], *, cache_dir: Optional[str] = None) -> float:
+        """
+        Loads the encoders of the models at startup, from the baked BPE cache if any (see
+        scripts/bake_tiktoken_cache.py), and returns how long it took.
+        """
+        # NOTE: TIKTOKEN_CACHE_DIR set in the environment (e.g. by the image) wins over the config.
+        if cache_dir and "TIKTOKEN_CACHE_DIR" not in os.environ:
+            os.environ["TIKTOKEN_CACHE_DIR"] = cache_dir
+        cache_dir = os.environ.get("TIKTOKEN_CACHE_DIR")
+        if not cache_dir or not os.path.isdir(cache_dir):
+            loguru_logger.warning(f"tiktoken cache dir {cache_dir} doesn't exist, the BPE files will be downloaded.")
+
+        st = time.perf_counter()
+        for model in models:
+            model_st = time.perf_counter()
+            try:
+                encoding = self.get_encoding(model)
+            except Exception as exc:
+                loguru_logger.error(f"Failed to load tiktoken encoding for model {model}, err:{exc}.")
+                continue
+            loguru_logger.info(f"Loaded tiktoken encoding {encoding.name} for model {model} in {time.perf_counter() - model_st:.3f}s.")
+        elapsed = time.perf_counter() - st
+        metrics.set_gauge("tokenizer.preload_secs", elapsed)
+        return elapsed
+
+    def count(self, text: str, model: str = "gpt-3.5-turbo") -> int:
+        """Returns the number of tokens in text, tokenizing on the calling thread."""
+        key = self._make_key(text, model)
+        count = self._counts.get(key)
+        if count is not None:
+            metrics.incr_counter("tokenizer.cache_hits")
+            return count
+        metrics.incr_counter("tokenizer.cache_misses")
+        encoding = self._try_get_encoding(model)
+        if encoding is None:
+            return self._estimate_len(text)
+        count = self._encode_len(encoding, text)
+        self._counts.set(key, count)
+        return count
+
+    async def acount(self, text: str, model: str = "gpt-3.5-turbo") -> int:
+        """Same as count, but tokenizes large inputs on the thread pool."""
+        return (await self.acount_batch([text], model))[0]
+
+    async def acount_batch(self, texts: List[str], model: str = "gpt-3.5-turbo") -> List[int]:
+        """Returns the number of tokens of each text, the cache misses are tokenized in one go."""
+        counts: List[Optional[int]] = [None] * len(texts)
+        keys = [self._make_key(text, model) for text in texts]
+        misses = []
+        for idx, key in enumerate(keys):
+            counts[idx] = self._counts.get(key)
+            if counts[idx] is None:
+                misses.append(idx)
+        metrics.incr_counter("tokenizer.cache_hits", len(texts) - len(misses))
+        if len(misses) == 0:
+            return counts
+
+        metrics.incr_counter("tokenizer.cache_misses", len(misses))
+        encoding = self._try_get_encoding(model)
+        if encoding is None:
+            for idx in misses:
+                counts[idx] = self._estimate_len(texts[idx])
+            return counts
+        miss_texts = [texts[idx] for idx in misses]
+        if sum(len(text) for text in miss_texts) >= self._offload_threshold_chars:
+            metrics.incr_counter("tokenizer.offloaded")
+            miss_counts = await asyncio.get_running_loop().run_in_executor(
+                self._get_executor(),
+                self._encode_batch_len,
+                encoding,
+                miss_texts
+            )
+        else:
+            miss_counts = self._encode_batch_len(encoding, miss_texts)
+        for idx, count in zip(misses, miss_counts):
+            counts[idx] = count
+            self._counts.set(keys[idx], count)
+        return counts
+
+    def truncate(self, text: str, max_tokens: int, model: str = "gpt-3.5-turbo") -> str:
+        """Returns the longest prefix of text which takes at most max_tokens tokens."""
+        encoding = self._try_get_encoding(model)
+        if encoding is None:
+            # NOTE: By the estimate, a prefix of max_tokens characters takes max_tokens tokens.
+            return text[:max(0, max_tokens)]
+        tokens = encoding.encode(text, disallowed_special=())
+        if len(tokens) <= max_tokens:
+            return text
+        # NOTE: The cut may split a multi-byte character, drop the broken bytes.
+        return encoding.decode(tokens[:max(0, max_tokens)], errors="ignore")
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+            self._executor = None
+
+    def _try_get_encoding(self, model: str) -> Optional[tiktoken.Encoding]:
+        """Same as get_encoding, but returns None if the encoder can't be loaded, without retrying for a while."""
+        encoding = self._encodings.get(model)
+        if encoding is not None:
+            return encoding
+        if self._load_failed_until.get(model, 0.0) > time.monotonic():
+            return None
+        try:
+            return self.get_encoding(model)
+        except Exception as exc:
+            loguru_logger.error(
+                f"Failed to load tiktoken encoding for model {model}, estimate the tokens for "
+                f"{self._load_retry_interval_secs}s, err:{exc}."
+            )
+            metrics.incr_counter("tokenizer.load_failures")
+            self._load_failed_until[model] = time.monotonic() + self._load_retry_interval_secs
+            return None
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self._max_workers, thread_name_prefix="tokenizer")
+        return self._executor
+
+    @staticmethod
+    def _make_key(text: str, model: str):
+        return model, hashlib.blake2b(text.encode(), digest_size=16).digest()
+
+    @staticmethod
+    def _estimate_len(text: str) -> int:
+        # NOTE: A CJK character never takes more than one token in cl100k_base, neither does an ASCII one.
+        metrics.incr_counter("tokenizer.estimated")
+        return len(text)
+
+    @staticmethod
+    def _encode_len(encoding: tiktoken.Encoding, text: str) -> int:
+        # NOTE: User input may contain special tokens like <|endoftext|>, count them as plain text.
+        return len(encoding.encode(text, disallowed_special=()))
+
+    @classmethod
+    def _encode_batch_len(cls, encoding: tiktoken.Encoding, texts: List[str]) -> List[int]:
+        return [cls._encode_len(encoding, text) for text in texts]
+
+
+DEFAULT_TOKENIZER = Tokenizer()
@@ -0,0 +1,50 @@
+# -*- coding: utf-8 -*-
+import time
+from collections import OrderedDict
+from typing import Any, Hashable, Optional, Tuple
+
+
+class TTLLRUCache:
+    """
+    Bounded in-process LRU cache, each entry expires after its own TTL.
+    """
+
+    def __init__(self, *, capacity: int, default_ttl: float = 0):
+        self._capacity = capacity
+        # NOTE: ttl <= 0 means the entry never expires, it can only be evicted.
+        self._default_ttl = default_ttl
+        self._data: "OrderedDict[Hashable, Tuple[Any, float]]" = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        item = self._data.get(key)
+        if item is None:
+            return default
+        value, expire_at = item
+        if expire_at > 0 and expire_at < time.monotonic():
+            del self._data[key]
+            return default
+        self._data.move_to_end(key)
+        return value
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None):
+        if self._capacity <= 0:
+            return
+        if ttl is None:
+            ttl = self._default_ttl
+        expire_at = time.monotonic() + ttl if ttl > 0 else 0
+        self._data[key] = (value, expire_at)
+        self._data.move_to_end(key)
+        while len(self._data) > self._capacity:
+            self._data.popitem(last=False)
+
+    def pop(self, key: Hashable, default: Any = None) -> Any:
+        item = self._data.pop(key, None)
+        if item is None:
+            return default
+        return item[0]
+
+    def clear(self):
+        self._data.clear()
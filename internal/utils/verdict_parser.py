@@ -0,0 +1,201 @@
+# -*- coding: utf-8 -*-
+import re
+from typing import Optional, Tuple
+
+import ujson as json
+
+from internal.utils.helper import remove_all_punctuations
+
+VERDICT_YES = "是"
+VERDICT_NO = "不是"
+VERDICT_IRRELEVANT = "无关"
+VERDICT_PARTIALLY = "是又不是"
+# NOTE: Longest first, so that "是又不是" won't be taken as "是".
+ALL_VERDICTS = (VERDICT_PARTIALLY, VERDICT_NO, VERDICT_IRRELEVANT, VERDICT_YES)
+
+KEY_CLUE_HINT = "这个问题很关键"
+# The words which may come in between the verdict and the key clue hint, e.g. "的但".
+_KEY_CLUE_LEAD_IN_CHARS = 4
+
+TRUTH_VERDICT_SOLVED = "猜测成功"
+TRUTH_VERDICT_CLOSE = "很接近了"
+TRUTH_VERDICT_WRONG = "猜得不对"
+ALL_TRUTH_VERDICTS = (TRUTH_VERDICT_SOLVED, TRUTH_VERDICT_CLOSE, TRUTH_VERDICT_WRONG)
+
+# NOTE: Tolerates single or curly quotes, a full-width colon, an unquoted key and a value cut off by
+# max_tokens. Only the quote matching the opening one ends the value, e.g. "但“向日葵”还没猜到" or
+# "He's close", and the closing quote is only captured once the value is complete.
+_RESULT_PATTERN = re.compile(
+    r"""["']?result["']?\s*[:：]\s*"""
+    r"""(?:"((?:[^"\\]|\\.)*)(")?|'((?:[^'\\]|\\.)*)(')?|“((?:[^”\\]|\\.)*)(”)?)"""
+)
+_CODE_FENCE_PATTERN = re.compile(r"^\s*```(?:json|JSON)?\s*|\s*```\s*$")
+
+
+class IncrementalVerdictParser:
+    """
+    Parses a streamed verdict reply (是 / 不是 / 无关 / 是又不是, optionally followed by
+    "这个问题很关键") delta by delta, and tells as soon as the verdict is unambiguous.
+    """
+
+    def __init__(self):
+        self._raw = ""
+        self.verdict: Optional[str] = None
+        self.is_key_clue = False
+        # The verdict is settled, the rest of the completion is not needed any more.
+        self.settled = False
+        # The reply is not a verdict at all (e.g. "你需要自己进行猜测"), it has to be read to the end.
+        self.is_not_verdict = False
+        self.num_deltas = 0
+
+    @property
+    def raw_reply(self) -> str:
+        return self._raw
+
+    def feed(self, delta: str) -> bool:
+        """Feeds a delta, returns True once the verdict is settled."""
+        self._raw += delta
+        self.num_deltas += 1
+        if not self.settled and not self.is_not_verdict:
+            self._evaluate()
+        return self.settled
+
+    def finish(self):
+        """Settles the verdict at the end of the reply, when no more deltas can make it ambiguous."""
+        if self.settled or self.is_not_verdict:
+            return
+        text = remove_all_punctuations(self._raw)
+        for candidate in ALL_VERDICTS:
+            if text.startswith(candidate):
+                self.verdict = candidate
+                self.is_key_clue = KEY_CLUE_HINT in text[len(candidate):]
+                self.settled = True
+                return
+
+    def reply(self) -> str:
+        """Returns the canonical reply if the verdict was settled early, otherwise the raw reply."""
+        if not self.settled:
+            return self._raw
+        if self.is_key_clue:
+            return f"{self.verdict}，{KEY_CLUE_HINT}。"
+        return f"{self.verdict}。"
+
+    def _evaluate(self):
+        text = remove_all_punctuations(self._raw)
+        if len(text) == 0:
+            return
+
+        verdict = None
+        for candidate in ALL_VERDICTS:
+            if text.startswith(candidate):
+                verdict = candidate
+                break
+        if verdict is None:
+            if not any(candidate.startswith(text) for candidate in ALL_VERDICTS):
+                self.is_not_verdict = True
+            return
+        rest = text[len(verdict):]
+        # "是" is ambiguous until we know it is not the beginning of "是又不是".
+        if verdict == VERDICT_YES and VERDICT_PARTIALLY.startswith(text):
+            return
+        if KEY_CLUE_HINT in rest:
+            self.verdict = verdict
+            self.is_key_clue = True
+            self.settled = True
+            return
+        # NOTE: The key clue hint may follow a few words after the verdict (是的，这个问题很关键 / 不是，但这个
+        # 问题很关键), so the rest must have gone on for a while, and must not end with the beginning of the hint.
+        if len(rest) < len(KEY_CLUE_HINT) + _KEY_CLUE_LEAD_IN_CHARS:
+            return
+        if any(rest.endswith(KEY_CLUE_HINT[:size]) for size in range(1, len(KEY_CLUE_HINT))):
+            return
+        self.verdict = verdict
+        self.settled = True
+
+
+class IncrementalJudgementParser:
+    """
+    Parses a streamed truth judgement ({"result": "...", "reason": "..."}) delta by delta, and tells as
+    soon as the result is complete, since the reason is never returned.
+
+    The result is salvaged from malformed or truncated output (code fences, single quotes, a missing
+    brace, a value cut off by max_tokens, or even a bare verdict) rather than failing the whole call.
+    """
+
+    def __init__(self):
+        self._raw = ""
+        self._result: Optional[str] = None
+        # The result is complete, the rest of the completion is not needed any more.
+        self.settled = False
+        # The result was recovered from output which is neither complete nor valid JSON.
+        self.salvaged = False
+        self.num_deltas = 0
+
+    @property
+    def raw_reply(self) -> str:
+        return self._raw
+
+    def feed(self, delta: str) -> bool:
+        """Feeds a delta, returns True once the result is complete."""
+        self._raw += delta
+        self.num_deltas += 1
+        if not self.settled:
+            value, complete = _search_result(self._raw)
+            if complete:
+                self._result = value
+                self.settled = True
+        return self.settled
+
+    def result(self) -> Optional[str]:
+        """Returns the result of the judgement, None if nothing can be salvaged."""
+        # NOTE: A complete and valid reply is always taken as JSON, the pattern only salvages the others.
+        try:
+            obj = json.loads(_CODE_FENCE_PATTERN.sub("", self._raw))
+            if isinstance(obj, dict) and isinstance(obj.get("result"), str):
+                return obj["result"]
+        except ValueError:
+            pass
+        if self.settled:
+            return self._result
+        self.salvaged = True
+        value, _ = _search_result(self._raw)
+        if value is not None and len(value.strip()) > 0:
+            return value
+        for verdict in ALL_TRUTH_VERDICTS:
+            if verdict in self._raw:
+                return verdict
+        return None
+
+
+def _search_result(raw: str) -> Tuple[Optional[str], bool]:
+    """Returns the (possibly partial) result value found in raw, and whether it is complete."""
+    match = _RESULT_PATTERN.search(raw)
+    if match is None:
+        return None, False
+    for idx in (1, 3, 5):
+        if match.group(idx) is not None:
+            return _unescape(match.group(idx)), match.group(idx + 1) is not None
+    return None, False
+
+
+def _unescape(value: str) -> str:
+    try:
+        return json.loads(f'"{value}"')
+    except ValueError:
+        return value
+
+
+def parse_verdict(reply: str) -> Tuple[Optional[str], bool]:
+    """Returns the verdict of a general question reply and whether it touches a key clue."""
+    parser = IncrementalVerdictParser()
+    parser.feed(reply)
+    parser.finish()
+    return parser.verdict, parser.is_key_clue
+
+
+def parse_truth_verdict(result: str) -> Optional[str]:
+    """Returns the verdict of a truth judgement result, e.g. "很接近了，但还有一些细节没有推断出来。"."""
+    for verdict in ALL_TRUTH_VERDICTS:
+        if verdict in result:
+            return verdict
+    return None
@@ -0,0 +1,291 @@
+# -*- coding: utf-8 -*-
+import asyncio
+import os
+import select
+import signal
+import time
+from typing import Any, Dict, List, Optional
+
+from loguru import logger as loguru_logger
+
+# Messages a worker sends to the supervisor through its pipe.
+_MSG_READY = b"R"
+_MSG_HEARTBEAT = b"H"
+
+
+class WorkerHeartbeat:
+    """
+    Worker side of the supervisor pipe: tells the supervisor once the worker is serving, and then keeps
+    telling it that the event loop is alive. A worker whose loop is blocked stops beating and gets
+    replaced.
+    """
+
+    def __init__(self, *, worker_id: int, fd: int, interval_secs: float):
+        self.worker_id = worker_id
+        self._fd = fd
+        self._interval_secs = interval_secs
+        # NOTE: Never block the event loop on a supervisor which doesn't read.
+        os.set_blocking(fd, False)
+
+    def ready(self):
+        self._write(_MSG_READY)
+
+    async def run(self):
+        while 1:
+            self._write(_MSG_HEARTBEAT)
+            await asyncio.sleep(self._interval_secs)
+
+    def _write(self, msg: bytes):
+        try:
+            os.write(self._fd, msg)
+        except OSError:
+            # NOTE: The pipe is full or the supervisor is gone, neither is the worker's business.
+            pass
+
+
+class _Worker:
+    __slots__ = ("worker_id", "pid", "fd", "started_at", "ready_at", "last_heartbeat", "retiring", "killed")
+
+    def __init__(self, *, worker_id: int, pid: int, fd: int):
+        self.worker_id = worker_id
+        self.pid = pid
+        self.fd = fd
+        self.started_at = time.monotonic()
+        self.ready_at: Optional[float] = None
+        self.last_heartbeat = self.started_at
+        # Replaced by a newer worker in a rolling restart, or shutting down with the supervisor.
+        self.retiring = False
+        self.killed = False
+
+
+class WorkerSupervisor:
+    """
+    Supervisor of N worker processes, each serving on the same port with SO_REUSEPORT so that the kernel
+    spreads the connections over them. A worker is forked and exec'ed afresh from argv (plus --worker-id
+    and --heartbeat-fd), so that it loads the current code and config rather than the supervisor's.
+
+    - Health: a worker has to become ready within startup_timeout_secs, and to beat at least every
+      heartbeat_timeout_secs afterwards, or it is killed and respawned.
+    - Crashes: an exited worker is respawned, with an exponential backoff if it keeps crashing right
+      after starting.
+    - SIGHUP: rolling restart, one worker at a time, the replacement is ready before the old worker is
+      stopped, so that the capacity never drops by more than one worker. It deploys new code and service
+      config, but the supervisor itself keeps its own (e.g. the workers section) until restarted.
+    - SIGTERM / SIGINT: every worker is stopped gracefully with SIGTERM (each runs its own cleanup
+      coroutines), and killed after shutdown_grace_secs.
+    """
+
+    def __init__(self, *, conf: Optional[Dict[str, Any]] = None, num_workers: int, argv: List[str]):
+        conf = conf or {}
+        self._num_workers = num_workers
+        self._argv = argv
+        self._heartbeat_interval_secs = conf.get("heartbeat_interval_secs", 1)
+        self._heartbeat_timeout_secs = conf.get("heartbeat_timeout_secs", 15)
+        self._startup_timeout_secs = conf.get("startup_timeout_secs", 60)
+        self._shutdown_grace_secs = conf.get("shutdown_grace_secs", 15)
+        self._min_uptime_secs = conf.get("min_uptime_secs", 5)
+        self._max_restart_backoff_secs = conf.get("max_restart_backoff_secs", 30)
+        self._workers: Dict[int, _Worker] = {}
+        # worker_id -> when to respawn it
+        self._pending_spawns: Dict[int, float] = {}
+        # worker_id -> the last respawn backoff
+        self._backoffs: Dict[int, float] = {}
+        self._rolling_queue: List[int] = []
+        self._stopping = False
+        self._restart_requested = False
+
+    def run(self) -> int:
+        """Runs the workers until SIGTERM / SIGINT, returns the exit code of the supervisor."""
+        signal.signal(signal.SIGTERM, self._on_stop_signal)
+        signal.signal(signal.SIGINT, self._on_stop_signal)
+        signal.signal(signal.SIGHUP, self._on_restart_signal)
+        loguru_logger.info(f"Starting {self._num_workers} workers, supervisor pid {os.getpid()}.")
+        for worker_id in range(self._num_workers):
+            self._spawn(worker_id)
+
+        while not self._stopping:
+            self._read_heartbeats(timeout=min(0.5, self._heartbeat_interval_secs))
+            self._reap()
+            self._check_health()
+            self._respawn_pending()
+            if self._restart_requested:
+                self._restart_requested = False
+                self._start_rolling_restart()
+            self._advance_rolling_restart()
+
+        self._shutdown()
+        return 0
+
+    def _on_stop_signal(self, signum, frame):
+        self._stopping = True
+
+    def _on_restart_signal(self, signum, frame):
+        self._restart_requested = True
+
+    def _spawn(self, worker_id: int):
+        rfd, wfd = os.pipe()
+        pid = os.fork()
+        if pid == 0:
+            code = 1
+            try:
+                os.close(rfd)
+                for worker in self._workers.values():
+                    os.close(worker.fd)
+                # NOTE: Ctrl+C reaches the whole process group, the workers are stopped by the supervisor instead.
+                # An ignored signal stays ignored across exec, the handled ones are reset to their defaults.
+                signal.signal(signal.SIGINT, signal.SIG_IGN)
+                os.set_inheritable(wfd, True)
+                os.execv(self._argv[0], self._argv + ["--worker-id", str(worker_id), "--heartbeat-fd", str(wfd)])
+            except BaseException:
+                loguru_logger.exception(f"Failed to exec worker {worker_id}.")
+            finally:
+                # NOTE: Never return into the supervisor loop from a forked child.
+                os._exit(code)
+        os.close(wfd)
+        os.set_blocking(rfd, False)
+        self._workers[pid] = _Worker(worker_id=worker_id, pid=pid, fd=rfd)
+        loguru_logger.info(f"Spawned worker {worker_id}, pid {pid}.")
+
+    def _read_heartbeats(self, timeout: float):
+        fds = {worker.fd: worker for worker in self._workers.values()}
+        if len(fds) == 0:
+            time.sleep(timeout)
+            return
+        try:
+            readable, _, _ = select.select(list(fds), [], [], timeout)
+        except InterruptedError:
+            return
+        now = time.monotonic()
+        for fd in readable:
+            worker = fds[fd]
+            try:
+                data = os.read(fd, 4096)
+            except BlockingIOError:
+                continue
+            except OSError:
+                data = b""
+            if len(data) == 0:
+                # NOTE: EOF, the worker is exiting, it is reaped by _reap.
+                continue
+            worker.last_heartbeat = now
+            if worker.ready_at is None and _MSG_READY in data:
+                worker.ready_at = now
+                loguru_logger.info(f"Worker {worker.worker_id} (pid {worker.pid}) is ready in {now - worker.started_at:.3f}s.")
+
+    def _reap(self):
+        while 1:
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                return
+            if pid == 0:
+                return
+            worker = self._workers.pop(pid, None)
+            if worker is None:
+                continue
+            os.close(worker.fd)
+            code = os.waitstatus_to_exitcode(status) if hasattr(os, "waitstatus_to_exitcode") else status
+            if worker.retiring:
+                loguru_logger.info(f"Worker {worker.worker_id} (pid {pid}) retired, exit code {code}.")
+                continue
+            loguru_logger.error(f"Worker {worker.worker_id} (pid {pid}) died unexpectedly, exit code {code}.")
+            # NOTE: Its replacement of a rolling restart may be starting already.
+            if not any(other.worker_id == worker.worker_id for other in self._workers.values()):
+                self._schedule_respawn(worker)
+
+    def _schedule_respawn(self, worker: _Worker):
+        # NOTE: A worker which dies right after starting would otherwise be respawned in a tight loop.
+        backoff = 0.0
+        if time.monotonic() - worker.started_at < self._min_uptime_secs:
+            backoff = min(self._max_restart_backoff_secs, max(1.0, self._backoffs.get(worker.worker_id, 0.0) * 2))
+        self._backoffs[worker.worker_id] = backoff
+        self._pending_spawns[worker.worker_id] = time.monotonic() + backoff
+        if backoff > 0:
+            loguru_logger.warning(f"Worker {worker.worker_id} is crash looping, respawn it in {backoff:.1f}s.")
+
+    def _respawn_pending(self):
+        now = time.monotonic()
+        for worker_id, spawn_at in list(self._pending_spawns.items()):
+            if now >= spawn_at:
+                del self._pending_spawns[worker_id]
+                self._spawn(worker_id)
+
+    def _check_health(self):
+        now = time.monotonic()
+        for worker in list(self._workers.values()):
+            if worker.killed or worker.retiring:
+                continue
+            if worker.ready_at is None:
+                if now - worker.started_at > self._startup_timeout_secs:
+                    loguru_logger.error(f"Worker {worker.worker_id} (pid {worker.pid}) didn't start in {self._startup_timeout_secs}s, kill it.")
+                    self._kill(worker)
+            elif now - worker.last_heartbeat > self._heartbeat_timeout_secs:
+                loguru_logger.error(
+                    f"Worker {worker.worker_id} (pid {worker.pid}) missed heartbeats for "
+                    f"{now - worker.last_heartbeat:.1f}s, kill it."
+                )
+                self._kill(worker)
+
+    def _kill(self, worker: _Worker):
+        worker.killed = True
+        try:
+            os.kill(worker.pid, signal.SIGKILL)
+        except ProcessLookupError:
+            pass
+
+    def _start_rolling_restart(self):
+        if len(self._rolling_queue) > 0:
+            loguru_logger.warning("A rolling restart is in progress, ignored SIGHUP.")
+            return
+        self._rolling_queue = sorted(
+            worker.pid for worker in self._workers.values() if not worker.retiring and not worker.killed
+        )
+        loguru_logger.info(f"Starting a rolling restart of {len(self._rolling_queue)} workers.")
+
+    def _advance_rolling_restart(self):
+        while len(self._rolling_queue) > 0:
+            old = self._workers.get(self._rolling_queue[0])
+            if old is None or old.killed:
+                # NOTE: Died meanwhile, it is respawned like any crash.
+                self._rolling_queue.pop(0)
+                continue
+            if old.retiring:
+                # NOTE: Wait for the old worker to exit before replacing the next one.
+                return
+            replacements = [
+                worker for worker in self._workers.values()
+                if worker.worker_id == old.worker_id and worker.pid != old.pid and not worker.killed
+            ]
+            if len(replacements) == 0:
+                self._spawn(old.worker_id)
+                return
+            if replacements[0].ready_at is None:
+                return
+            old.retiring = True
+            self._rolling_queue.pop(0)
+            loguru_logger.info(f"Worker {old.worker_id} replaced by pid {replacements[0].pid}, stopping pid {old.pid}.")
+            os.kill(old.pid, signal.SIGTERM)
+            if len(self._rolling_queue) == 0:
+                loguru_logger.info("Rolling restart completed.")
+            return
+
+    def _shutdown(self):
+        loguru_logger.warning(f"Stopping {len(self._workers)} workers...")
+        for worker in self._workers.values():
+            worker.retiring = True
+            try:
+                os.kill(worker.pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+        deadline = time.monotonic() + self._shutdown_grace_secs
+        while len(self._workers) > 0 and time.monotonic() < deadline:
+            self._reap()
+            time.sleep(0.05)
+        for worker in self._workers.values():
+            loguru_logger.error(f"Worker {worker.worker_id} (pid {worker.pid}) didn't stop in {self._shutdown_grace_secs}s, kill it.")
+            self._kill(worker)
+        deadline = time.monotonic() + 5
+        while len(self._workers) > 0 and time.monotonic() < deadline:
+            self._reap()
+            time.sleep(0.05)
+        loguru_logger.info("All workers stopped.")
@@ -0,0 +1,39 @@
+# -*- coding: utf-8 -*-
+"""
+Downloads the tiktoken BPE files into a local cache directory, so that the service never has to fetch
+them at runtime (see TIKTOKEN_CACHE_DIR in devops/docker/Dockerfile).
+
+Usage:
+    python scripts/bake_tiktoken_cache.py --cache-dir ./tiktoken_cache --models gpt-3.5-turbo gpt-3.5-turbo-instruct
+"""
+import argparse
+import os
+import time
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Bake the tiktoken BPE files into a local cache directory.")
+    parser.add_argument("--cache-dir", type=str, required=True, help="Directory to store the BPE files in.")
+    parser.add_argument(
+        "--models",
+        type=str,
+        nargs="+",
+        default=["gpt-3.5-turbo", "gpt-3.5-turbo-instruct", "gpt-4"],
+        help="Models whose encodings are baked.",
+    )
+    parser.add_argument("--encodings", type=str, nargs="*", default=["cl100k_base"], help="Extra encodings to bake.")
+    args = parser.parse_args()
+
+    os.makedirs(args.cache_dir, exist_ok=True)
+    # NOTE: Must be set before tiktoken loads anything, it is read on every load.
+    os.environ["TIKTOKEN_CACHE_DIR"] = os.path.abspath(args.cache_dir)
+
+    import tiktoken
+
+    encoding_names = set(args.encodings)
+    for model in args.models:
+        encoding_names.add(tiktoken.encoding_name_for_model(model))
+    for name in sorted(encoding_names):
+        st = time.time()
+        encoding = tiktoken.get_encoding(name)
+        print(f"Baked {name} ({encoding.n_vocab} tokens) in {time.time() - st:.3f}s.")
+    print(f"tiktoken cache: {os.environ['TIKTOKEN_CACHE_DIR']}")
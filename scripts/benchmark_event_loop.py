@@ -0,0 +1,166 @@
+# -*- coding: utf-8 -*-
+"""
+End-to-end benchmark of the event loop and GC knobs: runs server.py once per variant against the local
+LLM stub (scripts/llm_engine_stub_server.py), loads it with concurrent GenerateDialogue RPCs, and
+reports the throughput and latency of each variant against the baseline.
+
+Usage:
+    python scripts/benchmark_event_loop.py --conf ./etc/turtle-soup-game-service-dev.json --concurrency 64 --duration-secs 10
+"""
+import argparse
+import asyncio
+import copy
+import json
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Any, Dict, List
+
+ROOT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, ROOT_DIR)
+sys.path.insert(0, os.path.join(ROOT_DIR, "internal", "proto_gens"))
+
+import grpc
+
+from internal.proto_gens import (
+    turtle_soup_game_service_pb2,
+    turtle_soup_game_service_pb2_grpc
+)
+
+# Each variant changes one knob of the baseline, plus all of them together.
+VARIANTS = {
+    "baseline (asyncio)": {"event_loop": {"backend": "asyncio"}, "gc": {"freeze_after_startup": False}},
+    "uvloop": {"event_loop": {"backend": "uvloop"}},
+    "default executor 32": {"event_loop": {"default_executor_workers": 32}},
+    "debug + slow callbacks": {"event_loop": {"debug": True, "slow_callback_duration_secs": 0.1}},
+    "gc threshold 50000/20/20": {"gc": {"threshold": [50000, 20, 20]}},
+    "gc freeze": {"gc": {"freeze_after_startup": True}},
+    "all": {
+        "event_loop": {"backend": "uvloop", "default_executor_workers": 32},
+        "gc": {"threshold": [50000, 20, 20], "freeze_after_startup": True},
+    },
+}
+
+
+def wait_for_port(port: int, timeout_secs: float = 30):
+    deadline = time.monotonic() + timeout_secs
+    while time.monotonic() < deadline:
+        with socket.socket() as sock:
+            if sock.connect_ex(("127.0.0.1", port)) == 0:
+                return
+        time.sleep(0.1)
+    raise TimeoutError(f"Port {port} is not up in {timeout_secs}s.")
+
+
+def make_conf(base: Dict[str, Any], variant: Dict[str, Any], args: argparse.Namespace) -> Dict[str, Any]:
+    conf = copy.deepcopy(base)
+    conf["service_port"] = args.port
+    conf["log_level"] = "warning"
+    conf["openai"]["api_base"] = f"http://127.0.0.1:{args.stub_port}/v1"
+    # NOTE: Every RPC has to reach the (stub) upstream, nothing may answer it locally.
+    for section in ("response_cache", "question_index", "model_cascade", "short_circuit"):
+        conf.setdefault(section, {})["enable"] = False
+    conf.setdefault("redis", {})["enable"] = False
+    conf["event_loop"] = {"backend": "asyncio", "default_executor_workers": 0, "debug": False}
+    conf["gc"] = {"freeze_after_startup": False}
+    for section, overrides in VARIANTS["baseline (asyncio)"].items():
+        conf[section].update(overrides)
+    for section, overrides in variant.items():
+        conf[section].update(overrides)
+    return conf
+
+
+async def load(port: int, concurrency: int, duration_secs: float) -> List[float]:
+    latencies: List[float] = []
+    errors = 0
+    deadline = time.monotonic() + duration_secs
+
+    async def client(idx: int):
+        nonlocal errors
+        async with grpc.aio.insecure_channel(f"127.0.0.1:{port}") as channel:
+            stub = turtle_soup_game_service_pb2_grpc.TurtleSoupGameServiceStub(channel)
+            seq = 0
+            while time.monotonic() < deadline:
+                seq += 1
+                request = turtle_soup_game_service_pb2.GenerateDialogueRequest(
+                    conversation_id=f"bench-{idx}-{seq}",
+                    conversation_system_prompt="你正在扮演一个推理解谜游戏“海龟汤”的主持人。",
+                    to_reply_for_general_question=True,
+                    chat=f"他是不是在第{seq}天死的？"
+                )
+                st = time.perf_counter()
+                resp = await stub.GenerateDialogue(request, metadata=(("x-uid", f"bench-{idx}"),))
+                if resp.ret.code == 0:
+                    latencies.append(time.perf_counter() - st)
+                else:
+                    errors += 1
+
+    await asyncio.gather(*[client(idx) for idx in range(concurrency)])
+    if errors > 0:
+        print(f"  {errors} RPCs failed")
+    return latencies
+
+
+def percentile(values: List[float], pct: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * pct))] if len(values) > 0 else 0.0
+
+
+def run_variant(name: str, base: Dict[str, Any], args: argparse.Namespace) -> float:
+    conf = make_conf(base, VARIANTS[name], args)
+    with tempfile.NamedTemporaryFile("w", suffix=".json", delete=False) as fw:
+        json.dump(conf, fw)
+    server = subprocess.Popen(
+        [sys.executable, os.path.join(ROOT_DIR, "server.py"), f"--conf={fw.name}", f"--workers={args.workers}"],
+        cwd=ROOT_DIR
+    )
+    try:
+        wait_for_port(args.port)
+        # NOTE: Warm up the connections and the caches of the server.
+        asyncio.run(load(args.port, args.concurrency, 1))
+        latencies = asyncio.run(load(args.port, args.concurrency, args.duration_secs))
+    finally:
+        server.terminate()
+        server.wait()
+        os.remove(fw.name)
+    rps = len(latencies) / args.duration_secs
+    print(
+        f"{name:<28} {rps:>9.1f} rps  p50 {percentile(latencies, 0.5) * 1000:>7.2f} ms  "
+        f"p99 {percentile(latencies, 0.99) * 1000:>7.2f} ms"
+    )
+    return rps
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the event loop and GC knobs of server.py.")
+    parser.add_argument("--conf", type=str, default="./etc/turtle-soup-game-service-dev.json")
+    parser.add_argument("--port", type=int, default=16870)
+    parser.add_argument("--stub-port", type=int, default=18090)
+    parser.add_argument("--stub-latency-secs", type=float, default=0.02, help="Latency of the LLM stub.")
+    parser.add_argument("--workers", type=int, default=1, help="Number of worker processes of the server.")
+    parser.add_argument("--concurrency", type=int, default=64)
+    parser.add_argument("--duration-secs", type=float, default=10)
+    parser.add_argument("--variants", type=str, nargs="*", default=list(VARIANTS), help="Variants to run.")
+    args = parser.parse_args()
+
+    with open(args.conf, "r") as fr:
+        base_conf = json.load(fr)
+    stub_server = subprocess.Popen([
+        sys.executable, os.path.join(ROOT_DIR, "scripts", "llm_engine_stub_server.py"),
+        "--port", str(args.stub_port), "--latency-secs", str(args.stub_latency_secs), "--delta-interval-secs", "0"
+    ])
+    try:
+        wait_for_port(args.stub_port)
+        results = {name: run_variant(name, base_conf, args) for name in args.variants}
+    finally:
+        stub_server.terminate()
+        stub_server.wait()
+
+    baseline = results.get("baseline (asyncio)")
+    if baseline:
+        print("== vs baseline")
+        for name, rps in results.items():
+            print(f"{name:<28} {rps / baseline:>9.2f}x")
@@ -0,0 +1,83 @@
+# -*- coding: utf-8 -*-
+"""
+Micro-benchmark of the text normalization, against the former per-character punctuation helpers.
+
+Usage:
+    python scripts/benchmark_text_normalizer.py --number 20000
+"""
+import argparse
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from internal.constants import PUNCTUATION_LIST
+from internal.utils.helper import (
+    is_text_all_punctuation,
+    remove_all_punctuations
+)
+from internal.utils.text_normalizer import DEFAULT_TEXT_NORMALIZER
+
+
+def legacy_is_text_all_punctuation(text: str) -> bool:
+    yes = True
+    for char in text:
+        if str(char) not in PUNCTUATION_LIST:
+            yes = False
+            break
+    return yes
+
+
+def legacy_remove_all_punctuations(text: str) -> str:
+    new_text_arr = []
+    for char in text:
+        if str(char) not in PUNCTUATION_LIST:
+            new_text_arr.append(str(char))
+    return "".join(new_text_arr)
+
+
+def legacy_normalize_message(message: str) -> str:
+    return legacy_remove_all_punctuations(message.strip().lower())
+
+
+SAMPLES = {
+    "short": "他是不是被人杀死的？",
+    "punctuation": "？？？！！！……",
+    "mixed": "  ＡＢＣ，他當時是不是在船上？　我覺得 He was on the boat!!! ",
+    "long": "这个男人为什么要在雨天打开窗户，难道他是想让别人看到什么吗？" * 20,
+}
+
+
+def bench(label: str, func, number: int):
+    secs = timeit.timeit(func, number=number)
+    print(f"{label:<48} {secs / number * 1e6:>10.3f} us/op")
+    return secs
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the text normalization.")
+    parser.add_argument("--number", type=int, default=20000, help="Number of runs of each case.")
+    parser.add_argument("--batch-size", type=int, default=64, help="Number of messages of the batch case.")
+    args = parser.parse_args()
+
+    for name, text in SAMPLES.items():
+        print(f"== {name} ({len(text)} chars)")
+        legacy = bench("legacy is_text_all_punctuation", lambda: legacy_is_text_all_punctuation(text), args.number)
+        fast = bench("is_text_all_punctuation", lambda: is_text_all_punctuation(text), args.number)
+        print(f"{'speedup':<48} {legacy / fast:>10.1f}x")
+        legacy = bench("legacy remove_all_punctuations", lambda: legacy_remove_all_punctuations(text), args.number)
+        fast = bench("remove_all_punctuations", lambda: remove_all_punctuations(text), args.number)
+        print(f"{'speedup':<48} {legacy / fast:>10.1f}x")
+        legacy = bench("legacy normalize_message (strip/lower/punct)", lambda: legacy_normalize_message(text), args.number)
+        fast = bench("TextNormalizer.normalize (all folds)", lambda: DEFAULT_TEXT_NORMALIZER.normalize(text), args.number)
+        print(f"{'speedup':<48} {legacy / fast:>10.1f}x")
+
+    batch = [text for text in SAMPLES.values()] * (args.batch_size // len(SAMPLES))
+    print(f"== batch ({len(batch)} messages)")
+    number = max(1, args.number // len(batch))
+    legacy = bench("legacy normalize_message per message", lambda: [legacy_normalize_message(text) for text in batch], number)
+    single = bench("TextNormalizer.normalize per message", lambda: [DEFAULT_TEXT_NORMALIZER.normalize(text) for text in batch], number)
+    fast = bench("TextNormalizer.normalize_batch", lambda: DEFAULT_TEXT_NORMALIZER.normalize_batch(batch), number)
+    print(f"{'speedup vs legacy':<48} {legacy / fast:>10.1f}x")
+    print(f"{'speedup vs per message':<48} {single / fast:>10.1f}x")
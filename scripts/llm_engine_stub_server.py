@@ -0,0 +1,159 @@
+# -*- coding: utf-8 -*-
+"""
+Local stub of the LLM providers' chat APIs (OpenAI, Azure OpenAI, Gemini, Claude), plus the OpenAI
+Completions API of the intention model, to exercise the engine adapters, the failover router and the
+model cascade without real upstreams.
+
+Usage:
+    python scripts/llm_engine_stub_server.py --port 18080 --latency-secs 0.2 --error-rate 0.1
+
+Then point openai.api_base to http://127.0.0.1:18080/v1, and llm_engines.*.api_base to http://127.0.0.1:18080.
+"""
+import argparse
+import asyncio
+import random
+import time
+
+import ujson as json
+from aiohttp import web
+
+GENERAL_QUESTION_REPLY = "不是。"
+# NOTE: "B" is "不是" of PROMPT_FOR_INTENTION, with the probability of 0.95.
+INTENTION_TOP_LOGPROBS = {"B": -0.05, "A": -3.5, "C": -4.5, "E": -6.0, "D": -7.0}
+TRUTH_JUDGEMENT_REPLY = json.dumps({"result": "很接近了", "reason": "还缺少一些关键线索。"}, ensure_ascii=False)
+
+
+def _reply_of(json_mode: bool) -> str:
+    return TRUTH_JUDGEMENT_REPLY if json_mode else GENERAL_QUESTION_REPLY
+
+
+async def _maybe_fail(request: web.Request):
+    conf = request.app["conf"]
+    await asyncio.sleep(conf.latency_secs)
+    if random.random() < conf.error_rate:
+        raise web.HTTPServiceUnavailable(text=json.dumps({"error": {"message": "stub upstream error"}}))
+
+
+async def _write_sse(request: web.Request, events) -> web.StreamResponse:
+    resp = web.StreamResponse(headers={"Content-Type": "text/event-stream"})
+    await resp.prepare(request)
+    for event in events:
+        await resp.write(f"data: {json.dumps(event, ensure_ascii=False)}\n\n".encode())
+        await asyncio.sleep(request.app["conf"].delta_interval_secs)
+    return resp
+
+
+async def openai_chat_completions(request: web.Request) -> web.StreamResponse:
+    """Serves both OpenAI (/v1/chat/completions) and Azure OpenAI (/openai/deployments/{deployment}/chat/completions)."""
+    await _maybe_fail(request)
+    body = await request.json(loads=json.loads)
+    model = body.get("model", request.match_info.get("deployment", "gpt-3.5-turbo"))
+    content = _reply_of((body.get("response_format") or {}).get("type") == "json_object")
+    if body.get("stream", False):
+        events = [
+            {
+                "id": "chatcmpl-stub",
+                "object": "chat.completion.chunk",
+                "created": int(time.time()),
+                "model": model,
+                "choices": [{"index": 0, "delta": {"content": ch}, "finish_reason": None}]
+            }
+            for ch in content
+        ]
+        resp = await _write_sse(request, events)
+        await resp.write(b"data: [DONE]\n\n")
+        return resp
+    return web.json_response({
+        "id": "chatcmpl-stub",
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": model,
+        "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+        "usage": {"prompt_tokens": 100, "completion_tokens": len(content), "total_tokens": 100 + len(content)}
+    }, dumps=json.dumps)
+
+
+async def openai_completions(request: web.Request) -> web.StreamResponse:
+    await _maybe_fail(request)
+    body = await request.json(loads=json.loads)
+    label = max(INTENTION_TOP_LOGPROBS, key=INTENTION_TOP_LOGPROBS.get)
+    logprobs = None
+    if body.get("logprobs") is not None:
+        logprobs = {
+            "tokens": [label],
+            "token_logprobs": [INTENTION_TOP_LOGPROBS[label]],
+            "top_logprobs": [dict(sorted(INTENTION_TOP_LOGPROBS.items(), key=lambda x: -x[1])[:body["logprobs"]])],
+            "text_offset": [0]
+        }
+    return web.json_response({
+        "id": "cmpl-stub",
+        "object": "text_completion",
+        "created": int(time.time()),
+        "model": body.get("model", "gpt-3.5-turbo-instruct"),
+        "choices": [{"index": 0, "text": label, "logprobs": logprobs, "finish_reason": "length"}],
+        "usage": {"prompt_tokens": 100, "completion_tokens": 1, "total_tokens": 101}
+    }, dumps=json.dumps)
+
+
+async def gemini_generate_content(request: web.Request) -> web.StreamResponse:
+    await _maybe_fail(request)
+    body = await request.json(loads=json.loads)
+    model, _, method = request.match_info["model_method"].partition(":")
+    content = _reply_of((body.get("generationConfig") or {}).get("responseMimeType") == "application/json")
+    if method == "streamGenerateContent":
+        events = [
+            {
+                "candidates": [{"content": {"role": "model", "parts": [{"text": ch}]}}],
+                "usageMetadata": {"promptTokenCount": 100, "candidatesTokenCount": idx + 1, "totalTokenCount": 101 + idx}
+            }
+            for idx, ch in enumerate(content)
+        ]
+        return await _write_sse(request, events)
+    return web.json_response({
+        "candidates": [{"content": {"role": "model", "parts": [{"text": content}]}, "finishReason": "STOP"}],
+        "usageMetadata": {"promptTokenCount": 100, "candidatesTokenCount": len(content), "totalTokenCount": 100 + len(content)},
+        "modelVersion": model
+    }, dumps=json.dumps)
+
+
+async def claude_messages(request: web.Request) -> web.StreamResponse:
+    await _maybe_fail(request)
+    body = await request.json(loads=json.loads)
+    # NOTE: Claude has no JSON mode, tell the modes apart by the prompt.
+    content = _reply_of("JSON" in body.get("system", ""))
+    if body.get("stream", False):
+        events = [{"type": "message_start", "message": {"model": body["model"], "usage": {"input_tokens": 100, "output_tokens": 0}}}]
+        events += [{"type": "content_block_delta", "index": 0, "delta": {"type": "text_delta", "text": ch}} for ch in content]
+        events += [{"type": "message_delta", "usage": {"output_tokens": len(content)}}, {"type": "message_stop"}]
+        return await _write_sse(request, events)
+    return web.json_response({
+        "id": "msg_stub",
+        "type": "message",
+        "role": "assistant",
+        "model": body["model"],
+        "content": [{"type": "text", "text": content}],
+        "stop_reason": "end_turn",
+        "usage": {"input_tokens": 100, "output_tokens": len(content)}
+    }, dumps=json.dumps)
+
+
+def create_app(conf: argparse.Namespace) -> web.Application:
+    app = web.Application()
+    app["conf"] = conf
+    app.router.add_post("/v1/chat/completions", openai_chat_completions)
+    app.router.add_post("/openai/deployments/{deployment}/chat/completions", openai_chat_completions)
+    app.router.add_post("/v1/completions", openai_completions)
+    app.router.add_post("/v1beta/models/{model_method}", gemini_generate_content)
+    app.router.add_post("/v1/messages", claude_messages)
+    return app
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Stub of the LLM providers' chat APIs.")
+    parser.add_argument("--host", type=str, default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=18080)
+    parser.add_argument("--latency-secs", type=float, default=0.1, help="Latency added to every response.")
+    parser.add_argument("--delta-interval-secs", type=float, default=0.02, help="Interval between streamed deltas.")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of the requests answered with 503.")
+    args = parser.parse_args()
+    web.run_app(create_app(args), host=args.host, port=args.port)
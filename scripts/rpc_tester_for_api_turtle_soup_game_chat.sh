@@ -31,10 +31,42 @@ function test_rpc_methods
 EOM
 }
 
+function test_rpc_methods_with_registered_puzzle
+{
+    grpcurl \
+        -rpc-header x-request-id:73338239da584998aca91639651334fb \
+        -d @ -plaintext -emit-defaults \
+        localhost:16869 turtle_soup_game_service.TurtleSoupGameService/RegisterPuzzle << EOM
+{
+    "ext_thread_id": "t000041",
+    "story": "我的伙伴们相继死去，而我却无能为力。",
+    "truth": "我是植物大战僵尸里的向日葵，相继死去的伙伴是其他植物。",
+    "key_clues": ["背景是植物大战僵尸", "我是植物"]
+}
+EOM
+
+    # NOTE: With the puzzle registered, the system prompt is left empty and looked up by ext_thread_id.
+    grpcurl \
+        -rpc-header x-uid:1000003 \
+        -rpc-header x-request-id:73338239da584998aca91639651334fc \
+        -d @ -plaintext -emit-defaults \
+        localhost:16869 turtle_soup_game_service.TurtleSoupGameService/GenerateDialogue << EOM
+{
+    "llm_engine": 0,
+    "to_reply_for_general_question": false,
+    "chat": "我是植物大战僵尸里的向日葵",
+    "ext_thread_id": "t000041",
+    "ext_uid": "1000003",
+    "ext_nickname": "adamzhou.eth"
+}
+EOM
+}
+
 function run
 {
     grpcurl -plaintext localhost:16869 list turtle_soup_game_service.TurtleSoupGameService
     test_rpc_methods
+    test_rpc_methods_with_registered_puzzle
 }
 
 run $@
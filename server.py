@@ -7,20 +7,30 @@ sys.path.append(os.path.join(os.path.abspath(os.curdir), "internal", "proto_gens
 import argparse
 import asyncio
 import random
+import signal
 import time
-from typing import Any, Dict
+from typing import Any, Dict, Optional
 
 import grpc
 from grpc_reflection.v1alpha import reflection
 from loguru import logger as loguru_logger
 
+import internal.extensions.ext_redis as ext_redis
 from internal.logger.loguru_logger import init_global_logger
 from internal.proto_gens import (
     turtle_soup_game_service_pb2,
     turtle_soup_game_service_pb2_grpc
 )
 from internal.service.impl import TurtleSoupGameService
+from internal.utils.admission_control import (
+    DEFAULT_ADMISSION_CONTROLLER,
+    AdmissionControlInterceptor
+)
+from internal.utils.event_loop import create_event_loop, freeze_gc, tune_gc
 from internal.utils.global_vars import get_config, set_config
+from internal.utils.metrics import report_metrics_periodically
+from internal.utils.tokenizer import DEFAULT_TOKENIZER
+from internal.utils.worker_supervisor import WorkerHeartbeat, WorkerSupervisor
 
 # Coroutine to be invoked when the event loop is shutting down.
 _cleanup_coroutines = []
@@ -34,14 +44,35 @@ def parse_args():
         default="./etc/turtle-soup-game-service-dev.json",
         help="the service config file",
     )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=None,
+        help="the number of worker processes sharing the service port, overrides workers.num_workers",
+    )
+    # NOTE: Given by the supervisor to the workers it execs.
+    parser.add_argument("--worker-id", type=int, default=None, help=argparse.SUPPRESS)
+    parser.add_argument("--heartbeat-fd", type=int, default=None, help=argparse.SUPPRESS)
     args = parser.parse_args()
     set_config(args.conf)
+    return args
 
 
-async def serve(conf: Dict[str, Any]):
+async def serve(conf: Dict[str, Any], heartbeat: Optional[WorkerHeartbeat] = None):
     try:
+        # Shed the load early, rather than queueing every RPC in front of a saturated upstream.
+        admission_conf = conf.get("admission_control", {})
+        DEFAULT_ADMISSION_CONTROLLER.configure(conf=admission_conf)
         # Create an asyncio gRPC server.
         server = grpc.aio.server(
+            interceptors=[
+                AdmissionControlInterceptor(
+                    controller=DEFAULT_ADMISSION_CONTROLLER,
+                    priority_of=TurtleSoupGameService.admission_priority
+                ),
+            ],
+            # NOTE: Hard cap of gRPC itself, beyond the admission queue, including the health checks.
+            maximum_concurrent_rpcs=admission_conf.get("maximum_concurrent_rpcs"),
             options=(
                 ("grpc.keepalive_time_ms", 10000),
                 ("grpc.keepalive_timeout_ms", 3000),
@@ -49,6 +80,8 @@ async def serve(conf: Dict[str, Any]):
                 ("grpc.http2.max_pings_without_data", 0),
                 ("grpc.http2.min_time_between_pings_ms", 10000),
                 ("grpc.http2.min_ping_interval_without_data_ms", 5000),
+                # NOTE: The worker processes bind the same port, the kernel balances the connections.
+                ("grpc.so_reuseport", 1),
             )
         )
         # Add the TurtleSoupGameService to the server.
@@ -78,6 +111,35 @@ async def serve(conf: Dict[str, Any]):
             loguru_logger.info("Stopped TurtleSoupGameService  Server 🤘.")
         _cleanup_coroutines.append(server_graceful_shutdown)
 
+        # NOTE: SIGTERM (docker stop, or the supervisor) drains the in-flight RPCs, then wait_for_termination
+        # returns and the cleanup coroutines run as usual. Stopping the server twice is harmless.
+        def on_sigterm():
+            loguru_logger.warning("Received SIGTERM, stopping the server...")
+            asyncio.ensure_future(server.stop(grace=5))
+        asyncio.get_event_loop().add_signal_handler(signal.SIGTERM, on_sigterm)
+
+        # Report the in-process metrics periodically.
+        if conf.get("metrics_report_interval_secs", 0) > 0:
+            metrics_reporter = asyncio.ensure_future(report_metrics_periodically(conf["metrics_report_interval_secs"]))
+
+            async def stop_metrics_reporter():
+                metrics_reporter.cancel()
+                await asyncio.sleep(0)
+            _cleanup_coroutines.append(stop_metrics_reporter)
+
+        # NOTE: Everything allocated by the startup lives as long as the process, the GC needn't scan it.
+        freeze_gc(conf.get("gc"))
+
+        # Tell the supervisor that the worker is serving, and keep telling it that the event loop is alive.
+        if heartbeat is not None:
+            heartbeat.ready()
+            heartbeat_task = asyncio.ensure_future(heartbeat.run())
+
+            async def stop_heartbeat():
+                heartbeat_task.cancel()
+                await asyncio.sleep(0)
+            _cleanup_coroutines.append(stop_heartbeat)
+
         loguru_logger.info("Server started, listening on [::]:{}".format(conf["service_port"]))
         loguru_logger.info("Started TurtleSoupGameService  Server 🤘.")
         # Wait for the server to be stopped.
@@ -87,9 +149,24 @@ async def serve(conf: Dict[str, Any]):
         raise exc
 
 
-async def setup_runtime_environment():
+def preload_tokenizers(conf: Dict[str, Any]):
+    # NOTE: Load the tokenizers before serving, rather than on the first request.
+    tokenizer_conf = conf.get("tokenizer", {})
+    preload_secs = DEFAULT_TOKENIZER.preload(
+        tokenizer_conf.get("preload_models", [conf["openai"]["chat_model"], conf["openai"]["intention_model"]]),
+        cache_dir=tokenizer_conf.get("cache_dir")
+    )
+    loguru_logger.info(f"Preloaded tokenizers in {preload_secs:.3f}s.")
+
+
+async def setup_runtime_environment(conf: Dict[str, Any]):
     # NOTE: Add your setup code here.
     loguru_logger.debug("Setting up runtime environment...")
+    preload_tokenizers(conf)
+    if "redis" in conf and conf["redis"].get("enable", False):
+        ext_redis.init_instance(conf["redis"], asyncio.get_event_loop())
+        if not await ext_redis.instance().is_connected():
+            loguru_logger.warning("Redis server is unreachable, features backed by Redis will degrade.")
     await asyncio.sleep(0)
     loguru_logger.debug("Runtime environment setup completed.")
 
@@ -97,30 +174,35 @@ async def setup_runtime_environment():
 async def clear_runtime_environment():
     # NOTE: Add your clear code here.
     loguru_logger.debug("Clearing runtime environment...")
+    if ext_redis.instance() is not None:
+        await ext_redis.instance().close()
     await asyncio.sleep(0)
     loguru_logger.debug("Runtime environment cleared.")
 
 
-if __name__ == "__main__":
-    random.seed(int(time.time()) + random.randrange(10000))
-
-    parse_args()
-    conf = get_config()
+def init_logger(conf: Dict[str, Any], worker_id: Optional[int] = None):
+    log_printer_filename = conf["log_printer_filename"]
+    # NOTE: Each worker rotates its own log file, the workers can't share one.
+    if worker_id is not None and len(log_printer_filename) > 0:
+        base, ext = os.path.splitext(log_printer_filename)
+        log_printer_filename = f"{base}.worker{worker_id}{ext}"
     init_global_logger(
         service_name=conf["service_name"],
         log_level=conf["log_level"],
         log_printer=conf["log_printer"],
-        log_printer_filename=conf["log_printer_filename"]
+        log_printer_filename=log_printer_filename
     )
 
-    loop = asyncio.new_event_loop()
+
+def run_server(conf: Dict[str, Any], heartbeat: Optional[WorkerHeartbeat] = None):
+    loop = create_event_loop(conf.get("event_loop"))
     asyncio.set_event_loop(loop)
 
-    loop.run_until_complete(setup_runtime_environment())
+    loop.run_until_complete(setup_runtime_environment(conf))
     _cleanup_coroutines.append(clear_runtime_environment)
 
     try:
-        loop.run_until_complete(serve(conf=conf))
+        loop.run_until_complete(serve(conf=conf, heartbeat=heartbeat))
     except Exception as exc:
         loguru_logger.error(f"Error: {exc}")
     finally:
@@ -133,3 +215,35 @@ if __name__ == "__main__":
         # https://docs.aiohttp.org/en/stable/client_advanced.html#Graceful_Shutdown
         loop.run_until_complete(asyncio.sleep(0.250))
         loop.close()
+
+
+def run_worker(conf: Dict[str, Any], heartbeat: WorkerHeartbeat):
+    init_logger(conf, worker_id=heartbeat.worker_id)
+    run_server(conf, heartbeat)
+
+
+if __name__ == "__main__":
+    random.seed(int(time.time()) + random.randrange(10000))
+
+    args = parse_args()
+    conf = get_config()
+    workers_conf = conf.get("workers", {})
+    if args.heartbeat_fd is not None:
+        # NOTE: A worker exec'ed by the supervisor, it has read the code and the config afresh.
+        tune_gc(conf.get("gc"))
+        run_worker(conf, WorkerHeartbeat(
+            worker_id=args.worker_id,
+            fd=args.heartbeat_fd,
+            interval_secs=workers_conf.get("heartbeat_interval_secs", 1)
+        ))
+        sys.exit(0)
+
+    init_logger(conf)
+    tune_gc(conf.get("gc"))
+    num_workers = args.workers if args.workers is not None else workers_conf.get("num_workers", 1)
+    if num_workers <= 1:
+        run_server(conf)
+    else:
+        # NOTE: SIGHUP restarts the workers one at a time, each exec'ed with the same command line.
+        supervisor = WorkerSupervisor(conf=workers_conf, num_workers=num_workers, argv=[sys.executable] + sys.argv)
+        sys.exit(supervisor.run())
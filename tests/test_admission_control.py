@@ -0,0 +1,178 @@
+# -*- coding: utf-8 -*-
+import asyncio
+import unittest
+from typing import Dict, List
+
+from internal.utils.admission_control import (
+    PRIORITY_HIGH,
+    PRIORITY_LOW,
+    PRIORITY_NORMAL,
+    REJECT_REASON_DEADLINE,
+    REJECT_REASON_EVICTED,
+    REJECT_REASON_QUEUE_FULL,
+    REJECT_REASON_TIMEOUT,
+    AdmissionController,
+    AdmissionRejectedException
+)
+
+
+class TestAdmissionController(unittest.IsolatedAsyncioTestCase):
+
+    def make_controller(self, **conf) -> AdmissionController:
+        return AdmissionController(conf={
+            "enable": True,
+            "enable_adaptive_limit": False,
+            "min_limit": 1,
+            "initial_limit": 1,
+            "reserved_ratio_for_high_priority": 0,
+            **conf
+        })
+
+    async def hold(self, controller: AdmissionController, priority: int = PRIORITY_NORMAL) -> asyncio.Event:
+        """Occupies one slot until the returned event is set."""
+        admitted = asyncio.Event()
+        done = asyncio.Event()
+
+        async def rpc():
+            async with controller.admit(priority):
+                admitted.set()
+                await done.wait()
+
+        asyncio.ensure_future(rpc())
+        await admitted.wait()
+        return done
+
+    def queue(self, controller: AdmissionController, calls: List[tuple], order: List[str], errors: Dict[str, str]) -> List[asyncio.Future]:
+        """Queues the RPCs (name, priority), recording the admission order and the reasons of the rejected ones."""
+        async def rpc(name: str, priority: int):
+            try:
+                async with controller.admit(priority):
+                    order.append(name)
+            except AdmissionRejectedException as exc:
+                errors[name] = exc.reason
+
+        return [asyncio.ensure_future(rpc(*args)) for args in calls]
+
+    async def test_disabled_never_waits(self):
+        controller = AdmissionController(conf={"enable": False, "initial_limit": 1})
+        async with controller.admit(PRIORITY_LOW):
+            async with controller.admit(PRIORITY_LOW):
+                self.assertEqual(controller.inflight, 0)
+
+    async def test_higher_priority_first(self):
+        controller = self.make_controller()
+        done = await self.hold(controller)
+        order, errors = [], {}
+        tasks = self.queue(controller, [
+            ("batch", PRIORITY_LOW),
+            ("question1", PRIORITY_NORMAL),
+            ("judgement", PRIORITY_HIGH),
+            ("question2", PRIORITY_NORMAL),
+        ], order, errors)
+        await asyncio.sleep(0)
+        done.set()
+        await asyncio.gather(*tasks)
+        self.assertEqual(order, ["judgement", "question1", "question2", "batch"])
+        self.assertEqual(errors, {})
+        self.assertEqual(controller.inflight, 0)
+
+    async def test_reserved_capacity_for_high_priority(self):
+        controller = self.make_controller(initial_limit=2, reserved_ratio_for_high_priority=0.5, max_queue_wait_secs=0.05)
+        await self.hold(controller)
+        order, errors = [], {}
+        await asyncio.gather(*self.queue(controller, [("question", PRIORITY_NORMAL)], order, errors))
+        self.assertEqual(errors, {"question": REJECT_REASON_TIMEOUT})
+        await asyncio.gather(*self.queue(controller, [("judgement", PRIORITY_HIGH)], order, errors))
+        self.assertEqual(order, ["judgement"])
+
+    async def test_full_queue_evicts_the_newest_lowest(self):
+        controller = self.make_controller(max_queue_size=3)
+        done = await self.hold(controller)
+        order, errors = [], {}
+        tasks = self.queue(controller, [
+            ("batch1", PRIORITY_LOW),
+            ("batch2", PRIORITY_LOW),
+            ("question1", PRIORITY_NORMAL),
+        ], order, errors)
+        await asyncio.sleep(0)
+        tasks += self.queue(controller, [("judgement", PRIORITY_HIGH), ("question2", PRIORITY_NORMAL)], order, errors)
+        await asyncio.sleep(0)
+        done.set()
+        await asyncio.gather(*tasks)
+        self.assertEqual(errors, {"batch2": REJECT_REASON_EVICTED, "batch1": REJECT_REASON_EVICTED})
+        self.assertEqual(order, ["judgement", "question1", "question2"])
+
+    async def test_full_queue_rejects_the_same_priority(self):
+        controller = self.make_controller(max_queue_size=1)
+        done = await self.hold(controller)
+        order, errors = [], {}
+        tasks = self.queue(controller, [("batch", PRIORITY_LOW)], order, errors)
+        await asyncio.sleep(0)
+        tasks += self.queue(controller, [("question1", PRIORITY_NORMAL), ("question2", PRIORITY_NORMAL)], order, errors)
+        await asyncio.sleep(0)
+        done.set()
+        await asyncio.gather(*tasks)
+        self.assertEqual(errors, {"batch": REJECT_REASON_EVICTED, "question2": REJECT_REASON_QUEUE_FULL})
+        self.assertEqual(order, ["question1"])
+
+    async def test_deadline_shorter_than_the_queueing(self):
+        controller = self.make_controller()
+        controller._rpc_latency_ewma = 1.0
+        await self.hold(controller)
+        with self.assertRaises(AdmissionRejectedException) as ctx:
+            async with controller.admit(PRIORITY_NORMAL, time_remaining=0.5):
+                pass
+        self.assertEqual(ctx.exception.reason, REJECT_REASON_DEADLINE)
+        self.assertEqual(controller._queue_size, 0)
+
+    async def test_cancelled_while_queued(self):
+        controller = self.make_controller()
+        done = await self.hold(controller)
+        order, errors = [], {}
+        cancelled = self.queue(controller, [("cancelled", PRIORITY_NORMAL)], order, errors)[0]
+        await asyncio.sleep(0)
+        cancelled.cancel()
+        with self.assertRaises(asyncio.CancelledError):
+            await cancelled
+        done.set()
+        await asyncio.gather(*self.queue(controller, [("next", PRIORITY_NORMAL)], order, errors))
+        self.assertEqual(order, ["next"])
+        self.assertEqual(controller.inflight, 0)
+        self.assertEqual(controller._queue_size, 0)
+
+
+class TestAdaptiveLimit(unittest.TestCase):
+
+    def make_controller(self, **conf) -> AdmissionController:
+        return AdmissionController(conf={
+            "enable": True,
+            "min_limit": 1,
+            "initial_limit": 10,
+            "min_samples": 2,
+            "decrease_interval_secs": 0,
+            **conf
+        })
+
+    def test_errors_decrease_the_limit(self):
+        controller = self.make_controller()
+        controller.observe_upstream(latency=1.0, ok=False)
+        self.assertEqual(controller.limit, 9)
+
+    def test_congestion_decreases_the_limit(self):
+        controller = self.make_controller()
+        for _ in range(2):
+            controller.observe_upstream(latency=1.0, ok=True)
+        controller.observe_upstream(latency=100.0, ok=True)
+        self.assertLess(controller.limit, 10)
+
+    def test_only_a_saturated_limit_grows(self):
+        controller = self.make_controller()
+        controller.observe_upstream(latency=1.0, ok=True)
+        self.assertEqual(controller._limit, 10)
+        controller._inflight = 9
+        controller.observe_upstream(latency=1.0, ok=True)
+        self.assertGreater(controller._limit, 10)
+
+
+if __name__ == "__main__":
+    unittest.main()
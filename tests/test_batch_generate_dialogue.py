@@ -0,0 +1,110 @@
+# -*- coding: utf-8 -*-
+import os
+import sys
+
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "internal", "proto_gens"))
+
+import asyncio
+import unittest
+from typing import List, Optional
+
+import internal.utils.outbound_scheduler as outbound_scheduler
+from internal.proto_gens import turtle_soup_game_service_pb2
+from internal.service.impl import TurtleSoupGameService
+from internal.utils.admission_control import PRIORITY_LOW
+from internal.utils.rate_limiter import UserRateLimiter
+
+
+class StubKeyPool:
+
+    def __init__(self):
+        self.leases = 0
+
+    def best_key(self) -> str:
+        self.leases += 1
+        return f"sk-{self.leases}"
+
+
+class StubContext:
+
+    def invocation_metadata(self):
+        return [("x-uid", "u1"), ("x-request-id", "trace")]
+
+    def time_remaining(self) -> Optional[float]:
+        return None
+
+    def cancelled(self) -> bool:
+        return False
+
+
+class TestBatchGenerateDialogue(unittest.IsolatedAsyncioTestCase):
+
+    def setUp(self):
+        # NOTE: Skip the constructor, which sets up the engines and the stores of the whole service.
+        self.service = object.__new__(TurtleSoupGameService)
+        self.service._batch_conf_max_batch_size = 4
+        self.service._batch_conf_max_concurrency = 2
+        self.service._rate_limiter = UserRateLimiter(conf={})
+        self.service._openai_key_pool = StubKeyPool()
+        self.service._generate_dialogue = self.generate_dialogue
+        self.inflight = 0
+        self.max_inflight = 0
+        self.keys: List[str] = []
+        self.priorities: List[int] = []
+
+    async def generate_dialogue(self, request, *, uid: str, trace_id: str, user_class: str, openai_key: str = ""):
+        self.inflight += 1
+        self.max_inflight = max(self.max_inflight, self.inflight)
+        self.keys.append(openai_key)
+        self.priorities.append(outbound_scheduler._SCHEDULING.get()[1])
+        # NOTE: The later requests finish first.
+        await asyncio.sleep(0.01 * (10 - len(request.chat)))
+        self.inflight -= 1
+        resp = turtle_soup_game_service_pb2.GenerateDialogueResponse(chat=f"{request.chat}是", ext_thread_id=request.ext_thread_id)
+        resp.ret.code = 10500 if request.chat == "?" else 0
+        return resp
+
+    def make_request(self, chats: List[str], max_concurrency: int = 0) -> turtle_soup_game_service_pb2.BatchGenerateDialogueRequest:
+        return turtle_soup_game_service_pb2.BatchGenerateDialogueRequest(
+            requests=[
+                turtle_soup_game_service_pb2.GenerateDialogueRequest(chat=chat, ext_thread_id="t1", to_reply_for_general_question=True)
+                for chat in chats
+            ],
+            max_concurrency=max_concurrency
+        )
+
+    async def test_responses_in_request_order(self):
+        resp = await self.service.BatchGenerateDialogue(self.make_request(["a", "bb", "?", "dddd"]), StubContext())
+        self.assertEqual(resp.ret.code, 0)
+        self.assertEqual([item.chat for item in resp.responses], ["a是", "bb是", "?是", "dddd是"])
+        self.assertEqual([item.ret.code for item in resp.responses], [0, 0, 10500, 0])
+
+    async def test_bounded_fan_out(self):
+        await self.service.BatchGenerateDialogue(self.make_request(["a", "bb", "ccc", "dddd"]), StubContext())
+        self.assertEqual(self.max_inflight, 2)
+
+    async def test_requested_concurrency_only_lowers_the_bound(self):
+        await self.service.BatchGenerateDialogue(self.make_request(["a", "bb", "ccc"], max_concurrency=1), StubContext())
+        self.assertEqual(self.max_inflight, 1)
+        self.max_inflight = 0
+        await self.service.BatchGenerateDialogue(self.make_request(["a", "bb", "ccc"], max_concurrency=8), StubContext())
+        self.assertEqual(self.max_inflight, 2)
+
+    async def test_one_key_lease_per_batch(self):
+        await self.service.BatchGenerateDialogue(self.make_request(["a", "bb", "ccc"]), StubContext())
+        self.assertEqual(self.service._openai_key_pool.leases, 1)
+        self.assertEqual(self.keys, ["sk-1"] * 3)
+
+    async def test_batches_go_after_interactive_requests(self):
+        await self.service.BatchGenerateDialogue(self.make_request(["a", "bb"]), StubContext())
+        self.assertEqual(self.priorities, [PRIORITY_LOW] * 2)
+
+    async def test_oversized_batch_is_rejected(self):
+        resp = await self.service.BatchGenerateDialogue(self.make_request(["a"] * 5), StubContext())
+        self.assertEqual(resp.ret.code, 10400)
+        self.assertEqual(len(resp.responses), 0)
+        self.assertEqual(self.service._openai_key_pool.leases, 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,107 @@
+# -*- coding: utf-8 -*-
+import asyncio
+import unittest
+from typing import Dict, List
+from unittest import mock
+
+import internal.extensions.ext_redis as ext_redis
+from internal.utils.conversation_memory import (
+    ConversationMemory,
+    MemoryTrimPolicy,
+    SummarizeOldestPolicy
+)
+
+try:
+    import fakeredis
+except ImportError:
+    fakeredis = None
+
+
+def turn(idx: int) -> List[Dict[str, str]]:
+    return [{"role": "user", "content": f"问题{idx}"}, {"role": "assistant", "content": "是"}]
+
+
+class SlowPolicy(MemoryTrimPolicy):
+    """Lets the test append a turn while the trimmed turns are being compacted."""
+
+    def __init__(self, policy: MemoryTrimPolicy):
+        self.policy = policy
+        self.compacting = asyncio.Event()
+        self.resume = asyncio.Event()
+
+    async def compact(self, dropped):
+        self.compacting.set()
+        await self.resume.wait()
+        return await self.policy.compact(dropped)
+
+
+class ConversationMemoryTestMixin:
+
+    def make_memory(self, policy: MemoryTrimPolicy) -> ConversationMemory:
+        memory = ConversationMemory(conf={}, model="gpt-3.5-turbo", policy=policy)
+
+        async def acount_tokens(message):
+            return 10
+
+        memory.acount_tokens = acount_tokens
+        return memory
+
+    async def assert_keeps_concurrent_append(self, memory: ConversationMemory, policy: SlowPolicy):
+        for idx in range(3):
+            await memory.append("cid", turn(idx))
+        loading = asyncio.create_task(memory.load("cid", token_budget=40))
+        await policy.compacting.wait()
+        await memory.append("cid", turn(3))
+        policy.resume.set()
+        await loading
+
+        history = await memory.load("cid", token_budget=1000)
+        self.assertIn("问题3", [message["content"] for message in history])
+        self.assertNotIn("问题0", [message["content"] for message in history])
+        return history
+
+    async def summarize(self, messages):
+        return "他死了"
+
+
+class TestConversationMemoryLocally(ConversationMemoryTestMixin, unittest.IsolatedAsyncioTestCase):
+
+    def setUp(self):
+        patcher = mock.patch.object(ext_redis, "instance", return_value=None)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    async def test_trim_keeps_concurrent_append(self):
+        policy = SlowPolicy(MemoryTrimPolicy())
+        await self.assert_keeps_concurrent_append(self.make_memory(policy), policy)
+
+
+@unittest.skipIf(fakeredis is None, "fakeredis is not installed")
+class TestConversationMemoryInRedis(ConversationMemoryTestMixin, unittest.IsolatedAsyncioTestCase):
+
+    def setUp(self):
+        client = object.__new__(ext_redis.RedisClient)
+        client._client = fakeredis.FakeAsyncRedis(lua_modules=set())
+        client._scripts = {}
+        patcher = mock.patch.object(ext_redis, "instance", return_value=client)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    async def test_trim_keeps_concurrent_append(self):
+        policy = SlowPolicy(SummarizeOldestPolicy(summarizer=self.summarize, model="gpt-3.5-turbo"))
+        history = await self.assert_keeps_concurrent_append(self.make_memory(policy), policy)
+        self.assertEqual(history[0]["role"], "system")
+        self.assertEqual(len(history), 1 + 2 * 2)
+
+    async def test_trim_is_skipped_if_trimmed_meanwhile(self):
+        memory = self.make_memory(MemoryTrimPolicy())
+        for idx in range(3):
+            await memory.append("cid", turn(idx))
+        entries = await memory._read("cid")
+        await memory.load("cid", token_budget=20)
+        await memory._trim("cid", entries, num_dropped=2, head=[])
+        self.assertEqual([message["content"] for message in await memory.load("cid", token_budget=1000)], ["问题2", "是"])
+
+
+if __name__ == "__main__":
+    unittest.main()
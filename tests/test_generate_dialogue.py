@@ -0,0 +1,134 @@
+# -*- coding: utf-8 -*-
+import os
+import sys
+
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "internal", "proto_gens"))
+
+import asyncio
+import unittest
+from typing import Dict, List, Optional, Tuple
+from unittest import mock
+
+import internal.extensions.ext_redis as ext_redis
+from internal.proto_gens import turtle_soup_game_service_pb2
+from internal.service.impl import TurtleSoupGameService
+from internal.utils.question_index import NearDuplicateQuestionIndex
+from internal.utils.rate_limiter import UserRateLimiter
+from internal.utils.response_cache import MODE_GENERAL_QUESTION, ResponseCache
+from internal.utils.short_circuit import ShortCircuit
+from internal.utils.single_flight import SingleFlight
+
+HISTORIES = {
+    "c1": [{"role": "user", "content": "他有妻子吗"}, {"role": "assistant", "content": "是"}],
+    "c2": [{"role": "user", "content": "他有儿子吗"}, {"role": "assistant", "content": "是"}],
+}
+
+
+class StubLLMEngine:
+
+    def __init__(self, name: str = "openai", model: str = "gpt-4"):
+        self.name = name
+        self.model = model
+
+
+class StubLLMEngineRouter:
+
+    def __init__(self):
+        self.answered_by = StubLLMEngine()
+
+    def get(self, engine: str) -> StubLLMEngine:
+        return StubLLMEngine()
+
+    def pick(self, engine: str) -> StubLLMEngine:
+        return StubLLMEngine()
+
+
+class StubPromptBudget:
+
+    async def fit(self, *, system_prompt: str, user_message: str, history: List[Dict[str, str]], mode: str):
+        return user_message, history
+
+
+class StubConversationMemory:
+
+    def __init__(self):
+        self.turns: Dict[str, List[Dict[str, str]]] = {}
+
+    async def append(self, conversation_id: str, messages: List[Dict[str, str]]):
+        self.turns.setdefault(conversation_id, []).extend(messages)
+
+
+class TestGenerateDialogue(unittest.IsolatedAsyncioTestCase):
+
+    def setUp(self):
+        patcher = mock.patch.object(ext_redis, "instance", return_value=None)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        # NOTE: Skip the constructor, which sets up the engines and the stores of the whole service.
+        service = object.__new__(TurtleSoupGameService)
+        service._rate_limiter = UserRateLimiter(conf={})
+        service._short_circuit = ShortCircuit(conf={"enable": False})
+        service._llm_engine_router = StubLLMEngineRouter()
+        service._prompt_budget = StubPromptBudget()
+        service._response_cache = ResponseCache(conf={"enable": True, "enable_redis_tier": False})
+        service._question_index = NearDuplicateQuestionIndex(conf={})
+        service._conversation_memory = StubConversationMemory()
+        service._openai_conf_chat_enable_memory = True
+        service._openai_conf_chat_temperature = 0.0
+        service._enable_single_flight = True
+        service._single_flight = SingleFlight()
+        service._resolve_system_prompt = self.resolve_system_prompt
+        service._load_conversation_history = self.load_conversation_history
+        service._generate_reply = self.generate_reply
+        self.service = service
+        self.upstream_histories: List[List[Dict[str, str]]] = []
+
+    async def resolve_system_prompt(self, request, mode: str):
+        return "海龟汤", None
+
+    async def load_conversation_history(self, conversation_id: str, **kwargs) -> List[Dict[str, str]]:
+        return list(HISTORIES.get(conversation_id, []))
+
+    async def generate_reply(self, *, history: Optional[List[Dict[str, str]]] = None, **kwargs) -> Tuple[str, StubLLMEngine]:
+        self.upstream_histories.append(history)
+        await asyncio.sleep(0.01)
+        reply = f"是，{history[0]['content']}" if history else "是"
+        return reply, self.service._llm_engine_router.answered_by
+
+    async def ask(self, conversation_id: str, chat: str = "他死了吗") -> turtle_soup_game_service_pb2.GenerateDialogueResponse:
+        request = turtle_soup_game_service_pb2.GenerateDialogueRequest(
+            conversation_id=conversation_id,
+            chat=chat,
+            to_reply_for_general_question=True
+        )
+        return await self.service._generate_dialogue(request, uid="u1", trace_id="trace")
+
+    async def test_different_histories_are_not_coalesced(self):
+        resps = await asyncio.gather(self.ask("c1"), self.ask("c2"))
+        self.assertEqual(len(self.upstream_histories), 2)
+        self.assertEqual([resp.chat for resp in resps], ["是，他有妻子吗", "是，他有儿子吗"])
+        self.assertEqual(self.service._conversation_memory.turns["c2"][-1]["content"], "是，他有儿子吗")
+
+    async def test_questions_without_history_are_coalesced(self):
+        resps = await asyncio.gather(self.ask("c3"), self.ask("c4"))
+        self.assertEqual(len(self.upstream_histories), 1)
+        self.assertEqual([resp.chat for resp in resps], ["是", "是"])
+
+    async def test_failed_over_reply_is_cached_by_the_engine_which_answered(self):
+        self.service._llm_engine_router.answered_by = StubLLMEngine(name="claude", model="claude-3-haiku")
+        await self.ask("c3")
+
+        def cache_key(llm_engine: StubLLMEngine) -> str:
+            return TurtleSoupGameService._response_cache_key(system_prompt="海龟汤", user_message="他死了吗", llm_engine=llm_engine, mode=MODE_GENERAL_QUESTION)
+
+        self.assertIsNone(await self.service._response_cache.get(cache_key(StubLLMEngine()), MODE_GENERAL_QUESTION))
+        self.assertEqual(await self.service._response_cache.get(cache_key(StubLLMEngine(name="claude", model="claude-3-haiku")), MODE_GENERAL_QUESTION), "是")
+        # NOTE: The next question to the primary engine is not answered by the reply of the fallback one.
+        self.service._llm_engine_router.answered_by = StubLLMEngine()
+        await self.ask("c4")
+        self.assertEqual(len(self.upstream_histories), 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
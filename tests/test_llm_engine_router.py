@@ -0,0 +1,193 @@
+# -*- coding: utf-8 -*-
+import asyncio
+import os
+import socket
+import unittest
+from unittest import mock
+
+import openai.error as openai_error
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+
+import internal.llm_engines.base as llm_engines_base
+from internal.llm_engines.azure_engine import AzureOpenAIEngineAdapter
+from internal.llm_engines.base import LLMEngineError
+from internal.llm_engines.claude_engine import ClaudeEngineAdapter
+from internal.llm_engines.router import LLMEngineRouter, is_upstream_error
+from internal.utils.outbound_scheduler import (
+    OutboundQueueTimeoutException,
+    OutboundScheduler
+)
+from internal.utils.retry_with_backoff import (
+    DeadlineExceededException,
+    call_context
+)
+
+MESSAGES = [{"role": "system", "content": "海龟汤"}, {"role": "user", "content": "他死了吗"}]
+
+
+async def azure_chat_completions(request: web.Request) -> web.StreamResponse:
+    request.app["hits"]["azure"] += 1
+    status = request.app["azure_status"]
+    if status != 200:
+        return web.json_response({"error": {"message": "stub error"}}, status=status)
+    if (await request.json()).get("stream", False):
+        resp = web.StreamResponse(headers={"Content-Type": "text/event-stream"})
+        await resp.prepare(request)
+        for content in ("是", "。"):
+            await resp.write(f'data: {{"choices": [{{"delta": {{"content": "{content}"}}}}]}}\n\n'.encode())
+        await resp.write(b"data: [DONE]\n\n")
+        return resp
+    return web.json_response({"model": "gpt-35-turbo", "choices": [{"message": {"content": "是。"}}], "usage": {}})
+
+
+async def claude_messages(request: web.Request) -> web.Response:
+    request.app["hits"]["claude"] += 1
+    return web.json_response({"model": "claude", "content": [{"type": "text", "text": "不是。"}], "usage": {}})
+
+
+def unused_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+class TestLLMEngineRouter(unittest.IsolatedAsyncioTestCase):
+
+    async def asyncSetUp(self):
+        patcher = mock.patch.dict(os.environ, {"AZURE_OPENAI_KEY": "stub", "CLAUDE_API_KEY": "stub"})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        app = web.Application()
+        app["hits"] = {"azure": 0, "claude": 0}
+        app["azure_status"] = 200
+        app.router.add_post("/openai/deployments/{deployment}/chat/completions", azure_chat_completions)
+        app.router.add_post("/v1/messages", claude_messages)
+        self.app = app
+        self.server = TestServer(app)
+        await self.server.start_server()
+        self.router = self.make_router(str(self.server.make_url("")))
+
+    async def asyncTearDown(self):
+        await self.router.close()
+        await self.server.close()
+
+    def make_router(self, azure_api_base: str) -> LLMEngineRouter:
+        engine_conf = {"enable": True, "model": "stub", "max_retries": 0, "retry_initial_delay_secs": 0.01}
+        return LLMEngineRouter(
+            adapters=[
+                AzureOpenAIEngineAdapter(conf={**engine_conf, "api_base": azure_api_base}),
+                ClaudeEngineAdapter(conf={**engine_conf, "api_base": str(self.server.make_url(""))}),
+            ],
+            default_engine="azure",
+            conf={"failover_order": ["azure", "claude"], "min_samples": 2, "ewma_alpha": 0.5}
+        )
+
+    async def chat(self, engine: str = "azure") -> str:
+        async def call(adapter):
+            result = await adapter.chat(messages=MESSAGES, max_tokens=16, temperature=0.0)
+            return result.content
+
+        return await self.router.run(engine, call)
+
+    async def test_no_failover_on_success(self):
+        self.assertEqual(await self.chat(), "是。")
+        self.assertEqual(self.app["hits"], {"azure": 1, "claude": 0})
+        self.assertEqual(self.router._health["azure"].error_ewma, 0.0)
+
+    async def test_fails_over_on_server_error(self):
+        self.app["azure_status"] = 503
+        self.assertEqual(await self.chat(), "不是。")
+        self.assertEqual(self.app["hits"], {"azure": 1, "claude": 1})
+        self.assertGreater(self.router._health["azure"].error_ewma, 0.0)
+
+    async def test_fails_over_on_connection_error(self):
+        await self.router.close()
+        self.router = self.make_router(f"http://127.0.0.1:{unused_port()}")
+        self.assertEqual(await self.chat(), "不是。")
+        self.assertEqual(self.router._health["azure"].samples, 1)
+
+    async def test_bad_request_is_not_failed_over(self):
+        self.app["azure_status"] = 400
+        with self.assertRaises(LLMEngineError):
+            await self.chat()
+        self.assertEqual(self.app["hits"], {"azure": 1, "claude": 0})
+        self.assertEqual(self.router._health["azure"].samples, 0)
+
+    async def test_local_errors_are_not_recorded(self):
+        for exc in (
+            DeadlineExceededException("deadline"),
+            OutboundQueueTimeoutException("queue"),
+            ValueError("Malformed truth judgement"),
+        ):
+            with self.subTest(exc=exc):
+                calls = []
+
+                async def call(adapter, exc=exc):
+                    calls.append(adapter.name)
+                    raise exc
+
+                with self.assertRaises(type(exc)):
+                    await self.router.run("azure", call)
+                self.assertEqual(calls, ["azure"])
+        self.assertEqual(self.router._health["azure"].samples, 0)
+
+    async def test_circuit_opens_after_errors(self):
+        self.app["azure_status"] = 500
+        for _ in range(2):
+            await self.chat()
+        self.assertEqual(self.router.pick("azure").name, "claude")
+        self.assertEqual(await self.chat(), "不是。")
+        self.assertEqual(self.app["hits"]["azure"], 2)
+
+    async def test_http_engines_are_scheduled(self):
+        scheduler = OutboundScheduler(conf={"enable": True, "max_concurrency": 1})
+        with mock.patch.object(llm_engines_base, "DEFAULT_OUTBOUND_SCHEDULER", scheduler):
+            adapter = self.router.get("azure")
+            stream = adapter.chat_stream(messages=MESSAGES, max_tokens=16, temperature=0.0)
+            self.assertEqual(await stream.__anext__(), "是")
+            # NOTE: A stream holds its slot until closed.
+            self.assertEqual(scheduler._inflight, 1)
+            await stream.aclose()
+            self.assertEqual(scheduler._inflight, 0)
+            await self.chat()
+            self.assertEqual(scheduler._inflight, 0)
+
+    async def test_local_waits_are_not_upstream_latency(self):
+        scheduler = OutboundScheduler(conf={"enable": True, "max_concurrency": 1})
+        with mock.patch.object(llm_engines_base, "DEFAULT_OUTBOUND_SCHEDULER", scheduler):
+            release = await scheduler.acquire()
+            chatting = asyncio.ensure_future(self.chat())
+            await asyncio.sleep(0.2)
+            release()
+            await chatting
+        self.assertEqual(self.router._health["azure"].samples, 1)
+        self.assertLess(self.router._health["azure"].latency_ewma, 0.1)
+
+
+class TestIsUpstreamError(unittest.TestCase):
+
+    def test_classification(self):
+        self.assertTrue(is_upstream_error(LLMEngineError("unavailable", status=503)))
+        self.assertTrue(is_upstream_error(openai_error.APIConnectionError("reset")))
+        self.assertFalse(is_upstream_error(openai_error.InvalidRequestError("too long", param=None)))
+        self.assertFalse(is_upstream_error(ValueError("malformed")))
+        self.assertTrue(is_upstream_error(asyncio.TimeoutError()))
+
+    def test_timeout_of_the_deadline_is_local(self):
+        with call_context(time_remaining=-1):
+            self.assertFalse(is_upstream_error(asyncio.TimeoutError()))
+
+    def test_retries_given_up_on_upstream_error(self):
+        try:
+            try:
+                raise LLMEngineError("unavailable", status=503)
+            except LLMEngineError as exc:
+                raise Exception("Maximum number of retries (0) exceeded.") from exc
+        except Exception as exc:
+            self.assertTrue(is_upstream_error(exc))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,116 @@
+# -*- coding: utf-8 -*-
+import asyncio
+import unittest
+from typing import List
+
+from internal.utils.admission_control import (
+    PRIORITY_HIGH,
+    PRIORITY_LOW,
+    PRIORITY_NORMAL
+)
+from internal.utils.outbound_scheduler import (
+    OutboundQueueTimeoutException,
+    OutboundScheduler,
+    scheduling_context
+)
+from internal.utils.retry_with_backoff import (
+    DeadlineExceededException,
+    call_context
+)
+
+
+class TestOutboundScheduler(unittest.IsolatedAsyncioTestCase):
+
+    def make_scheduler(self, **conf) -> OutboundScheduler:
+        return OutboundScheduler(conf={"enable": True, "max_concurrency": 1, **conf})
+
+    async def run_queued(self, scheduler: OutboundScheduler, calls: List[tuple]) -> List[str]:
+        """Queues the calls (name, flow, priority, user class, cost) behind a busy slot, returns the dispatch order."""
+        order = []
+
+        async def call(name: str, flow: str, priority: int, user_class: str, cost: float):
+            with scheduling_context(flow=flow, priority=priority, user_class=user_class):
+                release = await scheduler.acquire(cost=cost)
+            order.append(name)
+            release()
+
+        release = await scheduler.acquire()
+        tasks = []
+        for args in calls:
+            tasks.append(asyncio.ensure_future(call(*args)))
+            await asyncio.sleep(0)
+        release()
+        await asyncio.gather(*tasks)
+        return order
+
+    async def test_disabled_never_waits(self):
+        scheduler = OutboundScheduler(conf={"enable": False, "max_concurrency": 1})
+        await scheduler.acquire()
+        await asyncio.wait_for(scheduler.acquire(), timeout=0.1)
+
+    async def test_higher_priority_first(self):
+        order = await self.run_queued(self.make_scheduler(), [
+            ("batch", "a", PRIORITY_LOW, "", 1),
+            ("question", "b", PRIORITY_NORMAL, "", 1),
+            ("judgement", "c", PRIORITY_HIGH, "", 1),
+        ])
+        self.assertEqual(order, ["judgement", "question", "batch"])
+
+    async def test_busy_flow_does_not_starve_others(self):
+        order = await self.run_queued(self.make_scheduler(), [
+            ("a1", "a", PRIORITY_NORMAL, "", 100),
+            ("a2", "a", PRIORITY_NORMAL, "", 100),
+            ("a3", "a", PRIORITY_NORMAL, "", 100),
+            ("b1", "b", PRIORITY_NORMAL, "", 100),
+        ])
+        self.assertLess(order.index("b1"), order.index("a2"))
+
+    async def test_weights_of_user_classes(self):
+        order = await self.run_queued(self.make_scheduler(weights={"free": 1, "premium": 4}), [
+            ("free1", "a", PRIORITY_NORMAL, "free", 100),
+            ("free2", "a", PRIORITY_NORMAL, "free", 100),
+            ("premium1", "b", PRIORITY_NORMAL, "premium", 100),
+            ("premium2", "b", PRIORITY_NORMAL, "premium", 100),
+            ("premium3", "b", PRIORITY_NORMAL, "premium", 100),
+        ])
+        self.assertEqual(order[:4], ["premium1", "premium2", "premium3", "free1"])
+
+    async def test_queue_timeout_refunds_the_flow(self):
+        scheduler = self.make_scheduler(max_queue_wait_secs=0.05)
+        release = await scheduler.acquire()
+        with scheduling_context(flow="a"):
+            with self.assertRaises(OutboundQueueTimeoutException):
+                await scheduler.acquire(cost=1000)
+        release()
+        with scheduling_context(flow="a"):
+            (await scheduler.acquire(cost=1))()
+        self.assertLess(scheduler._finish_tags.get("a"), 1000)
+        self.assertEqual(scheduler._inflight, 0)
+
+    async def test_deadline_while_queued(self):
+        scheduler = self.make_scheduler()
+        release = await scheduler.acquire()
+        with call_context(time_remaining=0.05):
+            with self.assertRaises(DeadlineExceededException):
+                await scheduler.acquire()
+        release()
+        self.assertEqual(scheduler._queue_size, 0)
+
+    async def test_cancelled_while_queued(self):
+        scheduler = self.make_scheduler()
+        release = await scheduler.acquire()
+        with scheduling_context(flow="a"):
+            task = asyncio.ensure_future(scheduler.acquire(cost=1000))
+        await asyncio.sleep(0)
+        task.cancel()
+        with self.assertRaises(asyncio.CancelledError):
+            await task
+        self.assertLess(scheduler._finish_tags.get("a"), 1000)
+        release()
+        # NOTE: The cancelled call leaves no slot behind.
+        await asyncio.wait_for(scheduler.acquire(), timeout=0.1)
+        self.assertEqual(scheduler._inflight, 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
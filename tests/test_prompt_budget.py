@@ -0,0 +1,46 @@
+# -*- coding: utf-8 -*-
+import unittest
+
+from internal.utils.prompt_budget import (
+    PromptBudget,
+    PromptTooLargeException,
+    context_window_tokens
+)
+from internal.utils.response_cache import MODE_GENERAL_QUESTION
+
+
+class TestContextWindowTokens(unittest.TestCase):
+
+    def test_longest_prefix_wins(self):
+        self.assertEqual(context_window_tokens("gpt-4-0125-preview"), 128000)
+        self.assertEqual(context_window_tokens("gpt-4-0613"), 8192)
+        self.assertEqual(context_window_tokens("gpt-4-32k-0613"), 32768)
+        self.assertEqual(context_window_tokens("gpt-3.5-turbo-0613"), 4096)
+
+    def test_unknown_model_gets_the_smallest_window(self):
+        self.assertEqual(context_window_tokens("llama"), 4096)
+
+
+class TestPromptBudget(unittest.IsolatedAsyncioTestCase):
+
+    async def test_window_follows_the_chat_model(self):
+        budget = PromptBudget(conf={"context_window_tokens": 0}, model="gpt-4-0125-preview")
+        self.assertGreater(budget.context_window_tokens, 100000)
+        system_prompt = "海龟汤的汤面和汤底。" * 1000
+        user_message, history = await budget.fit(system_prompt=system_prompt, user_message="他死了吗", history=[], mode=MODE_GENERAL_QUESTION)
+        self.assertEqual(user_message, "他死了吗")
+
+    async def test_configured_window_wins(self):
+        budget = PromptBudget(conf={"context_window_tokens": 512, "overflow_policy": "reject"}, model="gpt-4-0125-preview")
+        with self.assertRaises(PromptTooLargeException):
+            await budget.fit(system_prompt="海龟汤的汤面和汤底。" * 1000, user_message="他死了吗", history=[], mode=MODE_GENERAL_QUESTION)
+
+    async def test_truncates_the_history_by_default(self):
+        budget = PromptBudget(conf={"context_window_tokens": 512}, model="gpt-4-0125-preview")
+        history = [{"role": "user", "content": "他有妻子吗" * 100}, {"role": "assistant", "content": "是"}]
+        _, fitted = await budget.fit(system_prompt="海龟汤", user_message="他死了吗", history=history, mode=MODE_GENERAL_QUESTION)
+        self.assertEqual(fitted, [])
+
+
+if __name__ == "__main__":
+    unittest.main()
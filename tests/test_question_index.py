@@ -0,0 +1,105 @@
+# -*- coding: utf-8 -*-
+import asyncio
+import unittest
+from typing import List, Tuple
+from unittest import mock
+
+import internal.extensions.ext_redis as ext_redis
+from internal.utils.question_index import (
+    NearDuplicateQuestionIndex,
+    canonicalize_question
+)
+
+
+class StubRedisClient:
+
+    def __init__(self, values: List[str]):
+        self.values = values
+
+    async def try_get_list_of_strings(self, key: str, *, timeout: float) -> Tuple[List[str], bool]:
+        return self.values, True
+
+    async def append_to_list(self, key: str, values: List[str], ttl: int = 0, max_len: int = 0) -> bool:
+        self.values.extend(values)
+        return True
+
+
+class SlowRedisConnection:
+
+    async def execute_command(self, *args):
+        await asyncio.sleep(10)
+
+
+class TestCanonicalizeQuestion(unittest.TestCase):
+
+    def test_strips_question_markers(self):
+        self.assertEqual(canonicalize_question("他死了吗？"), "他死了")
+        self.assertEqual(canonicalize_question("他是否死了"), "他死了")
+        self.assertEqual(canonicalize_question("他是不是死了"), "他是死了")
+
+    def test_keeps_particles_within_sentence(self):
+        self.assertEqual(canonicalize_question("他吃的是人肉吗"), "他吃的是人肉")
+
+
+class TestNearDuplicateQuestionIndex(unittest.IsolatedAsyncioTestCase):
+
+    def setUp(self):
+        patcher = mock.patch.object(ext_redis, "instance", return_value=None)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.index = NearDuplicateQuestionIndex(conf={"enable": True})
+
+    async def test_paraphrases_match(self):
+        await self.index.add("scope", "他死了吗", "是")
+        self.assertEqual(await self.index.lookup("scope", "他是不是死了？"), "是")
+        self.assertEqual(await self.index.lookup("scope", "他是否死了"), "是")
+        self.assertEqual(await self.index.lookup("scope", "他是死的吗"), "是")
+
+    async def test_paraphrase_of_long_question_matches(self):
+        await self.index.add("scope", "男人在餐厅里喝的海龟汤其实是人肉做的吗", "是")
+        self.assertEqual(await self.index.lookup("scope", "男人在餐厅里喝的海龟汤其实是不是人肉做的？"), "是")
+
+    async def test_one_word_apart_never_matches(self):
+        pairs = [
+            ("男人在餐厅里喝的海龟汤其实是人肉做的吗", "男人在餐厅里喝的海龟汤其实是狗肉做的吗"),
+            ("男人的妻子是在那次海难中去世的吗", "男人的儿子是在那次海难中去世的吗"),
+            ("男人最后是在家里自杀的吗", "男人最后是在家里被杀的吗"),
+            ("男人的妻子是在那次海难中去世的吗", "男人的妻子和儿子是在那次海难中去世的吗"),
+        ]
+        for answered, asked in pairs:
+            with self.subTest(asked=asked):
+                await self.index.add(answered, answered, "是")
+                self.assertIsNone(await self.index.lookup(answered, asked))
+
+    async def test_negation_never_matches(self):
+        await self.index.add("scope", "他死了吗", "是")
+        self.assertIsNone(await self.index.lookup("scope", "他没死吗"))
+
+    async def test_swapped_roles_never_match(self):
+        await self.index.add("scope", "男人杀了女人吗", "是")
+        self.assertIsNone(await self.index.lookup("scope", "女人杀了男人吗"))
+
+    async def test_only_verdicts_are_indexed(self):
+        await self.index.add("scope", "他死了吗", "这个问题与真相无关，换个问题吧")
+        self.assertIsNone(await self.index.lookup("scope", "他死了吗"))
+
+    async def test_sync_skips_bad_entries(self):
+        client = StubRedisClient([
+            "not json",
+            '{"question": "他死了"}',
+            '["他死了", "是"]',
+            '{"question": "他死了", "answer": "是"}',
+        ])
+        with mock.patch.object(ext_redis, "instance", return_value=client):
+            self.assertEqual(await self.index.lookup("scope", "他是不是死了"), "是")
+
+    async def test_slow_redis_is_a_miss(self):
+        client = object.__new__(ext_redis.RedisClient)
+        client._client = SlowRedisConnection()
+        index = NearDuplicateQuestionIndex(conf={"enable": True, "redis_read_timeout_secs": 0.01})
+        with mock.patch.object(ext_redis, "instance", return_value=client):
+            self.assertIsNone(await asyncio.wait_for(index.lookup("scope", "他死了吗"), timeout=1))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,143 @@
+# -*- coding: utf-8 -*-
+import unittest
+from typing import List
+from unittest import mock
+
+import internal.extensions.ext_redis as ext_redis
+from internal.utils.rate_limiter import (
+    SCOPE_THREAD,
+    SCOPE_UID,
+    RateLimitExceededException,
+    UserRateLimiter
+)
+
+try:
+    import fakeredis
+except ImportError:
+    fakeredis = None
+
+TIERS = {
+    "free": {"window_secs": 60, "max_requests_per_uid": 3, "max_requests_per_thread": 2},
+    "premium": {"window_secs": 60, "max_requests_per_uid": 0, "max_requests_per_thread": 5},
+}
+
+
+class StubRedisClient:
+    """A Redis which is unreachable."""
+
+    def __init__(self):
+        self.calls = 0
+
+    async def hit_sliding_windows(self, keys: List[str], limits: List[int], **kwargs):
+        self.calls += 1
+        return (None, False)
+
+
+def make_limiter() -> UserRateLimiter:
+    return UserRateLimiter(conf={"enable": True, "tiers": TIERS, "redis_retry_interval_secs": 60})
+
+
+class RateLimiterTestMixin:
+
+    async def test_limits_per_thread(self):
+        limiter = make_limiter()
+        for _ in range(2):
+            await limiter.acquire(uid="u1", ext_thread_id="t1", user_class="free")
+        with self.assertRaises(RateLimitExceededException) as ctx:
+            await limiter.acquire(uid="u1", ext_thread_id="t1", user_class="free")
+        self.assertEqual(ctx.exception.scope, SCOPE_THREAD)
+        self.assertGreater(ctx.exception.retry_after_secs, 0)
+        self.assertLessEqual(ctx.exception.retry_after_secs, 60)
+
+    async def test_limits_per_uid_across_threads(self):
+        limiter = make_limiter()
+        for thread in ("t1", "t2", "t3"):
+            await limiter.acquire(uid="u1", ext_thread_id=thread, user_class="free")
+        with self.assertRaises(RateLimitExceededException) as ctx:
+            await limiter.acquire(uid="u1", ext_thread_id="t4", user_class="free")
+        self.assertEqual(ctx.exception.scope, SCOPE_UID)
+        await limiter.acquire(uid="u2", ext_thread_id="t4", user_class="free")
+
+    async def test_rejected_hit_is_not_counted(self):
+        limiter = make_limiter()
+        for _ in range(2):
+            await limiter.acquire(uid="u1", ext_thread_id="t1", user_class="free")
+        with self.assertRaises(RateLimitExceededException):
+            await limiter.acquire(uid="u1", ext_thread_id="t1", user_class="free")
+        # NOTE: The uid window only counts the 2 hits which got through.
+        await limiter.acquire(uid="u1", ext_thread_id="t2", user_class="free")
+
+    async def test_tiers(self):
+        limiter = make_limiter()
+        for _ in range(5):
+            await limiter.acquire(uid="u1", ext_thread_id="t1", user_class="premium")
+        with self.assertRaises(RateLimitExceededException):
+            await limiter.acquire(uid="u1", ext_thread_id="t1", user_class="premium")
+        # NOTE: An unknown class gets the default tier.
+        for _ in range(2):
+            await limiter.acquire(uid="u2", ext_thread_id="t2", user_class="vip")
+        with self.assertRaises(RateLimitExceededException):
+            await limiter.acquire(uid="u2", ext_thread_id="t2", user_class="vip")
+
+    async def test_anonymous_users_are_limited_per_thread_only(self):
+        limiter = make_limiter()
+        for thread in ("t1", "t2", "t3", "t4"):
+            await limiter.acquire(uid="", ext_thread_id=thread, user_class="free")
+
+
+class TestUserRateLimiterLocally(RateLimiterTestMixin, unittest.IsolatedAsyncioTestCase):
+
+    def setUp(self):
+        patcher = mock.patch.object(ext_redis, "instance", return_value=None)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    async def test_disabled(self):
+        limiter = UserRateLimiter(conf={"enable": False, "tiers": TIERS})
+        for _ in range(10):
+            await limiter.acquire(uid="u1", ext_thread_id="t1", user_class="free")
+
+    async def test_falls_back_while_redis_is_unreachable(self):
+        client = StubRedisClient()
+        limiter = make_limiter()
+        with mock.patch.object(ext_redis, "instance", return_value=client):
+            for _ in range(2):
+                await limiter.acquire(uid="u1", ext_thread_id="t1", user_class="free")
+            with self.assertRaises(RateLimitExceededException):
+                await limiter.acquire(uid="u1", ext_thread_id="t1", user_class="free")
+        # NOTE: Redis is retried only after redis_retry_interval_secs.
+        self.assertEqual(client.calls, 1)
+
+
+@unittest.skipIf(fakeredis is None, "fakeredis is not installed")
+class TestUserRateLimiterInRedis(RateLimiterTestMixin, unittest.IsolatedAsyncioTestCase):
+
+    def setUp(self):
+        self.client = object.__new__(ext_redis.RedisClient)
+        self.client._client = fakeredis.FakeAsyncRedis(lua_modules=set())
+        self.client._scripts = {}
+        patcher = mock.patch.object(ext_redis, "instance", return_value=self.client)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    async def test_windows_are_shared_by_the_replicas(self):
+        replicas = [make_limiter(), make_limiter()]
+        for limiter in replicas:
+            await limiter.acquire(uid="u1", ext_thread_id="t1", user_class="free")
+        with self.assertRaises(RateLimitExceededException):
+            await replicas[0].acquire(uid="u1", ext_thread_id="t1", user_class="free")
+
+    async def test_blocked_subject_skips_redis(self):
+        limiter = make_limiter()
+        for _ in range(2):
+            await limiter.acquire(uid="u1", ext_thread_id="t1", user_class="free")
+        with self.assertRaises(RateLimitExceededException):
+            await limiter.acquire(uid="u1", ext_thread_id="t1", user_class="free")
+        with mock.patch.object(self.client, "hit_sliding_windows") as hit:
+            with self.assertRaises(RateLimitExceededException):
+                await limiter.acquire(uid="u1", ext_thread_id="t1", user_class="free")
+            hit.assert_not_called()
+
+
+if __name__ == "__main__":
+    unittest.main()
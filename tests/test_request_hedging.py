@@ -0,0 +1,94 @@
+# -*- coding: utf-8 -*-
+import asyncio
+import unittest
+from typing import Dict, List, Optional
+
+from internal.utils.request_hedging import HedgingPolicy
+
+
+class Attempts:
+    """Attempt factory whose attempts take the given seconds, then answer or fail, recording their cancellation."""
+
+    def __init__(self, delays: List[float], errors: Optional[Dict[int, Exception]] = None):
+        self.delays = delays
+        self.errors = errors or {}
+        self.started: List[int] = []
+        self.cancelled: List[int] = []
+
+    async def __call__(self, idx: int) -> str:
+        self.started.append(idx)
+        try:
+            await asyncio.sleep(self.delays[idx])
+        except asyncio.CancelledError:
+            self.cancelled.append(idx)
+            raise
+        if idx in self.errors:
+            raise self.errors[idx]
+        return f"attempt{idx}"
+
+
+class TestHedgingPolicy(unittest.IsolatedAsyncioTestCase):
+
+    def make_policy(self, **conf) -> HedgingPolicy:
+        policy = HedgingPolicy(conf={
+            "enable": True,
+            "min_samples": 1,
+            "min_delay_secs": 0.02,
+            "max_hedge_ratio": 1.0,
+            **conf
+        })
+        policy._latencies.append(0.02)
+        return policy
+
+    async def test_hedge_wins_and_primary_is_cancelled(self):
+        attempts = Attempts([1.0, 0.01])
+        self.assertEqual(await self.make_policy().run(attempts), "attempt1")
+        await asyncio.sleep(0)
+        self.assertEqual(attempts.started, [0, 1])
+        self.assertEqual(attempts.cancelled, [0])
+
+    async def test_primary_wins_and_hedge_is_cancelled(self):
+        attempts = Attempts([0.05, 1.0])
+        self.assertEqual(await self.make_policy().run(attempts), "attempt0")
+        await asyncio.sleep(0)
+        self.assertEqual(attempts.cancelled, [1])
+
+    async def test_fast_primary_is_not_hedged(self):
+        attempts = Attempts([0.0, 0.0])
+        self.assertEqual(await self.make_policy().run(attempts), "attempt0")
+        self.assertEqual(attempts.started, [0])
+
+    async def test_not_hedged_without_enough_samples(self):
+        policy = self.make_policy(min_samples=2)
+        self.assertIsNone(policy.hedge_delay())
+        attempts = Attempts([0.05, 0.0])
+        self.assertEqual(await policy.run(attempts), "attempt0")
+        self.assertEqual(attempts.started, [0])
+
+    async def test_not_hedged_when_the_budget_is_exhausted(self):
+        attempts = Attempts([0.05, 0.0])
+        self.assertEqual(await self.make_policy(max_hedge_ratio=0).run(attempts), "attempt0")
+        self.assertEqual(attempts.started, [0])
+
+    async def test_failed_primary_falls_back_to_hedge(self):
+        attempts = Attempts([0.05, 0.1], errors={0: ValueError("primary")})
+        self.assertEqual(await self.make_policy().run(attempts), "attempt1")
+
+    async def test_both_failed_raises_primary_error(self):
+        attempts = Attempts([0.05, 0.0], errors={0: ValueError("primary"), 1: ValueError("hedge")})
+        with self.assertRaisesRegex(ValueError, "primary"):
+            await self.make_policy().run(attempts)
+
+    async def test_caller_cancelled_cancels_both(self):
+        attempts = Attempts([1.0, 1.0])
+        task = asyncio.ensure_future(self.make_policy().run(attempts))
+        await asyncio.sleep(0.05)
+        task.cancel()
+        with self.assertRaises(asyncio.CancelledError):
+            await task
+        await asyncio.sleep(0)
+        self.assertEqual(sorted(attempts.cancelled), [0, 1])
+
+
+if __name__ == "__main__":
+    unittest.main()
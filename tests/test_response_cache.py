@@ -0,0 +1,60 @@
+# -*- coding: utf-8 -*-
+import asyncio
+import time
+import unittest
+from unittest import mock
+
+import internal.extensions.ext_redis as ext_redis
+from internal.utils.response_cache import MODE_GENERAL_QUESTION, ResponseCache
+
+
+class StubConnection:
+
+    def __init__(self, *, value: bytes = None, delay_secs: float = 0.0):
+        self.value = value
+        self.delay_secs = delay_secs
+        self.calls = 0
+
+    async def execute_command(self, *args):
+        self.calls += 1
+        await asyncio.sleep(self.delay_secs)
+        return self.value
+
+
+def make_redis_client(connection: StubConnection) -> ext_redis.RedisClient:
+    # NOTE: Bypasses the singleton and the connection setup, only the command calls are exercised.
+    client = object.__new__(ext_redis.RedisClient)
+    client._client = connection
+    return client
+
+
+class TestResponseCacheRedisTier(unittest.IsolatedAsyncioTestCase):
+
+    def setUp(self):
+        self.cache = ResponseCache(conf={"enable": True, "redis_read_timeout_secs": 0.05})
+        self.key = ResponseCache.make_key(system_prompt="海龟汤", user_message="他死了吗", model="openai/gpt", mode=MODE_GENERAL_QUESTION)
+
+    async def get(self, connection: StubConnection):
+        with mock.patch.object(ext_redis, "instance", return_value=make_redis_client(connection)):
+            return await self.cache.get(self.key, MODE_GENERAL_QUESTION)
+
+    async def test_redis_hit(self):
+        connection = StubConnection(value="是。".encode())
+        self.assertEqual(await self.get(connection), "是。")
+        # NOTE: Served by the local tier from then on.
+        self.assertEqual(await self.get(connection), "是。")
+        self.assertEqual(connection.calls, 1)
+
+    async def test_redis_miss(self):
+        self.assertIsNone(await self.get(StubConnection()))
+
+    async def test_slow_redis_is_a_miss_without_retries(self):
+        connection = StubConnection(value="是。".encode(), delay_secs=1)
+        st = time.monotonic()
+        self.assertIsNone(await self.get(connection))
+        self.assertLess(time.monotonic() - st, 0.5)
+        self.assertEqual(connection.calls, 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,32 @@
+# -*- coding: utf-8 -*-
+import unittest
+from unittest import mock
+
+from internal.utils.tokenizer import Tokenizer
+
+
+class TestTokenizerFallback(unittest.IsolatedAsyncioTestCase):
+
+    def setUp(self):
+        self.tokenizer = Tokenizer(load_retry_interval_secs=60)
+        patcher = mock.patch.object(self.tokenizer, "get_encoding", side_effect=OSError("no BPE file"))
+        self.get_encoding = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_count_is_estimated(self):
+        self.assertEqual(self.tokenizer.count("他死了吗"), 4)
+
+    async def test_acount_batch_is_estimated(self):
+        self.assertEqual(await self.tokenizer.acount_batch(["他死了吗", "hello"]), [4, 5])
+
+    def test_truncate_is_estimated(self):
+        self.assertEqual(self.tokenizer.truncate("他是不是死了", 3), "他是不")
+
+    def test_loading_is_not_retried_right_away(self):
+        self.tokenizer.count("他死了吗")
+        self.tokenizer.count("他没死吗")
+        self.assertEqual(self.get_encoding.call_count, 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
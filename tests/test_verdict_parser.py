@@ -0,0 +1,139 @@
+# -*- coding: utf-8 -*-
+import unittest
+from typing import Union
+
+from internal.utils.verdict_parser import (
+    TRUTH_VERDICT_CLOSE,
+    TRUTH_VERDICT_SOLVED,
+    TRUTH_VERDICT_WRONG,
+    VERDICT_NO,
+    VERDICT_PARTIALLY,
+    VERDICT_YES,
+    IncrementalJudgementParser,
+    IncrementalVerdictParser,
+    parse_truth_verdict
+)
+
+Parser = Union[IncrementalJudgementParser, IncrementalVerdictParser]
+
+
+def feed_all(parser: Parser, reply: str, step: int = 3) -> Parser:
+    for idx in range(0, len(reply), step):
+        if parser.feed(reply[idx:idx + step]):
+            break
+    return parser
+
+
+class TestIncrementalVerdictParser(unittest.TestCase):
+
+    def test_key_clue_after_lead_in(self):
+        for reply, verdict in (("是的，这个问题很关键。", VERDICT_YES), ("不是，但这个问题很关键。", VERDICT_NO)):
+            with self.subTest(reply=reply):
+                parser = IncrementalVerdictParser()
+                for char in reply:
+                    if parser.feed(char):
+                        break
+                parser.finish()
+                self.assertEqual(parser.verdict, verdict)
+                self.assertTrue(parser.is_key_clue)
+                self.assertEqual(parser.reply(), f"{verdict}，这个问题很关键。")
+
+    def test_short_reply_settles_at_finish(self):
+        parser = feed_all(IncrementalVerdictParser(), "是的。", step=1)
+        self.assertFalse(parser.settled)
+        parser.finish()
+        self.assertEqual(parser.verdict, VERDICT_YES)
+        self.assertFalse(parser.is_key_clue)
+
+    def test_partially_is_not_yes(self):
+        parser = feed_all(IncrementalVerdictParser(), "是又不是。", step=1)
+        parser.finish()
+        self.assertEqual(parser.verdict, VERDICT_PARTIALLY)
+
+    def test_settles_early_on_long_rest(self):
+        parser = IncrementalVerdictParser()
+        reply = "不是，他并没有死在那艘船上，而是后来回到了家乡。"
+        self.assertTrue(feed_all(parser, reply, step=1).settled)
+        self.assertLess(len(parser.raw_reply), len(reply))
+        self.assertEqual(parser.reply(), "不是。")
+
+    def test_waits_for_a_partial_hint(self):
+        parser = IncrementalVerdictParser()
+        self.assertFalse(parser.feed("是的，他确实死在了那艘船上，这个问题很关"))
+        self.assertTrue(parser.feed("键。"))
+        self.assertTrue(parser.is_key_clue)
+
+    def test_not_a_verdict(self):
+        parser = feed_all(IncrementalVerdictParser(), "你需要自己进行猜测。")
+        parser.finish()
+        self.assertTrue(parser.is_not_verdict)
+        self.assertEqual(parser.reply(), "你需要自己进行猜测。")
+
+
+class TestIncrementalJudgementParser(unittest.TestCase):
+
+    def test_valid_json(self):
+        parser = feed_all(IncrementalJudgementParser(), '{"result": "猜测成功。", "reason": "完全一致。"}')
+        self.assertTrue(parser.settled)
+        self.assertEqual(parser.result(), "猜测成功。")
+        self.assertFalse(parser.salvaged)
+
+    def test_curly_quotes_inside_value(self):
+        reply = '{"result": "很接近了，但“向日葵”这个线索还没猜到。", "reason": "..."}'
+        self.assertEqual(feed_all(IncrementalJudgementParser(), reply).result(), "很接近了，但“向日葵”这个线索还没猜到。")
+        parser = IncrementalJudgementParser()
+        parser.feed(reply)
+        self.assertEqual(parser.result(), "很接近了，但“向日葵”这个线索还没猜到。")
+
+    def test_apostrophe_inside_value(self):
+        reply = '{"result": "He\'s close", "reason": "..."}'
+        self.assertEqual(feed_all(IncrementalJudgementParser(), reply).result(), "He's close")
+
+    def test_escaped_quote_inside_value(self):
+        reply = '{"result": "很接近了，\\"向日葵\\"还没猜到。", "reason": "..."}'
+        self.assertEqual(feed_all(IncrementalJudgementParser(), reply).result(), '很接近了，"向日葵"还没猜到。')
+
+    def test_settles_before_reason(self):
+        parser = IncrementalJudgementParser()
+        self.assertFalse(parser.feed('{"result": "猜得不'))
+        self.assertTrue(parser.feed('对。", "rea'))
+        self.assertEqual(parser.result(), "猜得不对。")
+
+    def test_salvages_single_quotes(self):
+        parser = IncrementalJudgementParser()
+        parser.feed("{'result': '很接近了。', 'reason': '...'}")
+        self.assertEqual(parser.result(), "很接近了。")
+
+    def test_salvages_code_fence(self):
+        parser = IncrementalJudgementParser()
+        parser.feed('```json\n{"result": "猜测成功。", "reason": "..."}\n```')
+        self.assertEqual(parser.result(), "猜测成功。")
+
+    def test_salvages_truncated_value(self):
+        parser = IncrementalJudgementParser()
+        parser.feed('{"result": "很接近了，但还')
+        self.assertFalse(parser.settled)
+        self.assertEqual(parser.result(), "很接近了，但还")
+        self.assertTrue(parser.salvaged)
+
+    def test_salvages_bare_verdict(self):
+        parser = IncrementalJudgementParser()
+        parser.feed("猜得不对，再想想。")
+        self.assertEqual(parser.result(), TRUTH_VERDICT_WRONG)
+
+    def test_nothing_to_salvage(self):
+        parser = IncrementalJudgementParser()
+        parser.feed("抱歉，我无法回答。")
+        self.assertIsNone(parser.result())
+
+
+class TestParseTruthVerdict(unittest.TestCase):
+
+    def test_verdicts(self):
+        self.assertEqual(parse_truth_verdict("猜测成功。"), TRUTH_VERDICT_SOLVED)
+        self.assertEqual(parse_truth_verdict("很接近了，但还有一些细节没有推断出来。"), TRUTH_VERDICT_CLOSE)
+        self.assertIsNone(parse_truth_verdict("无法判断"))
+
+
+if __name__ == "__main__":
+    unittest.main()